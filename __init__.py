@@ -76,6 +76,20 @@ try:
 except Exception as e:
     print(f"Swiss Army Knife: Could not register config API routes: {e}")
 
+# Preload a shipped Gemini cache bundle (GEMINI_CACHE_WARMUP_BUNDLE) in the background
+try:
+    from .nodes.cache import warm_up_from_env
+    warm_up_from_env()
+except Exception as e:
+    print(f"Swiss Army Knife: Could not start Gemini cache warm-up: {e}")
+
+# Pre-hash LoRAs in the ComfyUI loras folders in the background (opt-in with LORA_HASH_INDEXER=true)
+try:
+    from .nodes.lora_indexer import start_background_indexer
+    start_background_indexer()
+except Exception as e:
+    print(f"Swiss Army Knife: Could not start LoRA hash indexer: {e}")
+
 
 # Get version from pyproject.toml for cache busting
 def get_version():
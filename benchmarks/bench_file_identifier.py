@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+File media identifier benchmark for GeminiCache.
+
+Creates N small files and measures identifier throughput for:
+
+- legacy: a new ``GeminiCache()`` per call plus ``exists``/``getmtime``/``getsize``
+  (what ``get_file_media_identifier`` used to do)
+- cold: ``get_file_media_identifier`` with an empty identity memo
+- warm: ``get_file_media_identifier`` with every path already memoized
+
+Both cold and warm do one ``os.stat`` per call; warm only skips formatting the string.
+
+Usage:
+    python benchmarks/bench_file_identifier.py [--files N] [--legacy-sample N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes import cache as gemini_cache  # noqa: E402
+
+
+def _legacy_identifier(file_path, cache_dir):
+    gemini_cache.GeminiCache(cache_dir=cache_dir)
+    if not os.path.exists(file_path):
+        return f"missing:{file_path}"
+    mtime = os.path.getmtime(file_path)
+    size = os.path.getsize(file_path)
+    return f"file:{file_path}:mtime:{mtime}:size:{size}"
+
+
+def _throughput(fn, paths):
+    start = time.perf_counter()
+    for path in paths:
+        fn(path)
+    elapsed = time.perf_counter() - start
+    return len(paths) / elapsed, elapsed * 1e6 / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000, help="Number of files to create")
+    parser.add_argument("--legacy-sample", type=int, default=10_000,
+                        help="Files used for the (slow) legacy measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        media_dir = os.path.join(tmp_dir, "media")
+        cache_dir = os.path.join(tmp_dir, "cache")
+        paths = []
+        for i in range(args.files):
+            subdir = os.path.join(media_dir, f"{i // 1000:03d}")
+            if i % 1000 == 0:
+                os.makedirs(subdir)
+            path = os.path.join(subdir, f"frame_{i:06d}.png")
+            with open(path, "wb") as f:
+                f.write(b"\x89PNG")
+            paths.append(path)
+
+        print(f"{args.files} files, memo limit {gemini_cache._IDENTITY_MEMO_MAX}")
+        print(f"{'method':<12}{'ids/s':>14}{'us/id':>10}")
+
+        def report(name, result):
+            rate, per_call = result
+            print(f"{name:<12}{rate:>14,.0f}{per_call:>10.2f}")
+
+        sample = paths[:args.legacy_sample]
+        legacy = _throughput(lambda path: _legacy_identifier(path, cache_dir), sample)
+        report("legacy", legacy)
+
+        gemini_cache._identity_memo.clear()
+        report("cold", _throughput(gemini_cache.get_file_media_identifier, paths))
+        report("warm", _throughput(gemini_cache.get_file_media_identifier, paths))
+
+        mismatches = sum(gemini_cache.get_file_media_identifier(path) != _legacy_identifier(path, cache_dir)
+                         for path in sample[:1000])
+        print(f"identifier mismatches vs legacy format: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+LoRA hashing benchmark suite: the streaming hash engine and LoRAHashCache.
+
+Writes synthetic model files (random bytes) to a temp dir and measures wall time,
+MB/s and peak RSS for:
+
+- engine: ``lora_hashing.hash_file`` for each hash type on its own and for all of them
+  together, once buffered (one reused chunk buffer) and once memory-mapped
+- cache: ``LoRAHashCache`` hashing ``--parallel-files`` distinct files cold, sequentially
+  (``get_hashes`` in a loop) and in parallel (``get_hashes_many``), then the same
+  calls again warm (served from the cache, reported as microseconds per lookup)
+- legacy (``--legacy``): the original whole-file ``fh.read()`` implementation, for
+  reference; it needs as much memory as the file is large
+
+Each scenario runs in a fresh subprocess so its peak RSS (``ru_maxrss``) is its own.
+For mmap, RSS includes the mapped page-cache pages, which are shared and reclaimable
+rather than private allocations. Files are hashed right after being written, so they
+are in the page cache and throughput reflects hashing, not the disk; ``--drop-caches``
+(Linux, root) evicts them before every scenario to measure cold reads instead.
+
+Regression check: ``--json results.json`` saves the run, and ``--baseline results.json``
+compares MB/s scenario by scenario. The exit status is 1 if any scenario is slower
+than the baseline by more than ``--tolerance``. Scenarios that took less than
+``MIN_COMPARE_SECONDS`` in the baseline (autov1/autov2 read a few KB) are timer noise
+and are not compared; ``--repeat 3`` keeps the fastest of three runs per scenario.
+
+Usage:
+    python benchmarks/bench_lora_hashing.py [--sizes 10,100] [--preset full]
+        [--parallel-files 4] [--legacy] [--drop-caches] [--json out.json]
+        [--baseline base.json] [--tolerance 0.15] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nodes import lora_hashing  # noqa: E402
+from nodes.debug_utils import is_debug_enabled  # noqa: E402
+from nodes.lora_hash_cache import LoRAHashCache  # noqa: E402
+
+PRESETS = {
+    "quick": (10, 100),
+    "full": (10, 100, 1024, 4096),
+}
+
+# Baseline scenarios faster than this are not checked for regressions
+MIN_COMPARE_SECONDS = 0.05
+
+
+def _legacy_hash(path):
+    import hashlib
+    import zlib
+    with open(path, "rb") as fh:
+        content = fh.read()
+    hashes = {
+        "sha256": hashlib.sha256(content).hexdigest().upper(),
+        "crc32": f"{zlib.crc32(content) & 0xffffffff:08X}",
+        "blake3": lora_hashing.blake3.blake3(content).hexdigest().upper() if lora_hashing.BLAKE3_AVAILABLE else None,
+        "autov1": hashlib.sha256(content[:8192]).hexdigest().upper()[:10],
+    }
+    size = len(content)
+    if size <= 8192:
+        sample = content
+    else:
+        sample = b"".join([content[:2048], content[size // 4:size // 4 + 2048],
+                           content[size * 3 // 4:size * 3 // 4 + 2048], content[-2048:]])
+    hashes["autov2"] = hashlib.sha256(sample).hexdigest().upper()[:10]
+    return hashes
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _worker(spec):
+    """Run one scenario in this process and print its measurements as JSON."""
+    result = {}
+    # The first Logger call imports config_api; keep that out of the cache timings
+    is_debug_enabled()
+    if spec["kind"] == "legacy":
+        start = time.perf_counter()
+        result["hashes"] = _legacy_hash(spec["paths"][0])
+        result["elapsed"] = time.perf_counter() - start
+    elif spec["kind"] == "engine":
+        start = time.perf_counter()
+        result["hashes"] = lora_hashing.hash_file(spec["paths"][0], spec["chunk_size"], use_mmap=spec["mmap"],
+                                                  hash_types=spec["hash_types"])
+        result["elapsed"] = time.perf_counter() - start
+    else:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = LoRAHashCache(cache_path=Path(cache_dir) / "hashes.json", max_workers=spec["workers"])
+
+            def run():
+                if spec["parallel"]:
+                    return cache.get_hashes_many(spec["paths"])
+                return [cache.get_hashes(path) for path in spec["paths"]]
+
+            start = time.perf_counter()
+            result["hashes"] = run()[0]
+            result["elapsed"] = time.perf_counter() - start
+            start = time.perf_counter()
+            run()
+            result["warm_us_per_lookup"] = (time.perf_counter() - start) * 1e6 / len(spec["paths"])
+            cache.close()
+    result["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(result))
+
+
+def _drop_page_cache():
+    subprocess.run(["sync"], check=False)
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError as e:
+        raise SystemExit(f"--drop-caches needs Linux and root: {e}")
+
+
+def _run(spec, drop_caches):
+    if drop_caches:
+        _drop_page_cache()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(spec)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _write_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for index in range(size_mb):
+            # Vary each block so no two files or blocks are identical
+            f.write(index.to_bytes(8, "little") + block[8:])
+
+
+def _scenarios(paths, size_mb, args):
+    """Yield ``(name, spec, megabytes hashed)`` for one file size."""
+    chunk_size = args.chunk_kb * 1024
+    if args.legacy:
+        yield f"legacy/all/{size_mb}MB", {"kind": "legacy", "paths": paths[:1]}, size_mb
+    for hash_types in [[hash_type] for hash_type in lora_hashing.HASH_TYPES] + [list(lora_hashing.HASH_TYPES)]:
+        if hash_types == ["blake3"] and not lora_hashing.BLAKE3_AVAILABLE:
+            continue
+        label = hash_types[0] if len(hash_types) == 1 else "all"
+        for mode in ("buffered", "mmap"):
+            spec = {"kind": "engine", "paths": paths[:1], "chunk_size": chunk_size,
+                    "mmap": mode == "mmap", "hash_types": hash_types}
+            yield f"engine/{label}/{mode}/{size_mb}MB", spec, size_mb
+    for mode in ("sequential", "parallel"):
+        spec = {"kind": "cache", "paths": paths, "parallel": mode == "parallel", "workers": args.workers}
+        yield f"cache/{mode}/{len(paths)}x{size_mb}MB", spec, size_mb * len(paths)
+
+
+def _compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["scenario"]: row for row in json.load(f)["results"]}
+    regressions = []
+    for row in results:
+        reference = baseline.get(row["scenario"])
+        if not reference or reference["seconds"] < MIN_COMPARE_SECONDS:
+            continue
+        if row["mb_per_s"] < reference["mb_per_s"] * (1 - tolerance):
+            regressions.append((row["scenario"], reference["mb_per_s"], row["mb_per_s"]))
+    for scenario, before, after in regressions:
+        print(f"REGRESSION {scenario}: {before:.0f} -> {after:.0f} MB/s ({after / before - 1:+.0%})")
+    print(f"{len(regressions)} regressions against {baseline_path} (tolerance {tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", help="Comma-separated file sizes in MB (overrides --preset)")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick",
+                        help="quick: 10,100 MB; full: 10 MB to 4 GB")
+    parser.add_argument("--parallel-files", type=int, default=4, help="Distinct files per size for cache scenarios")
+    parser.add_argument("--workers", type=int, default=LoRAHashCache.DEFAULT_MAX_WORKERS,
+                        help="LoRAHashCache max_workers for the parallel scenario")
+    parser.add_argument("--chunk-kb", type=int, default=lora_hashing.CHUNK_SIZE // 1024, help="Streaming chunk size")
+    parser.add_argument("--legacy", action="store_true", help="Also run the original whole-file read")
+    parser.add_argument("--drop-caches", action="store_true", help="Evict the page cache before every scenario")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare MB/s against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown against --baseline")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the fastest is reported")
+    parser.add_argument("--tmp-dir", default=None, help="Where to write the synthetic files")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(json.loads(args.worker))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",")] if args.sizes else list(PRESETS[args.preset])
+    print(f"sizes {sizes} MB, chunk {args.chunk_kb} KB, {os.cpu_count()} CPUs, blake3: {lora_hashing.BLAKE3_AVAILABLE}")
+    print(f"{'scenario':<34}{'seconds':>9}{'MB/s':>9}{'peak RSS MB':>13}{'warm µs':>10}")
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp_dir:
+        for size_mb in sizes:
+            paths = [os.path.join(tmp_dir, f"{size_mb}mb_{index}.safetensors") for index in range(args.parallel_files)]
+            for path in paths:
+                _write_file(path, size_mb)
+            reference = None
+            for name, spec, megabytes in _scenarios(paths, size_mb, args):
+                measured = min((_run(spec, args.drop_caches) for _ in range(max(args.repeat, 1))),
+                               key=lambda run: run["elapsed"])
+                if set(measured["hashes"]) == set(lora_hashing.HASH_TYPES):
+                    reference = reference or measured["hashes"]
+                    if measured["hashes"] != reference:
+                        raise SystemExit(f"{name} produced different hashes")
+                row = {
+                    "scenario": name,
+                    "seconds": round(measured["elapsed"], 4),
+                    "mb_per_s": round(megabytes / measured["elapsed"], 1),
+                    "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+                }
+                if "warm_us_per_lookup" in measured:
+                    row["warm_us_per_lookup"] = round(measured["warm_us_per_lookup"], 1)
+                results.append(row)
+                warm = f"{row['warm_us_per_lookup']:>10.1f}" if "warm_us_per_lookup" in row else f"{'':>10}"
+                print(f"{name:<34}{row['seconds']:>9.2f}{row['mb_per_s']:>9.0f}{row['peak_rss_mb']:>13.0f}{warm}")
+            for path in paths:
+                os.remove(path)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "cpus": os.cpu_count(), "sizes_mb": sizes,
+                       "blake3": lora_hashing.BLAKE3_AVAILABLE, "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    if args.baseline:
+        return _compare(results, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tensor fingerprint benchmark for GeminiCache media identifiers.
+
+Measures the cost of fingerprinting one 4K frame in ComfyUI IMAGE layout
+([1, 2160, 3840, 3] float32, ~95 MB) with every available hasher, the
+perceptual mode, and the legacy ``sha256(str(tensor))`` identifier. The legacy
+identifier looks fast only because numpy/torch truncate large reprs with "...",
+which is exactly why different frames collided.
+
+Usage:
+    python benchmarks/bench_tensor_fingerprint.py [--repeat N] [--torch]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes import media_fingerprint  # noqa: E402
+
+
+def _time_per_call(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _hashers():
+    hashers = [("blake2b", lambda: hashlib.blake2b(digest_size=16)), ("sha256", hashlib.sha256)]
+    if media_fingerprint.BLAKE3_AVAILABLE:
+        hashers.insert(0, ("blake3", media_fingerprint.blake3.blake3))
+    if media_fingerprint.XXHASH_AVAILABLE:
+        hashers.insert(0, ("xxh3", media_fingerprint.xxhash.xxh3_128))
+    return hashers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="Iterations per measurement")
+    parser.add_argument("--torch", action="store_true", help="Benchmark a torch tensor instead of a numpy array")
+    args = parser.parse_args()
+
+    frame = np.random.default_rng(0).random((1, 2160, 3840, 3), dtype=np.float32)
+    if args.torch:
+        import torch
+        frame = torch.from_numpy(frame)
+    size_mb = 2160 * 3840 * 3 * 4 / (1024 * 1024)
+
+    print(f"4K frame: {size_mb:.1f} MB, {args.repeat} iterations, default hasher: {media_fingerprint.HASH_NAME}")
+    print(f"{'method':<28}{'ms/frame':>12}{'GB/s':>10}")
+
+    def report(name, seconds):
+        print(f"{name:<28}{seconds * 1000:>12.2f}{size_mb / 1024 / seconds:>10.2f}")
+
+    original = (media_fingerprint.HASH_NAME, media_fingerprint._new_hasher)
+    try:
+        for name, factory in _hashers():
+            media_fingerprint.HASH_NAME, media_fingerprint._new_hasher = name, factory
+            report(f"exact ({name})", _time_per_call(lambda: media_fingerprint.exact_fingerprint(frame), args.repeat))
+    finally:
+        media_fingerprint.HASH_NAME, media_fingerprint._new_hasher = original
+
+    report("perceptual (dhash 9x8)",
+           _time_per_call(lambda: media_fingerprint.perceptual_fingerprint(frame), args.repeat))
+    report("legacy sha256(str(tensor))*",
+           _time_per_call(lambda: hashlib.sha256(str(frame).encode("utf-8")).hexdigest(), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,32 +3,243 @@ Cache utility for Gemini media descriptions.
 
 Provides transparent caching of Gemini API responses based on media content and prompts.
 Cache keys combine media identifiers with configurable option flags to ensure unique storage
-per media+prompt combination.
+per media+prompt combination. Entries are persisted through a pluggable storage engine
+(see cache_backends.py); the default is a single SQLite database. An optional EvictionPolicy
+bounds the cache by size, entry count and age. Recently used entries are also kept in an
+in-process LRU hot tier so re-queued media never touches disk. ``get_or_claim`` lets
+concurrent workers (threads or processes sharing the cache directory) coordinate so
+only one of them calls the API for a given key.
 """
 
 import os
 import json
 import hashlib
+import threading
 import time
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Sequence, Tuple, Union
+
+from .cache_backends import (TOUCH_RESOLUTION, CacheBackend, InterProcessLock, JsonFileBackend, SQLiteBackend,
+                             migrate_json_cache)
+from .cache_bundle import export_bundle, import_bundle, warm_up
+from .cache_encoding import UnsupportedEncodingError, decode_entry, encode_entry, is_complete_entry
+from .cache_metrics import CacheMetrics
+from .media_fingerprint import fingerprint_tensor
+
+
+# path -> ((st_ino, st_mtime_ns, st_size), identifier), see _file_identifier()
+_identity_memo: Dict[str, Tuple[Tuple[int, int, int], str]] = {}
+_IDENTITY_MEMO_MAX = 1 << 17
+
+
+def _file_identifier(file_path: str) -> str:
+    """
+    Identifier for a file from a single ``os.stat``.
+
+    Every call still stats the file, since that is how changes are detected; the
+    memo, keyed by path and the file's identity (inode, nanosecond mtime, size), only
+    saves formatting the identifier string again for unchanged files. The I/O saving
+    over earlier releases comes from one stat instead of exists/getmtime/getsize and
+    from not constructing a cache per call. The format matches earlier releases,
+    keeping existing cache entries valid.
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return f"missing:{file_path}"
+
+    identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+    memo = _identity_memo.get(file_path)
+    if memo is not None and memo[0] == identity:
+        return memo[1]
+
+    identifier = f"file:{file_path}:mtime:{st.st_mtime}:size:{st.st_size}"
+    if len(_identity_memo) >= _IDENTITY_MEMO_MAX:
+        try:
+            # Drop the oldest path (dicts keep insertion order)
+            del _identity_memo[next(iter(_identity_memo))]
+        except (KeyError, RuntimeError, StopIteration):
+            pass  # Another thread changed the memo concurrently
+    _identity_memo[file_path] = (identity, identifier)
+    return identifier
+
+
+class EvictionPolicy:
+    """
+    Bounds for the description cache. A limit of ``None`` disables it.
+
+    - max_bytes / max_entries: least-recently-hit entries are evicted until both hold
+    - max_age: entries written more than this many seconds ago are expired
+    - sweep_interval: seconds between background sweeps (``None`` disables the sweeper)
+    - batch_size: maximum entries evicted inline by a single ``set()``
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_entries: Optional[int] = None,
+                 max_age: Optional[float] = None, sweep_interval: Optional[float] = None,
+                 batch_size: int = 64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in (self.max_bytes, self.max_entries, self.max_age))
+
+    @classmethod
+    def from_env(cls) -> "EvictionPolicy":
+        """
+        Build a policy from environment variables (all optional):
+        GEMINI_CACHE_MAX_MB, GEMINI_CACHE_MAX_ENTRIES, GEMINI_CACHE_MAX_AGE_DAYS,
+        GEMINI_CACHE_SWEEP_INTERVAL (seconds, defaults to 600 when any limit is set).
+        """
+        def read(name, cast):
+            value = os.environ.get(name, "").strip()
+            if not value:
+                return None
+            try:
+                return cast(value)
+            except ValueError:
+                print(f"[CACHE] Ignoring invalid {name}={value!r}")
+                return None
+
+        max_mb = read("GEMINI_CACHE_MAX_MB", float)
+        max_age_days = read("GEMINI_CACHE_MAX_AGE_DAYS", float)
+        policy = cls(
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None,
+            max_entries=read("GEMINI_CACHE_MAX_ENTRIES", int),
+            max_age=max_age_days * 86400 if max_age_days is not None else None,
+            sweep_interval=read("GEMINI_CACHE_SWEEP_INTERVAL", float),
+        )
+        if policy.enabled and policy.sweep_interval is None:
+            policy.sweep_interval = 600.0
+        return policy
+
+
+class MemoryTier:
+    """
+    Bounded in-process LRU of decoded cache entries.
+
+    Bounded by entry count and by the encoded size of the entries (the same bytes
+    the backend stores), whichever limit is hit first. Each item remembers when the
+    backend last saw a hit for it so recency can be propagated without a write per hit.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, cache_key: str) -> Tuple[Optional[Dict[str, Any]], int, bool]:
+        """
+        Return ``(entry, size, needs_touch)``; *needs_touch* is True at most once per
+        TOUCH_RESOLUTION seconds per entry.
+        """
+        with self._lock:
+            item = self._entries.get(cache_key)
+            if item is None:
+                return None, 0, False
+            self._entries.move_to_end(cache_key)
+            now = time.time()
+            needs_touch = now - item[2] > TOUCH_RESOLUTION
+            if needs_touch:
+                item[2] = now
+            return item[0], item[1], needs_touch
+
+    def put(self, cache_key: str, entry: Dict[str, Any], size: int) -> None:
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[cache_key] = [entry, size, time.time()]
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted[1]
+
+    def discard(self, cache_key: str) -> None:
+        with self._lock:
+            item = self._entries.pop(cache_key, None)
+            if item is not None:
+                self.total_bytes -= item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+class _Flight:
+    """An in-progress computation for one cache key (see GeminiCache.get_or_claim)."""
+
+    def __init__(self, owner: int):
+        self.owner = owner
+        self.done = threading.Event()
+        self.file_lock: Optional[InterProcessLock] = None
 
 
 class GeminiCache:
     """
-    Simple file-based cache for Gemini media descriptions.
+    Persistent cache for Gemini media descriptions.
 
     Cache key format: hash(media_identifier + gemini_model + model_type + options_hash)
     Where:
-    - media_identifier is file_path+mtime for files, or content_hash for tensors
+    - media_identifier is file_path+mtime for files, or a content fingerprint for tensors
     - gemini_model is the model name (e.g., "models/gemini-2.5-flash")
     - model_type is for images only (e.g., "Text2Image", "ImageEdit")
     - options_hash is an MD5 hash of the JSON-serialized options dictionary
 
     This design scales to unlimited options without requiring code changes.
+
+    Storage backends:
+    - "sqlite" (default): single WAL-mode database file ``gemini_cache.sqlite3`` in cache_dir.
+      Legacy ``<cache_key>.json`` files found in cache_dir are migrated into it on first use.
+    - "json": the original one-file-per-entry layout
+    - any CacheBackend instance
+
+    Payload encodings (see cache_encoding.py), readable regardless of the setting:
+    - "compact": compressed msgpack/JSON with shared fields deduplicated
+      (default for the SQLite backend)
+    - "json": pretty-printed JSON (default for the JSON file backend)
+
+    When an EvictionPolicy is given, each ``set()`` evicts a bounded batch of
+    least-recently-hit entries if the cache is over its limits, expired entries are
+    treated as misses, and an optional daemon thread sweeps the whole cache periodically.
+
+    Lookups go through a MemoryTier first; writes go to both tiers (write-through), so
+    the same media re-queued within a session is served without disk I/O. Hits and
+    misses are counted per tier in ``tier_stats``.
+
+    ``get_or_claim`` provides single-flight misses: the first caller to miss a key
+    claims it (in-process and through a lock file under ``locks/``), and concurrent
+    callers for the same key wait for its ``set()`` instead of calling the API again.
     """
 
-    def __init__(self, cache_dir: Optional[str] = None):
-        """Initialize cache with specified directory."""
+    DB_FILENAME = "gemini_cache.sqlite3"
+    LOCK_DIRNAME = "locks"
+
+    # Longest time a waiter blocks on another worker's in-flight computation
+    FLIGHT_TIMEOUT = 300.0
+
+    def __init__(self, cache_dir: Optional[str] = None, backend: Union[str, CacheBackend] = "sqlite",
+                 eviction_policy: Optional[EvictionPolicy] = None,
+                 memory_max_entries: int = 256, memory_max_bytes: int = 32 * 1024 * 1024,
+                 encoding: Optional[str] = None, compression: str = "auto"):
+        """
+        Initialize cache with specified directory, storage backend and eviction policy.
+
+        memory_max_entries / memory_max_bytes bound the in-process hot tier
+        (set memory_max_entries=0 to disable it). encoding/compression select how new
+        entries are written; existing entries are read in whatever encoding they use.
+        """
         if cache_dir is None:
             # Use a cache directory in the same location as this module
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -37,21 +248,78 @@ class GeminiCache:
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
 
+        if isinstance(backend, CacheBackend):
+            self.backend = backend
+        elif backend == "sqlite":
+            self.backend = SQLiteBackend(os.path.join(cache_dir, self.DB_FILENAME))
+        elif backend == "json":
+            self.backend = JsonFileBackend(cache_dir)
+        else:
+            raise ValueError(f"Unknown cache backend: {backend}")
+
+        # Legacy JSON entries are imported lazily, on the first real cache access
+        self._migration_checked = not isinstance(self.backend, SQLiteBackend)
+
+        if encoding is None:
+            encoding = "json" if isinstance(self.backend, JsonFileBackend) else "compact"
+        self.encoding = encoding
+        self.compression = compression
+        # Fail fast on unknown encodings/compressions
+        encode_entry({}, encoding, compression)
+
+        self.eviction_policy = eviction_policy or EvictionPolicy()
+        self._eviction_lock = threading.Lock()
+        self.eviction_stats = {
+            'evicted_entries': 0,
+            'evicted_bytes': 0,
+            'expired_entries': 0,
+            'sweeps': 0,
+        }
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_stop = threading.Event()
+
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self._migration_lock = threading.Lock()
+
+        self.memory = MemoryTier(memory_max_entries, memory_max_bytes)
+        self.metrics = CacheMetrics()
+        self._stats_lock = threading.Lock()
+        self.tier_stats = {
+            'memory': {'hits': 0, 'misses': 0},
+            'disk': {'hits': 0, 'misses': 0},
+        }
+
+        if self.eviction_policy.enabled and self.eviction_policy.sweep_interval:
+            self.start_sweeper()
+
+    def _ensure_migrated(self) -> None:
+        """Import legacy per-entry JSON files into the configured backend once."""
+        if self._migration_checked:
+            return
+        with self._migration_lock:
+            if self._migration_checked:
+                return
+            try:
+                # Other workers sharing the directory may be migrating at the same time
+                with InterProcessLock(os.path.join(self.cache_dir, ".migrate.lock")):
+                    migrate_json_cache(self.cache_dir, self.backend)
+            except Exception as e:
+                print(f"[CACHE] Failed to migrate legacy JSON cache in {self.cache_dir}: {e}")
+            self._migration_checked = True
+
     def _get_file_identifier(self, file_path: str) -> str:
         """Get unique identifier for a file based on path and modification time."""
-        if not os.path.exists(file_path):
-            return f"missing:{file_path}"
+        return _file_identifier(file_path)
 
-        mtime = os.path.getmtime(file_path)
-        size = os.path.getsize(file_path)
-        return f"file:{file_path}:mtime:{mtime}:size:{size}"
+    def _get_tensor_identifier(self, tensor_data: Any, mode: str = "exact") -> str:
+        """
+        Get unique identifier for tensor data by hashing its content.
 
-    def _get_tensor_identifier(self, tensor_data: Any) -> str:
-        """Get unique identifier for tensor data by hashing its content."""
-        # Convert tensor to string representation and hash it
-        tensor_str = str(tensor_data)
-        hash_obj = hashlib.sha256(tensor_str.encode('utf-8'))
-        return f"tensor:{hash_obj.hexdigest()[:16]}"
+        "exact" hashes the raw tensor buffer; "perceptual" uses a downsampled
+        difference hash so near-identical images share an identifier.
+        """
+        return f"tensor:{fingerprint_tensor(tensor_data, mode)}"
 
     def _get_cache_key(self, media_identifier: str, gemini_model: str, 
                       model_type: str = "", options: Dict[str, Any] = None) -> str:
@@ -73,10 +341,6 @@ class GeminiCache:
         hash_obj = hashlib.sha256(key_string.encode('utf-8'))
         return hash_obj.hexdigest()
 
-    def _get_cache_file_path(self, cache_key: str) -> str:
-        """Get the file path for storing cache entry."""
-        return os.path.join(self.cache_dir, f"{cache_key}.json")
-
     def get(self, media_identifier: str, gemini_model: str, 
             model_type: str = "", options: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """
@@ -91,30 +355,234 @@ class GeminiCache:
         Returns:
             Cached result dictionary or None if not found
         """
+        started = time.perf_counter()
+        cache_key = self._get_cache_key(media_identifier, gemini_model, model_type, options)
+        cached_data = self._lookup(cache_key)
+        self.metrics.record_lookup(cache_key, gemini_model, media_identifier, cached_data is not None,
+                                   time.perf_counter() - started)
+        return cached_data
+
+    def get_or_claim(self, media_identifier: str, gemini_model: str, model_type: str = "",
+                     options: Dict[str, Any] = None, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Like get(), but coordinates concurrent misses for the same key (single-flight).
+
+        On a miss the caller claims the key and becomes responsible for computing it:
+        it must call set() with the result (which releases the claim) or
+        release_claims() if the computation fails. Callers that miss while another
+        thread or process holds the claim wait for that result instead.
+
+        Args:
+            timeout: Maximum seconds to wait for another worker (default FLIGHT_TIMEOUT).
+                After the timeout the caller proceeds without a claim.
+
+        Returns:
+            Cached result dictionary, or None if the caller should compute the result
+        """
+        started = time.perf_counter()
         cache_key = self._get_cache_key(media_identifier, gemini_model, model_type, options)
-        cache_file = self._get_cache_file_path(cache_key)
+        cached_data = self._claim(cache_key, timeout)
+        # Latency includes any time spent waiting for another worker's result
+        self.metrics.record_lookup(cache_key, gemini_model, media_identifier, cached_data is not None,
+                                   time.perf_counter() - started)
+        return cached_data
+
+    def _claim(self, cache_key: str, timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + (self.FLIGHT_TIMEOUT if timeout is None else timeout)
+        me = threading.get_ident()
+
+        while True:
+            cached_data = self._lookup(cache_key)
+            if cached_data is not None:
+                return cached_data
+
+            with self._flights_lock:
+                flight = self._flights.get(cache_key)
+                if flight is None:
+                    flight = self._flights[cache_key] = _Flight(me)
+                    break
+                if flight.owner == me:
+                    # Already claimed by this thread
+                    return None
+
+            # Another thread is computing this key; wait, then re-check the cache
+            if not flight.done.wait(max(0.0, deadline - time.monotonic())):
+                print(f"[CACHE] Timed out waiting for in-flight entry {cache_key}, computing it here")
+                return None
 
-        if not os.path.exists(cache_file):
+        # This thread owns the key in-process; now claim it across processes
+        lock = InterProcessLock(os.path.join(self.cache_dir, self.LOCK_DIRNAME, f"{cache_key}.lock"),
+                                remove_on_release=True)
+        try:
+            if lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                flight.file_lock = lock
+            else:
+                print(f"[CACHE] Timed out waiting for another process on {cache_key}, computing it here")
+        except OSError as e:
+            print(f"[CACHE] Could not lock {cache_key}: {e}")
+
+        # Another process may have stored the result while we waited for its lock
+        cached_data = self._lookup(cache_key)
+        if cached_data is not None:
+            self._release_flight(cache_key)
+        return cached_data
+
+    def _release_flight(self, cache_key: str) -> None:
+        with self._flights_lock:
+            flight = self._flights.pop(cache_key, None)
+        if flight is None:
+            return
+        if flight.file_lock is not None:
+            flight.file_lock.release()
+        flight.done.set()
+
+    def release_claims(self) -> None:
+        """Release every claim held by the current thread (call when a computation fails)."""
+        me = threading.get_ident()
+        with self._flights_lock:
+            owned = [cache_key for cache_key, flight in self._flights.items() if flight.owner == me]
+        for cache_key in owned:
+            self._release_flight(cache_key)
+
+    def _count(self, tier: str, outcome: str) -> None:
+        with self._stats_lock:
+            self.tier_stats[tier][outcome] += 1
+
+    def _is_expired(self, cached_data: Dict[str, Any]) -> bool:
+        max_age = self.eviction_policy.max_age
+        return max_age is not None and time.time() - cached_data['timestamp'] > max_age
+
+    def _lookup_memory(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of *cache_key* from the memory tier, counting the outcome."""
+        cached_data, size, needs_touch = self.memory.get(cache_key)
+        if cached_data is not None:
+            if not self._is_expired(cached_data):
+                self._count('memory', 'hits')
+                self.metrics.record_hit(cached_data, 'memory', size)
+                if needs_touch:
+                    try:
+                        self.backend.touch(cache_key)
+                    except Exception as e:
+                        print(f"[CACHE] Failed to record hit for {cache_key}: {e}")
+                return dict(cached_data)
+            self.memory.discard(cache_key)
+        self._count('memory', 'misses')
+        return None
+
+    def _load_payload(self, cache_key: str, payload: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """Decode and validate a payload read from the backend, promoting hits to memory."""
+        if payload is None:
+            self._count('disk', 'misses')
             return None
 
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
+            cached_data = decode_entry(payload)
+        except UnsupportedEncodingError as e:
+            # Written by a host with more codecs installed; leave it for that host
+            print(f"[CACHE] Skipping cache entry {cache_key}: {e}")
+            self._count('disk', 'misses')
+            return None
+        except (ValueError, UnicodeDecodeError) as e:
+            # If cache entry is corrupted, remove it
+            print(f"[CACHE] Corrupted cache entry {cache_key}, removing: {e}")
+            self.backend.delete(cache_key)
+            self._count('disk', 'misses')
+            return None
 
-            # Verify cache entry has required fields
-            if not all(key in cached_data for key in ['description', 'timestamp', 'cache_key']):
-                return None
+        # Verify cache entry has required fields
+        if not is_complete_entry(cached_data):
+            self._count('disk', 'misses')
+            return None
+
+        if self._is_expired(cached_data):
+            if self.backend.delete(cache_key):
+                with self._eviction_lock:
+                    self.eviction_stats['expired_entries'] += 1
+                    self.eviction_stats['evicted_bytes'] += len(payload)
+            self._count('disk', 'misses')
+            return None
+
+        self._count('disk', 'hits')
+        self.metrics.record_hit(cached_data, 'disk', len(payload))
+        self.memory.put(cache_key, cached_data, len(payload))
+        return dict(cached_data)
 
+    def _lookup(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Resolve *cache_key* through the memory tier, then the storage backend."""
+        cached_data = self._lookup_memory(cache_key)
+        if cached_data is not None:
             return cached_data
 
-        except (json.JSONDecodeError, IOError) as e:
-            # If cache file is corrupted, remove it
-            print(f"[CACHE] Corrupted cache file {cache_file}, removing: {e}")
-            try:
-                os.remove(cache_file)
-            except OSError:
-                pass
+        self._ensure_migrated()
+        try:
+            payload = self.backend.read(cache_key)
+        except Exception as e:
+            print(f"[CACHE] Failed to read cache entry {cache_key}: {e}")
+            self._count('disk', 'misses')
             return None
+        return self._load_payload(cache_key, payload)
+
+    def preload(self, cache_keys: Sequence[str]) -> int:
+        """
+        Load *cache_keys* from the backend into the memory tier without counting hits.
+
+        Keys are given most important first; if the tier's budget runs out the later
+        keys are the ones left out.
+
+        Returns:
+            Number of entries loaded into memory
+        """
+        if not self.memory.max_entries or not cache_keys:
+            return 0
+        self._ensure_migrated()
+        payloads = self.backend.peek_many(list(cache_keys))
+
+        loaded = 0
+        # Insert least important first so the most important end up most recently used
+        for cache_key in reversed(cache_keys):
+            payload = payloads.get(cache_key)
+            if payload is None:
+                continue
+            try:
+                cached_data = decode_entry(payload)
+            except (ValueError, UnicodeDecodeError):
+                continue
+            if is_complete_entry(cached_data) and not self._is_expired(cached_data):
+                self.memory.put(cache_key, cached_data, len(payload))
+                loaded += 1
+        return loaded
+
+    def export_bundle(self, path: str) -> int:
+        """Write every live entry to a portable bundle file (see cache_bundle)."""
+        return export_bundle(self, path)
+
+    def import_bundle(self, path: str, overwrite: bool = False) -> Dict[str, int]:
+        """Merge a bundle into this cache; existing entries win unless *overwrite*."""
+        return import_bundle(self, path, overwrite)
+
+    def warm_up(self, path: str) -> Dict[str, int]:
+        """Import a bundle and preload its most recent entries into the memory tier."""
+        return warm_up(self, path)
+
+    def _build_entry(self, cache_key: str, media_identifier: str, gemini_model: str, description: str,
+                     model_type: str, options: Optional[Dict[str, Any]],
+                     extra_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Copy options so later mutation by the caller cannot leak into the hot tier
+        cache_entry = {
+            'cache_key': cache_key,
+            'media_identifier': media_identifier,
+            'gemini_model': gemini_model,
+            'model_type': model_type,
+            'options': dict(options) if options else {},
+            'description': description,
+            'timestamp': time.time(),
+            'human_timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+        # Add any extra data
+        if extra_data:
+            cache_entry.update(extra_data)
+        return cache_entry
 
     def set(self, media_identifier: str, gemini_model: str, description: str,
             model_type: str = "", options: Dict[str, Any] = None,
@@ -131,77 +599,320 @@ class GeminiCache:
             extra_data: Additional data to store (e.g., status, video_info)
         """
         cache_key = self._get_cache_key(media_identifier, gemini_model, model_type, options)
-        cache_file = self._get_cache_file_path(cache_key)
+        try:
+            self._ensure_migrated()
+            cache_entry = self._build_entry(cache_key, media_identifier, gemini_model, description,
+                                            model_type, options, extra_data)
 
-        if options is None:
-            options = {}
+            try:
+                payload = encode_entry(cache_entry, self.encoding, self.compression)
+                self.backend.write(cache_key, payload, cache_entry['timestamp'])
+            except Exception as e:
+                print(f"[CACHE] Failed to write cache entry {cache_key}: {e}")
+                self.memory.discard(cache_key)
+                return
+
+            self.memory.put(cache_key, cache_entry, len(payload))
+            self.metrics.record_write(cache_key, gemini_model, media_identifier, len(payload))
+        finally:
+            # Wake up anyone waiting on this key in get_or_claim()
+            self._release_flight(cache_key)
+
+        self._evict_after_write(1)
+
+    def _evict_after_write(self, written: int) -> None:
+        if not self.eviction_policy.enabled:
+            return
+        try:
+            self._enforce_limits(max_evictions=max(self.eviction_policy.batch_size, written))
+        except Exception as e:
+            print(f"[CACHE] Eviction after write failed: {e}")
 
-        cache_entry = {
-            'cache_key': cache_key,
-            'media_identifier': media_identifier,
-            'gemini_model': gemini_model,
-            'model_type': model_type,
-            'options': options,
-            'description': description,
-            'timestamp': time.time(),
-            'human_timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-        }
+    def get_many(self, requests: Sequence[Tuple[Any, ...]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Retrieve several cached descriptions at once.
 
-        # Add any extra data
-        if extra_data:
-            cache_entry.update(extra_data)
+        Args:
+            requests: Sequence of ``(media_identifier, gemini_model[, model_type[, options]])``
+                tuples, in the same order as the arguments of ``get()``
+
+        Returns:
+            List aligned with *requests*: the cached result dictionary or None per item.
+            Keys are resolved in one pass, memory-tier hits are served directly and the
+            remaining keys are fetched from the backend in a single batch.
+        """
+        started = time.perf_counter()
+        cache_keys = [self._get_cache_key(*request) for request in requests]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(cache_keys)
+
+        pending: Dict[str, List[int]] = {}
+        for index, cache_key in enumerate(cache_keys):
+            if cache_key in pending:
+                pending[cache_key].append(index)
+                continue
+            cached_data = self._lookup_memory(cache_key)
+            if cached_data is not None:
+                results[index] = cached_data
+            else:
+                pending[cache_key] = [index]
+
+        if pending:
+            self._ensure_migrated()
+            try:
+                payloads = self.backend.read_many(list(pending))
+            except Exception as e:
+                print(f"[CACHE] Failed to read {len(pending)} cache entries: {e}")
+                payloads = {}
+            for cache_key, indexes in pending.items():
+                cached_data = self._load_payload(cache_key, payloads.get(cache_key))
+                for position, index in enumerate(indexes):
+                    results[index] = cached_data if position == 0 or cached_data is None else dict(cached_data)
+
+        # The batch shares one round trip, so each item is charged an equal share of it
+        share = (time.perf_counter() - started) / max(1, len(requests))
+        for request, cache_key, cached_data in zip(requests, cache_keys, results):
+            self.metrics.record_lookup(cache_key, request[1], request[0], cached_data is not None, share)
+        return results
+
+    def set_many(self, items: Sequence[Tuple[Any, ...]]) -> None:
+        """
+        Store several descriptions at once.
+
+        Args:
+            items: Sequence of ``(media_identifier, gemini_model, description[, model_type[, options[, extra_data]]])``
+                tuples, in the same order as the arguments of ``set()``. Payloads are
+                written in one backend batch (a single transaction for SQLite).
+        """
+        if not items:
+            return
+        self._ensure_migrated()
+
+        entries: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+        for item in items:
+            item = tuple(item)
+            media_identifier, gemini_model, description, model_type, options, extra_data = \
+                item + ("", None, None)[len(item) - 3:]
+            cache_key = self._get_cache_key(media_identifier, gemini_model, model_type, options)
+            cache_entry = self._build_entry(cache_key, media_identifier, gemini_model, description,
+                                            model_type, options, extra_data)
+            try:
+                entries[cache_key] = (cache_entry, encode_entry(cache_entry, self.encoding, self.compression))
+            except Exception as e:
+                print(f"[CACHE] Failed to encode cache entry {cache_key}: {e}")
+                # Nothing will be stored for this key; let get_or_claim() waiters compute it
+                self._release_flight(cache_key)
 
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_entry, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"[CACHE] Failed to write cache file {cache_file}: {e}")
+            self.backend.write_many({cache_key: payload for cache_key, (_, payload) in entries.items()},
+                                    {cache_key: entry['timestamp'] for cache_key, (entry, _) in entries.items()})
+        except Exception as e:
+            print(f"[CACHE] Failed to write {len(entries)} cache entries: {e}")
+            for cache_key in entries:
+                self.memory.discard(cache_key)
+                self._release_flight(cache_key)
+            return
+
+        for cache_key, (cache_entry, payload) in entries.items():
+            self.memory.put(cache_key, cache_entry, len(payload))
+            self.metrics.record_write(cache_key, cache_entry['gemini_model'], cache_entry['media_identifier'],
+                                      len(payload))
+            self._release_flight(cache_key)
+        self._evict_after_write(len(entries))
+
+    def _deleted_bytes(self, candidates: List[Tuple[str, int]], removed: int) -> int:
+        """Bytes freed by a delete_many() of *candidates* that reported *removed* deletions."""
+        if removed >= len(candidates):
+            return sum(size for _, size in candidates)
+        if removed == 0:
+            return 0
+        # Partial delete: only count the keys that are actually gone
+        remaining = self.backend.peek_many([cache_key for cache_key, _ in candidates])
+        return sum(size for cache_key, size in candidates if cache_key not in remaining)
+
+    def _enforce_limits(self, max_evictions: Optional[int] = None) -> int:
+        """
+        Evict least-recently-hit entries until the size and entry limits hold.
+
+        Args:
+            max_evictions: Stop after this many evictions (None evicts as many as needed)
+
+        Returns:
+            Number of entries evicted
+        """
+        policy = self.eviction_policy
+        if policy.max_bytes is None and policy.max_entries is None:
+            return 0
+
+        evicted = 0
+        with self._eviction_lock:
+            while max_evictions is None or evicted < max_evictions:
+                stats = self.backend.stats()
+                excess_entries = stats['entries'] - policy.max_entries if policy.max_entries is not None else 0
+                excess_bytes = stats['total_size'] - policy.max_bytes if policy.max_bytes is not None else 0
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    break
+
+                limit = policy.batch_size if max_evictions is None else max_evictions - evicted
+                victims = []
+                for cache_key, size in self.backend.lru_candidates(limit):
+                    if excess_entries <= 0 and excess_bytes <= 0:
+                        break
+                    victims.append((cache_key, size))
+                    excess_entries -= 1
+                    excess_bytes -= size
+                if not victims:
+                    break
+
+                removed = self.backend.delete_many(cache_key for cache_key, _ in victims)
+                for cache_key, _ in victims:
+                    self.memory.discard(cache_key)
+                evicted += removed
+                self.eviction_stats['evicted_entries'] += removed
+                self.eviction_stats['evicted_bytes'] += self._deleted_bytes(victims, removed)
+                if removed == 0:
+                    break
+        return evicted
+
+    def _expire_entries(self) -> int:
+        """Remove every entry older than the policy's max_age."""
+        if self.eviction_policy.max_age is None:
+            return 0
+
+        cutoff = time.time() - self.eviction_policy.max_age
+        expired = 0
+        with self._eviction_lock:
+            while True:
+                candidates = self.backend.expired_candidates(cutoff, self.eviction_policy.batch_size)
+                if not candidates:
+                    break
+                removed = self.backend.delete_many(cache_key for cache_key, _ in candidates)
+                for cache_key, _ in candidates:
+                    self.memory.discard(cache_key)
+                expired += removed
+                self.eviction_stats['expired_entries'] += removed
+                self.eviction_stats['evicted_bytes'] += self._deleted_bytes(candidates, removed)
+                if removed == 0:
+                    break
+        return expired
+
+    def sweep(self) -> Dict[str, int]:
+        """Run a full eviction pass: expire old entries, then trim to the size/entry limits."""
+        self._ensure_migrated()
+        expired = self._expire_entries()
+        evicted = self._enforce_limits()
+        with self._eviction_lock:
+            self.eviction_stats['sweeps'] += 1
+        return {'expired': expired, 'evicted': evicted}
+
+    def start_sweeper(self) -> None:
+        """Start the background sweeper thread if it is not already running."""
+        interval = self.eviction_policy.sweep_interval
+        if not interval or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+
+        self._sweeper_stop.clear()
+
+        def run():
+            while not self._sweeper_stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[CACHE] Background sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=run, name="GeminiCacheSweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        """Stop the background sweeper thread."""
+        self._sweeper_stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
 
     def get_cache_info(self) -> Dict[str, Any]:
         """Get information about the cache."""
-        if not os.path.exists(self.cache_dir):
-            return {'cache_dir': self.cache_dir, 'entries': 0, 'total_size': 0}
-
-        entries = 0
-        total_size = 0
+        self._ensure_migrated()
+        try:
+            stats = self.backend.stats()
+        except Exception as e:
+            print(f"[CACHE] Failed to read cache stats: {e}")
+            stats = {'entries': 0, 'total_size': 0}
 
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.json'):
-                entries += 1
-                file_path = os.path.join(self.cache_dir, filename)
-                try:
-                    total_size += os.path.getsize(file_path)
-                except OSError:
-                    pass
+        policy = self.eviction_policy
+        with self._eviction_lock:
+            evictions = dict(self.eviction_stats)
+        with self._stats_lock:
+            tiers = {tier: dict(counters) for tier, counters in self.tier_stats.items()}
 
         return {
             'cache_dir': self.cache_dir,
-            'entries': entries,
-            'total_size': total_size,
-            'total_size_mb': round(total_size / (1024 * 1024), 2)
+            'backend': self.backend.name,
+            'encoding': self.encoding,
+            'entries': stats['entries'],
+            'total_size': stats['total_size'],
+            'total_size_mb': round(stats['total_size'] / (1024 * 1024), 2),
+            'limits': {
+                'max_bytes': policy.max_bytes,
+                'max_entries': policy.max_entries,
+                'max_age': policy.max_age,
+            },
+            'evictions': evictions,
+            'memory_tier': {
+                'entries': len(self.memory),
+                'total_size': self.memory.total_bytes,
+                'max_entries': self.memory.max_entries,
+                'max_bytes': self.memory.max_bytes,
+            },
+            'tiers': tiers,
+            'metrics': self.metrics.snapshot(),
         }
 
 
 # Utility functions for different media types
 def get_file_media_identifier(file_path: str) -> str:
     """Get media identifier for a file path."""
-    cache = GeminiCache()
-    return cache._get_file_identifier(file_path)
+    return _file_identifier(file_path)
 
 
-def get_tensor_media_identifier(tensor_data: Any) -> str:
-    """Get media identifier for tensor data."""
-    cache = GeminiCache()
-    return cache._get_tensor_identifier(tensor_data)
+def get_tensor_media_identifier(tensor_data: Any, mode: str = "exact") -> str:
+    """Get media identifier for tensor data ("exact" or "perceptual" fingerprint)."""
+    return f"tensor:{fingerprint_tensor(tensor_data, mode)}"
+
+
+def warm_up_from_env() -> Optional[threading.Thread]:
+    """
+    Warm the global cache from the bundle named by GEMINI_CACHE_WARMUP_BUNDLE.
+
+    Runs in a daemon thread so ComfyUI startup is not delayed; returns the thread,
+    or None when no bundle is configured.
+    """
+    path = os.environ.get("GEMINI_CACHE_WARMUP_BUNDLE", "").strip()
+    if not path:
+        return None
+
+    def run():
+        try:
+            stats = get_cache().warm_up(path)
+            print(f"[CACHE] Warmed up from {path}: {stats}")
+        except Exception as e:
+            print(f"[CACHE] Warm-up from {path} failed: {e}")
+
+    thread = threading.Thread(target=run, name="gemini-cache-warmup", daemon=True)
+    thread.start()
+    return thread
 
 
 # Global cache instance
 _global_cache = None
+_global_cache_lock = threading.Lock()
 
 
 def get_cache() -> GeminiCache:
     """Get the global cache instance."""
     global _global_cache
     if _global_cache is None:
-        _global_cache = GeminiCache()
+        # The warm-up thread may race the first node execution
+        with _global_cache_lock:
+            if _global_cache is None:
+                _global_cache = GeminiCache(eviction_policy=EvictionPolicy.from_env())
     return _global_cache
\ No newline at end of file
@@ -0,0 +1,610 @@
+"""
+Storage engines for the Gemini description cache.
+
+GeminiCache serializes each entry to bytes and hands it to a backend keyed by the
+SHA-256 cache key. Two engines are provided:
+
+- JsonFileBackend: the original layout, one ``<cache_key>.json`` file per entry
+- SQLiteBackend: a single database file in WAL mode with an indexed key column and
+  trigger-maintained counters, so stats never walk the entries
+
+``migrate_json_cache`` performs the one-shot import of a legacy JSON directory into
+any other backend.
+
+Backends record a last-hit timestamp on every read (coarsened to ``TOUCH_RESOLUTION``
+seconds to avoid a write per hit) so GeminiCache can evict least-recently-used entries.
+Writes may carry the entry's own creation time, so entries migrated or imported from
+elsewhere keep their age for max-age sweeps instead of looking brand new.
+
+Several ComfyUI workers may share one cache directory. JSON entries are written to a
+temp file and renamed into place, so readers never observe a partial file; SQLite
+relies on its own transactional locking. ``InterProcessLock`` provides the advisory
+file locks GeminiCache uses for one-time migration and single-flight misses.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windows: locks degrade to in-process only
+    fcntl = None
+    FCNTL_AVAILABLE = False
+
+_MIGRATION_BATCH_SIZE = 500
+
+# Last-hit timestamps are only rewritten when older than this many seconds
+TOUCH_RESOLUTION = 60.0
+
+# Worker threads used by the default batch implementations (file I/O releases the GIL)
+_BATCH_WORKERS = 8
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_SQLITE_BATCH_SIZE = 500
+
+
+class InterProcessLock:
+    """
+    Exclusive advisory lock on a lock file, held with ``flock``.
+
+    flock locks belong to the open file description, so the lock also excludes other
+    threads of the same process that open the file separately. When
+    ``remove_on_release`` is set the lock file is unlinked on release; acquirers verify
+    that the file they locked is still the one on disk, so a concurrent unlink cannot
+    let two holders in at once. Where fcntl is unavailable acquisition always succeeds.
+    """
+
+    def __init__(self, path: str, remove_on_release: bool = False):
+        self.path = path
+        self.remove_on_release = remove_on_release
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, timeout: Optional[float] = None, poll_interval: float = 0.05) -> bool:
+        """Try to take the lock, waiting up to *timeout* seconds (None waits forever)."""
+        if not FCNTL_AVAILABLE:
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                same_file = os.path.samestat(os.fstat(fd), os.stat(self.path))
+            except FileNotFoundError:
+                same_file = False
+            if same_file:
+                self._fd = fd
+                return True
+            # The previous holder removed the file after we opened it; start over
+            os.close(fd)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if self.remove_on_release:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "InterProcessLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class CacheBackend:
+    """Interface for cache storage engines. Payloads are opaque bytes."""
+
+    name = "base"
+
+    def read(self, cache_key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def write(self, cache_key: str, payload: bytes, created_at: Optional[float] = None) -> None:
+        """Store *payload*; *created_at* is when the entry was made (default: now)."""
+        raise NotImplementedError
+
+    def read_many(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        """Read several payloads; missing keys are absent from the result."""
+        if len(cache_keys) <= 1:
+            payloads = {cache_key: self.read(cache_key) for cache_key in cache_keys}
+        else:
+            with ThreadPoolExecutor(max_workers=min(_BATCH_WORKERS, len(cache_keys))) as executor:
+                payloads = dict(zip(cache_keys, executor.map(self.read, cache_keys)))
+        return {cache_key: payload for cache_key, payload in payloads.items() if payload is not None}
+
+    def peek_many(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        """Like read_many(), but without recording hits (for bulk export)."""
+        return self.read_many(cache_keys)
+
+    def write_many(self, items: Dict[str, bytes], created_at: Optional[Dict[str, float]] = None) -> None:
+        """Write several payloads; *created_at* optionally maps keys to their creation time."""
+        created_at = created_at or {}
+        if len(items) <= 1:
+            for cache_key, payload in items.items():
+                self.write(cache_key, payload, created_at.get(cache_key))
+            return
+        with ThreadPoolExecutor(max_workers=min(_BATCH_WORKERS, len(items))) as executor:
+            # list() propagates the first write error
+            list(executor.map(lambda item: self.write(item[0], item[1], created_at.get(item[0])), items.items()))
+
+    def delete(self, cache_key: str) -> bool:
+        raise NotImplementedError
+
+    def touch(self, cache_key: str) -> None:
+        """Record a hit served from a faster tier so LRU eviction sees it."""
+
+    def keys(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Return ``{'entries': int, 'total_size': int}``."""
+        raise NotImplementedError
+
+    def lru_candidates(self, limit: int) -> List[Tuple[str, int]]:
+        """Return up to *limit* ``(cache_key, size)`` pairs, least recently hit first."""
+        raise NotImplementedError
+
+    def expired_candidates(self, cutoff: float, limit: int) -> List[Tuple[str, int]]:
+        """Return up to *limit* ``(cache_key, size)`` pairs created before *cutoff*."""
+        raise NotImplementedError
+
+    def delete_many(self, cache_keys: Iterable[str]) -> int:
+        return sum(1 for cache_key in cache_keys if self.delete(cache_key))
+
+    def clear(self) -> None:
+        for cache_key in list(self.keys()):
+            self.delete(cache_key)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonFileBackend(CacheBackend):
+    """
+    One JSON file per entry in a flat directory (legacy layout).
+
+    Counting entries means walking the directory, so ``stats()`` scans it at most once
+    per ``STATS_RESCAN_INTERVAL`` seconds and adjusts the totals for this process's own
+    writes and deletes in between. Size-limit checks after every write stay O(1);
+    entries written or removed by other workers show up after the next rescan.
+    """
+
+    name = "json"
+
+    STATS_RESCAN_INTERVAL = 60.0
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._stats_lock = threading.Lock()
+        self._stats: Optional[Dict[str, int]] = None
+        self._stats_scanned_at = 0.0
+
+    def _adjust_stats(self, entries: int, size: int) -> None:
+        with self._stats_lock:
+            if self._stats is not None:
+                self._stats['entries'] += entries
+                self._stats['total_size'] += size
+
+    def _existing_size(self, path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return None
+
+    def _path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, f"{cache_key}.json")
+
+    def read(self, cache_key: str) -> Optional[bytes]:
+        path = self._path(cache_key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+                st = os.fstat(f.fileno())
+        except FileNotFoundError:
+            return None
+
+        # atime doubles as the last-hit timestamp; mtime stays the write time
+        now = time.time()
+        if now - st.st_atime > TOUCH_RESOLUTION:
+            try:
+                os.utime(path, (now, st.st_mtime))
+            except OSError:
+                pass
+        return payload
+
+    def peek_many(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        payloads = {}
+        for cache_key in cache_keys:
+            try:
+                with open(self._path(cache_key), 'rb') as f:
+                    payloads[cache_key] = f.read()
+            except FileNotFoundError:
+                pass
+        return payloads
+
+    def write(self, cache_key: str, payload: bytes, created_at: Optional[float] = None) -> None:
+        # Write to a temp file in the same directory and rename it into place so
+        # concurrent readers see either the old entry or the complete new one
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-", suffix=".partial")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            if created_at is not None:
+                # mtime is the creation time expiry sweeps select on
+                os.utime(tmp_path, (time.time(), created_at))
+            path = self._path(cache_key)
+            previous_size = self._existing_size(path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        if previous_size is None:
+            self._adjust_stats(1, len(payload))
+        else:
+            self._adjust_stats(0, len(payload) - previous_size)
+
+    def touch(self, cache_key: str) -> None:
+        path = self._path(cache_key)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def delete(self, cache_key: str) -> bool:
+        path = self._path(cache_key)
+        size = self._existing_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        self._adjust_stats(-1, -(size or 0))
+        return True
+
+    def keys(self) -> Iterator[str]:
+        with os.scandir(self.cache_dir) as it:
+            for dir_entry in it:
+                if dir_entry.name.endswith('.json') and dir_entry.is_file():
+                    yield dir_entry.name[:-len('.json')]
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            if self._stats is not None and time.monotonic() - self._stats_scanned_at < self.STATS_RESCAN_INTERVAL:
+                return dict(self._stats)
+            entries = 0
+            total_size = 0
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith('.json'):
+                        continue
+                    entries += 1
+                    try:
+                        total_size += dir_entry.stat().st_size
+                    except OSError:
+                        pass
+            self._stats = {'entries': entries, 'total_size': total_size}
+            self._stats_scanned_at = time.monotonic()
+            return dict(self._stats)
+
+    def _scan(self) -> List[Tuple[str, os.stat_result]]:
+        scanned = []
+        with os.scandir(self.cache_dir) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith('.json'):
+                    continue
+                try:
+                    scanned.append((dir_entry.name[:-len('.json')], dir_entry.stat()))
+                except OSError:
+                    pass
+        return scanned
+
+    def lru_candidates(self, limit: int) -> List[Tuple[str, int]]:
+        scanned = sorted(self._scan(), key=lambda item: max(item[1].st_atime, item[1].st_mtime))
+        return [(cache_key, st.st_size) for cache_key, st in scanned[:limit]]
+
+    def expired_candidates(self, cutoff: float, limit: int) -> List[Tuple[str, int]]:
+        expired = [(cache_key, st.st_size) for cache_key, st in self._scan() if st.st_mtime < cutoff]
+        return expired[:limit]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Single-file SQLite store in WAL mode.
+
+    ``cache_key`` is the primary key of a WITHOUT ROWID table, so lookups are a single
+    B-tree probe. Entry count and payload bytes are kept in ``cache_stats`` by triggers,
+    making ``stats()`` O(1) regardless of cache size. ``last_hit`` and ``created_at`` are
+    indexed so eviction candidates come straight off an index. ``created_at`` is the
+    creation time passed to ``write()``, falling back to the time of the write.
+    """
+
+    name = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            cache_key TEXT PRIMARY KEY,
+            payload BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_hit REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS cache_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            entries INTEGER NOT NULL,
+            total_size INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO cache_stats (id, entries, total_size) VALUES (0, 0, 0);
+
+        CREATE TRIGGER IF NOT EXISTS entries_after_insert AFTER INSERT ON entries BEGIN
+            UPDATE cache_stats SET entries = entries + 1, total_size = total_size + NEW.size WHERE id = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_after_delete AFTER DELETE ON entries BEGIN
+            UPDATE cache_stats SET entries = entries - 1, total_size = total_size - OLD.size WHERE id = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_after_update AFTER UPDATE OF size ON entries BEGIN
+            UPDATE cache_stats SET total_size = total_size - OLD.size + NEW.size WHERE id = 0;
+        END;
+    """
+
+    _INDEXES = """
+        CREATE INDEX IF NOT EXISTS entries_last_hit ON entries (last_hit);
+        CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at);
+    """
+
+    _UPSERT = (
+        "INSERT INTO entries (cache_key, payload, size, created_at, last_hit) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(cache_key) DO UPDATE SET payload = excluded.payload, size = excluded.size, "
+        "created_at = excluded.created_at, last_hit = excluded.last_hit"
+    )
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so constructing a cache does not touch the database
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if "last_hit" not in columns:
+                # Databases created before eviction support
+                conn.execute("ALTER TABLE entries ADD COLUMN last_hit REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE entries SET last_hit = created_at")
+            conn.executescript(self._INDEXES)
+            self._conn = conn
+        return self._conn
+
+    def read(self, cache_key: str) -> Optional[bytes]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT payload, last_hit FROM entries WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > TOUCH_RESOLUTION:
+                conn.execute("UPDATE entries SET last_hit = ? WHERE cache_key = ?", (now, cache_key))
+        return bytes(row[0])
+
+    def write(self, cache_key: str, payload: bytes, created_at: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                self._UPSERT, (cache_key, sqlite3.Binary(payload), len(payload),
+                               now if created_at is None else created_at, now)
+            )
+
+    def read_many(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        """Fetch several payloads with chunked ``IN`` queries, recording the hits."""
+        payloads: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            stale = []
+            for start in range(0, len(cache_keys), _SQLITE_BATCH_SIZE):
+                chunk = cache_keys[start:start + _SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT cache_key, payload, last_hit FROM entries WHERE cache_key IN ({placeholders})", chunk
+                ).fetchall()
+                for cache_key, payload, last_hit in rows:
+                    payloads[cache_key] = bytes(payload)
+                    if now - last_hit > TOUCH_RESOLUTION:
+                        stale.append((now, cache_key))
+            if stale:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany("UPDATE entries SET last_hit = ? WHERE cache_key = ?", stale)
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+        return payloads
+
+    def peek_many(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        payloads: Dict[str, bytes] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(cache_keys), _SQLITE_BATCH_SIZE):
+                chunk = cache_keys[start:start + _SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for cache_key, payload in conn.execute(
+                        f"SELECT cache_key, payload FROM entries WHERE cache_key IN ({placeholders})", chunk):
+                    payloads[cache_key] = bytes(payload)
+        return payloads
+
+    def write_many(self, items: Dict[str, bytes], created_at: Optional[Dict[str, float]] = None) -> None:
+        """Insert several payloads in one transaction."""
+        now = time.time()
+        created_at = created_at or {}
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    self._UPSERT,
+                    [(key, sqlite3.Binary(payload), len(payload), created_at.get(key, now), now)
+                     for key, payload in items.items()],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+    def touch(self, cache_key: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "UPDATE entries SET last_hit = ? WHERE cache_key = ?", (time.time(), cache_key)
+            )
+
+    def delete(self, cache_key: str) -> bool:
+        with self._lock:
+            cursor = self._connection().execute("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, cache_keys: Iterable[str]) -> int:
+        keys = [(cache_key,) for cache_key in cache_keys]
+        if not keys:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.executemany("DELETE FROM entries WHERE cache_key = ?", keys)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._connection().execute("SELECT cache_key FROM entries").fetchall()
+        for (cache_key,) in rows:
+            yield cache_key
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, total_size = self._connection().execute(
+                "SELECT entries, total_size FROM cache_stats WHERE id = 0"
+            ).fetchone()
+        return {'entries': entries, 'total_size': total_size}
+
+    def lru_candidates(self, limit: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT cache_key, size FROM entries ORDER BY last_hit LIMIT ?", (limit,)
+            ).fetchall()
+
+    def expired_candidates(self, cutoff: float, limit: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT cache_key, size FROM entries WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, limit),
+            ).fetchall()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def migrate_json_cache(json_dir: str, target: CacheBackend, remove_source: bool = True) -> int:
+    """
+    Import every ``<cache_key>.json`` file in *json_dir* into *target*.
+
+    Files are read as-is (the payload format is unchanged) and written in batches; when
+    *remove_source* is set each batch's files are deleted once written, so the migration
+    runs only once and can resume if interrupted. Each file's mtime, the time the legacy
+    backend wrote the entry, is carried over as its creation time.
+
+    Returns:
+        Number of entries migrated
+    """
+    if not os.path.isdir(json_dir):
+        return 0
+
+    migrated = 0
+    batch: Dict[str, bytes] = {}
+    batch_created_at: Dict[str, float] = {}
+    batch_paths = []
+
+    def flush() -> None:
+        target.write_many(batch, batch_created_at)
+        if remove_source:
+            for path in batch_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        batch.clear()
+        batch_created_at.clear()
+        batch_paths.clear()
+
+    with os.scandir(json_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.name.endswith('.json') or not dir_entry.is_file():
+                continue
+            cache_key = dir_entry.name[:-len('.json')]
+            try:
+                with open(dir_entry.path, 'rb') as f:
+                    batch[cache_key] = f.read()
+                    batch_created_at[cache_key] = os.fstat(f.fileno()).st_mtime
+            except OSError as e:
+                print(f"[CACHE] Skipping unreadable cache file {dir_entry.path}: {e}")
+                continue
+            batch_paths.append(dir_entry.path)
+            migrated += 1
+            if len(batch) >= _MIGRATION_BATCH_SIZE:
+                flush()
+
+    if batch:
+        flush()
+
+    if migrated:
+        print(f"[CACHE] Migrated {migrated} JSON cache entries to {target.name} backend")
+    return migrated
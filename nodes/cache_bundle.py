@@ -0,0 +1,286 @@
+"""
+Export/import bundles for the Gemini description cache.
+
+A bundle is a single SQLite file that carries cache entries between machines, so
+render hosts can ship descriptions to each other instead of each paying for the same
+API calls. It holds two tables:
+
+- ``meta``: format version, creation time, source host, entry count and the exact
+  tensor fingerprint hasher of the source host
+- ``entries``: one row per cache key with the entry as zlib-compressed JSON (readable
+  on any host, whatever codecs it has installed) and the SHA-256 of that blob, which
+  is verified on import
+
+Cache keys are derived from the media identifier, model and options. Tensor inputs
+are identified by a hash of their content, so their entries hit on any host that
+fingerprints tensors with the same hasher (SHA-256 unless ``GEMINI_CACHE_TENSOR_HASH``
+says otherwise, see media_fingerprint.py); importing entries made with another hasher
+prints a warning, as they can never hit. File inputs are identified by path, mtime and
+size, so they only hit on hosts that see the same files at the same paths (shared
+storage or synced folders).
+
+Usage:
+    python -m nodes.cache_bundle export bundle.sqlite3
+    python -m nodes.cache_bundle import bundle.sqlite3 [--overwrite]
+    python -m nodes.cache_bundle info bundle.sqlite3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from .cache_encoding import decode_entry, encode_entry, is_complete_entry
+from .media_fingerprint import HASH_NAME
+
+if TYPE_CHECKING:
+    from .cache import GeminiCache
+
+
+BUNDLE_FORMAT = 1
+
+_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    cache_key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    blob BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_timestamp ON entries(timestamp);
+"""
+
+
+def _pack_entry(entry: Dict[str, Any]) -> Tuple[str, bytes]:
+    document = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    blob = zlib.compress(document.encode("utf-8"), 6)
+    return hashlib.sha256(blob).hexdigest(), blob
+
+
+def _open_bundle(path: str) -> sqlite3.Connection:
+    """Open an existing bundle read-only, checking its format version."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Cache bundle not found: {path}")
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+    except sqlite3.DatabaseError as e:
+        conn.close()
+        raise ValueError(f"Not a cache bundle: {path} ({e})") from e
+    if row is None or int(row[0]) > BUNDLE_FORMAT:
+        conn.close()
+        raise ValueError(f"Unsupported cache bundle format in {path}: {row and row[0]}")
+    return conn
+
+
+def read_bundle_info(path: str) -> Dict[str, str]:
+    """Return the ``meta`` table of a bundle."""
+    conn = _open_bundle(path)
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    finally:
+        conn.close()
+
+
+def iter_bundle(path: str) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Yield ``(cache_key, entry)`` for every row of a bundle.
+
+    ``entry`` is None for rows that fail the digest check or cannot be decoded.
+    """
+    conn = _open_bundle(path)
+    try:
+        for cache_key, digest, blob in conn.execute("SELECT cache_key, digest, blob FROM entries"):
+            if hashlib.sha256(blob).hexdigest() != digest:
+                print(f"[CACHE] Bundle entry {cache_key} failed its digest check, skipping")
+                yield cache_key, None
+                continue
+            try:
+                entry = json.loads(zlib.decompress(blob).decode("utf-8"))
+            except (ValueError, zlib.error) as e:
+                print(f"[CACHE] Bundle entry {cache_key} is unreadable, skipping: {e}")
+                yield cache_key, None
+                continue
+            yield cache_key, entry if is_complete_entry(entry) else None
+    finally:
+        conn.close()
+
+
+def recent_bundle_keys(path: str, limit: int) -> List[str]:
+    """Return up to *limit* cache keys of a bundle, most recently created first."""
+    conn = _open_bundle(path)
+    try:
+        rows = conn.execute("SELECT cache_key FROM entries ORDER BY timestamp DESC LIMIT ?", (limit,))
+        return [cache_key for (cache_key,) in rows]
+    finally:
+        conn.close()
+
+
+def _tensor_hasher(entry: Dict[str, Any]) -> Optional[str]:
+    """Hasher of an exact tensor fingerprint (``tensor:<hasher>:<digest>``), else None."""
+    media_identifier = str(entry.get('media_identifier', ''))
+    if not media_identifier.startswith('tensor:'):
+        return None
+    hasher = media_identifier.split(':', 2)[1]
+    # Perceptual fingerprints do not depend on the hasher
+    return None if hasher == 'dhash' else hasher
+
+
+def export_bundle(cache: "GeminiCache", path: str) -> int:
+    """
+    Write every live entry of *cache* to a bundle at *path*.
+
+    The bundle is built next to *path* and renamed into place, so an existing bundle
+    is replaced atomically. Reading entries for export does not count as a hit.
+
+    Returns:
+        Number of entries exported
+    """
+    cache._ensure_migrated()
+    tmp_path = f"{path}.partial"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    exported = 0
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        cache_keys = list(cache.backend.keys())
+        for start in range(0, len(cache_keys), _BATCH_SIZE):
+            rows = []
+            for cache_key, payload in cache.backend.peek_many(cache_keys[start:start + _BATCH_SIZE]).items():
+                try:
+                    entry = decode_entry(payload)
+                except (ValueError, UnicodeDecodeError) as e:
+                    print(f"[CACHE] Not exporting cache entry {cache_key}: {e}")
+                    continue
+                if not is_complete_entry(entry) or cache._is_expired(entry):
+                    continue
+                digest, blob = _pack_entry(entry)
+                rows.append((cache_key, digest, entry['timestamp'], blob))
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            exported += len(rows)
+
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(BUNDLE_FORMAT)),
+            ("created_at", str(time.time())),
+            ("host", socket.gethostname()),
+            ("entries", str(exported)),
+            ("tensor_hash", HASH_NAME),
+        ])
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, path)
+    print(f"[CACHE] Exported {exported} cache entries to {path}")
+    return exported
+
+
+def import_bundle(cache: "GeminiCache", path: str, overwrite: bool = False) -> Dict[str, int]:
+    """
+    Merge the entries of a bundle into *cache*.
+
+    Entries are re-encoded in the cache's own encoding. Entries already present are
+    kept unless *overwrite* is set; entries past the cache's max age are skipped.
+    The cache's size limits are enforced afterwards.
+
+    Returns:
+        ``{'imported': int, 'skipped': int, 'invalid': int}``
+    """
+    cache._ensure_migrated()
+    stats = {'imported': 0, 'skipped': 0, 'invalid': 0}
+    batch: Dict[str, Dict[str, Any]] = {}
+    foreign_hashers: Dict[str, int] = {}
+
+    def flush() -> None:
+        existing = set() if overwrite else set(cache.backend.peek_many(list(batch)))
+        payloads = {
+            cache_key: encode_entry(entry, cache.encoding, cache.compression)
+            for cache_key, entry in batch.items() if cache_key not in existing
+        }
+        if payloads:
+            # Keep each entry's original age so max-age sweeps see it
+            cache.backend.write_many(payloads, {cache_key: batch[cache_key]['timestamp'] for cache_key in payloads})
+            for cache_key in payloads:
+                # Never serve a replaced entry from memory
+                cache.memory.discard(cache_key)
+        stats['imported'] += len(payloads)
+        stats['skipped'] += len(batch) - len(payloads)
+        batch.clear()
+
+    for cache_key, entry in iter_bundle(path):
+        if entry is None:
+            stats['invalid'] += 1
+        elif cache._is_expired(entry):
+            stats['skipped'] += 1
+        else:
+            hasher = _tensor_hasher(entry)
+            if hasher is not None and hasher != HASH_NAME:
+                foreign_hashers[hasher] = foreign_hashers.get(hasher, 0) + 1
+            batch[cache_key] = entry
+            if len(batch) >= _BATCH_SIZE:
+                flush()
+    if batch:
+        flush()
+
+    cache._enforce_limits()
+    for hasher, count in foreign_hashers.items():
+        print(f"[CACHE] {count} tensor entries in {path} were fingerprinted with {hasher}, this host uses "
+              f"{HASH_NAME}; they will not hit unless GEMINI_CACHE_TENSOR_HASH={hasher} is set here")
+    print(f"[CACHE] Imported {stats['imported']} cache entries from {path} "
+          f"({stats['skipped']} skipped, {stats['invalid']} invalid)")
+    return stats
+
+
+def warm_up(cache: "GeminiCache", path: str) -> Dict[str, int]:
+    """
+    Import a bundle and preload its most recent entries into the memory tier.
+
+    Returns:
+        The import_bundle() counters plus ``'preloaded'``
+    """
+    stats = import_bundle(cache, path)
+    keys = recent_bundle_keys(path, cache.memory.max_entries) if cache.memory.max_entries else []
+    stats['preloaded'] = cache.preload(keys)
+    return stats
+
+
+def main() -> int:
+    from .cache import GeminiCache
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import", "info"))
+    parser.add_argument("bundle", help="Bundle file path")
+    parser.add_argument("--cache-dir", default=None, help="Cache directory (default: the node's cache)")
+    parser.add_argument("--overwrite", action="store_true", help="On import, replace existing entries")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for key, value in read_bundle_info(args.bundle).items():
+            print(f"{key}: {value}")
+        return 0
+
+    cache = GeminiCache(cache_dir=args.cache_dir)
+    if args.command == "export":
+        cache.export_bundle(args.bundle)
+    else:
+        cache.import_bundle(args.bundle, overwrite=args.overwrite)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
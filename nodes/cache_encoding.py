@@ -0,0 +1,195 @@
+"""
+Payload encodings for the Gemini description cache.
+
+Two encodings are supported:
+
+- "json": pretty-printed UTF-8 JSON, the original on-disk format
+- "compact": a small binary header followed by a compressed body. The body is
+  msgpack when available (compact JSON otherwise) and is compressed with zstd when
+  available (zlib otherwise). Before serialization, redundant fields are
+  deduplicated: string fields identical to another field become references, and
+  fields holding JSON documents (``all_data``, ``raw_llm_json`` from the LLM Studio
+  path) are embedded structurally with their copies of other fields replaced by
+  references. Every transformation is checked to round-trip byte-for-byte.
+
+``decode_entry`` reads both encodings, so legacy JSON entries keep working.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+ENCODINGS = ("json", "compact")
+COMPRESSIONS = ("auto", "zstd", "zlib", "none")
+
+MAGIC = b"GCE1"
+_SERIALIZERS = {b"j": "json", b"m": "msgpack"}
+_CODECS = {b"n": "none", b"z": "zlib", b"s": "zstd"}
+
+# Strings shorter than this are not worth replacing with a reference
+_MIN_SHARED_LENGTH = 16
+
+
+# Fields every usable cache entry carries
+REQUIRED_FIELDS = ("description", "timestamp", "cache_key")
+
+
+class UnsupportedEncodingError(ValueError):
+    """The payload is valid but needs a codec that is not installed on this host."""
+
+
+def is_complete_entry(entry: Any) -> bool:
+    """True if a decoded payload is a dict with every field GeminiCache relies on."""
+    return isinstance(entry, dict) and all(field in entry for field in REQUIRED_FIELDS)
+
+
+def _resolve_compression(compression: str) -> str:
+    if compression == "auto":
+        return "zstd" if ZSTD_AVAILABLE else "zlib"
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown cache compression: {compression}")
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression requested but the 'zstandard' package is not installed")
+    return compression
+
+
+def _embedded_json(value: str) -> Optional[Tuple[Any, Optional[int]]]:
+    """Return ``(document, indent)`` if *value* is a JSON object that re-serializes exactly."""
+    if len(value) < 2 or value[0] != "{":
+        return None
+    try:
+        document = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(document, dict):
+        return None
+    for indent in (None, 2):
+        if json.dumps(document, indent=indent) == value:
+            return document, indent
+    return None
+
+
+def _pack(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Deduplicate shared string fields of *entry* into a reference structure."""
+    plain: Dict[str, Any] = {}
+    same: Dict[str, str] = {}
+    embedded: Dict[str, Any] = {}
+    by_value: Dict[str, str] = {}
+
+    for field, value in entry.items():
+        if not isinstance(value, str) or len(value) < _MIN_SHARED_LENGTH:
+            plain[field] = value
+            continue
+        if value in by_value:
+            same[field] = by_value[value]
+            plain[field] = None
+            continue
+        parsed = _embedded_json(value)
+        if parsed is not None:
+            document, indent = parsed
+            refs = {}
+            for key, inner in document.items():
+                if isinstance(inner, str) and inner in by_value:
+                    refs[key] = by_value[inner]
+            embedded[field] = [indent, {key: (None if key in refs else inner) for key, inner in document.items()}, refs]
+            plain[field] = None
+        else:
+            plain[field] = value
+        by_value.setdefault(value, field)
+
+    return {"v": plain, "s": same, "e": embedded}
+
+
+def _unpack(packed: Dict[str, Any]) -> Dict[str, Any]:
+    entry = packed["v"]
+    # References always point at fields that appear earlier in the entry
+    for field in entry:
+        if field in packed["s"]:
+            entry[field] = entry[packed["s"][field]]
+        elif field in packed["e"]:
+            indent, document, refs = packed["e"][field]
+            for key, source in refs.items():
+                document[key] = entry[source]
+            entry[field] = json.dumps(document, indent=indent)
+    return entry
+
+
+def encode_entry(entry: Dict[str, Any], encoding: str = "compact", compression: str = "auto") -> bytes:
+    """Serialize a cache entry to bytes in the requested encoding."""
+    if encoding == "json":
+        return json.dumps(entry, indent=2, ensure_ascii=False).encode("utf-8")
+    if encoding != "compact":
+        raise ValueError(f"Unknown cache encoding: {encoding}")
+
+    packed = _pack(entry)
+    if _unpack(_pack(entry)) != entry:
+        # Defensive: never store something that would not read back identically
+        packed = {"v": dict(entry), "s": {}, "e": {}}
+
+    if MSGPACK_AVAILABLE:
+        serializer, body = b"m", msgpack.packb(packed, use_bin_type=True)
+    else:
+        serializer, body = b"j", json.dumps(packed, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    codec = _resolve_compression(compression)
+    if codec == "zstd":
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+    elif codec == "zlib":
+        body = zlib.compress(body, 6)
+    codec_flag = {"none": b"n", "zlib": b"z", "zstd": b"s"}[codec]
+
+    return MAGIC + serializer + codec_flag + body
+
+
+def decode_entry(payload: bytes) -> Any:
+    """
+    Deserialize a payload written by ``encode_entry`` (either encoding).
+
+    Raises:
+        ValueError: The payload is corrupted
+        UnsupportedEncodingError: The payload needs msgpack/zstd, which are not installed
+    """
+    if not payload.startswith(MAGIC):
+        return json.loads(payload.decode("utf-8"))
+
+    serializer = _SERIALIZERS.get(payload[4:5])
+    codec = _CODECS.get(payload[5:6])
+    if serializer is None or codec is None:
+        raise ValueError("Unknown compact cache header")
+
+    body = payload[6:]
+    try:
+        if codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise UnsupportedEncodingError("cache entry is zstd-compressed but 'zstandard' is not installed")
+            body = zstandard.ZstdDecompressor().decompress(body)
+        elif codec == "zlib":
+            body = zlib.decompress(body)
+
+        if serializer == "msgpack":
+            if not MSGPACK_AVAILABLE:
+                raise UnsupportedEncodingError("cache entry is msgpack-encoded but 'msgpack' is not installed")
+            packed = msgpack.unpackb(body, raw=False)
+        else:
+            packed = json.loads(body.decode("utf-8"))
+    except UnsupportedEncodingError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Corrupted compact cache entry: {e}") from e
+
+    if not isinstance(packed, dict) or not {"v", "s", "e"} <= packed.keys():
+        raise ValueError("Malformed compact cache entry")
+    return _unpack(packed)
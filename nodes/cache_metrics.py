@@ -0,0 +1,217 @@
+"""
+Hit-rate and latency instrumentation for the Gemini description cache.
+
+``CacheMetrics`` keeps counters per ``(gemini_model, media_type)``:
+
+- lookups, hits (split by memory/disk tier), misses and bytes served from cache
+- writes and bytes written
+- a histogram of lookup latency and one of compute latency, the time from a miss
+  to the ``set()`` that fills it (i.e. the API call the cache exists to avoid)
+- estimated time saved: each hit is credited with the mean compute latency
+  observed for its model and media type
+
+Snapshots are plain dicts, served by the ``/swissarmyknife/cache/stats`` route.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Union
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 30000, 60000)
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm", ".m4v"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+
+# Misses waiting for their set() are forgotten beyond this many
+_MAX_PENDING = 1024
+
+
+def classify_media(media_identifier: str) -> str:
+    """Return "image", "video" or "other" for a cache media identifier."""
+    if media_identifier.startswith("tensor:"):
+        return "image"
+    path = media_identifier
+    if path.startswith("file:"):
+        # file:{path}:mtime:{mtime}:size:{size}
+        path = path[len("file:"):path.rfind(":mtime:")]
+    elif path.startswith("missing:"):
+        path = path[len("missing:"):]
+    extension = os.path.splitext(path)[1].lower()
+    if extension in VIDEO_EXTENSIONS:
+        return "video"
+    if extension in IMAGE_EXTENSIONS:
+        return "image"
+    return "other"
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (not thread-safe; CacheMetrics locks around it)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile_ms(self, fraction: float) -> Union[float, str, None]:
+        """
+        Upper bound of the bucket holding the given fraction of observations.
+
+        Returns "+Inf" when that is the unbounded bucket (kept JSON-safe), None when empty.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return "+Inf"
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["+Inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean_ms, 3),
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _Series:
+    def __init__(self):
+        self.lookups = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.time_saved = 0.0
+        self.lookup_latency = LatencyHistogram()
+        self.compute_latency = LatencyHistogram()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+            "bytes_read": self.bytes_read,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "api_calls_saved": self.hits,
+            "time_saved_seconds": round(self.time_saved, 3),
+            "lookup_latency": self.lookup_latency.snapshot(),
+            "compute_latency": self.compute_latency.snapshot(),
+        }
+
+
+class CacheMetrics:
+    """Thread-safe per-model / per-media-type cache counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._pending: "OrderedDict[str, float]" = OrderedDict()
+        self.started_at = time.time()
+
+    def _get_series(self, gemini_model: str, media_identifier: str) -> _Series:
+        key = (gemini_model, classify_media(media_identifier))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def _mean_compute_seconds(self, gemini_model: str, media_identifier: str) -> float:
+        series = self._get_series(gemini_model, media_identifier)
+        if series.compute_latency.count:
+            return series.compute_latency.mean_ms / 1000
+        # No API call observed yet for this model/media type: use the overall mean
+        count = sum(s.compute_latency.count for s in self._series.values())
+        total_ms = sum(s.compute_latency.total_ms for s in self._series.values())
+        return total_ms / count / 1000 if count else 0.0
+
+    def record_lookup(self, cache_key: str, gemini_model: str, media_identifier: str,
+                      hit: bool, seconds: float) -> None:
+        """Count one get()/get_or_claim() outcome and its latency."""
+        with self._lock:
+            series = self._get_series(gemini_model, media_identifier)
+            series.lookups += 1
+            series.lookup_latency.observe(seconds)
+            if hit:
+                series.hits += 1
+                series.time_saved += self._mean_compute_seconds(gemini_model, media_identifier)
+            else:
+                series.misses += 1
+                self._pending[cache_key] = time.monotonic()
+                self._pending.move_to_end(cache_key)
+                while len(self._pending) > _MAX_PENDING:
+                    self._pending.popitem(last=False)
+
+    def record_hit(self, entry: Dict[str, Any], tier: str, size: int) -> None:
+        """Count the tier and bytes of a hit; *entry* names its model and media."""
+        with self._lock:
+            series = self._get_series(entry.get('gemini_model', ''), entry.get('media_identifier', ''))
+            series.bytes_read += size
+            if tier == 'memory':
+                series.memory_hits += 1
+            else:
+                series.disk_hits += 1
+
+    def record_write(self, cache_key: str, gemini_model: str, media_identifier: str, size: int) -> None:
+        """Count a write and, if it fills an earlier miss, the compute latency."""
+        with self._lock:
+            series = self._get_series(gemini_model, media_identifier)
+            series.writes += 1
+            series.bytes_written += size
+            started = self._pending.pop(cache_key, None)
+            if started is not None:
+                series.compute_latency.observe(time.monotonic() - started)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._pending.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals plus one row per (model, media type)."""
+        with self._lock:
+            rows: List[Dict[str, Any]] = []
+            for (gemini_model, media_type), series in sorted(self._series.items()):
+                row = {"gemini_model": gemini_model, "media_type": media_type}
+                row.update(series.snapshot())
+                rows.append(row)
+
+        totals: Dict[str, Any] = {}
+        for field in ("lookups", "hits", "memory_hits", "disk_hits", "misses", "bytes_read", "writes",
+                      "bytes_written", "api_calls_saved", "time_saved_seconds"):
+            totals[field] = sum(row[field] for row in rows)
+        totals["time_saved_seconds"] = round(totals["time_saved_seconds"], 3)
+        totals["hit_rate"] = round(totals["hits"] / totals["lookups"], 4) if totals["lookups"] else None
+        return {
+            "since": self.started_at,
+            "totals": totals,
+            "by_model": rows,
+        }
@@ -0,0 +1,176 @@
+"""Persistent CivitAI metadata cache keyed by file hash.
+
+CivitAI lookups are made by content hash (``/model-versions/by-hash/<hash>``), so the
+answer belongs to the hash rather than to the path the file happens to live at. Each
+lookup is stored under ``<hash_type>-<HASH>`` in one of the Gemini cache storage
+backends (see cache_backends.py; SQLite by default, in ``cache/civitai``), which
+makes it shared by every ``CivitAIService`` instance, every ComfyUI worker using the
+same directory, and restarts.
+
+Found models are kept for ``ttl`` seconds. Hashes CivitAI answered with a 404 are
+cached as negative results for the shorter ``negative_ttl``, so a LoRA that is not on
+CivitAI does not cost an API call per execution but is picked up soon after it is
+uploaded. Network and API errors are never cached. Expired entries are ignored on
+read and deleted by ``purge_expired``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Union
+
+from .cache_backends import CacheBackend, JsonFileBackend, SQLiteBackend
+from .debug_utils import Logger
+
+logger = Logger("CivitAICache")
+
+# Rows deleted per purge_expired() batch
+_PURGE_BATCH_SIZE = 500
+
+
+def _hours_from_env(name: str, default: float) -> float:
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value) * 3600
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        return default
+
+
+class CivitAIMetadataCache:
+    """TTL cache of CivitAI by-hash lookups, with negative results expiring sooner."""
+
+    DB_FILENAME = "civitai_metadata.sqlite3"
+    # Found models: 7 days; hashes CivitAI does not know: 1 day
+    DEFAULT_TTL = 7 * 24 * 3600.0
+    DEFAULT_NEGATIVE_TTL = 24 * 3600.0
+
+    def __init__(self, cache_dir: Optional[str] = None, backend: Union[str, CacheBackend] = "sqlite",
+                 ttl: Optional[float] = None, negative_ttl: Optional[float] = None):
+        if cache_dir is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            cache_dir = os.path.join(base_dir, "cache", "civitai")
+        self.cache_dir = cache_dir
+
+        if isinstance(backend, CacheBackend):
+            self.backend = backend
+        elif backend == "sqlite":
+            self.backend = SQLiteBackend(os.path.join(cache_dir, self.DB_FILENAME))
+        elif backend == "json":
+            self.backend = JsonFileBackend(cache_dir)
+        else:
+            raise ValueError(f"Unknown cache backend: {backend}")
+
+        self.ttl = self.DEFAULT_TTL if ttl is None else ttl
+        self.negative_ttl = self.DEFAULT_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "writes": 0}
+
+    @classmethod
+    def from_env(cls) -> "CivitAIMetadataCache":
+        """Build the cache with TTLs from ``CIVITAI_CACHE_TTL_HOURS`` / ``CIVITAI_CACHE_NEGATIVE_TTL_HOURS``."""
+        return cls(ttl=_hours_from_env("CIVITAI_CACHE_TTL_HOURS", cls.DEFAULT_TTL),
+                   negative_ttl=_hours_from_env("CIVITAI_CACHE_NEGATIVE_TTL_HOURS", cls.DEFAULT_NEGATIVE_TTL))
+
+    @staticmethod
+    def _key(hash_type: str, hash_value: str) -> str:
+        return f"{hash_type.lower()}-{hash_value.upper()}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, hash_type: str, hash_value: str) -> Optional[Dict[str, Any]]:
+        """Return the cached lookup for a hash, or None if it is unknown or expired.
+
+        Returns:
+            ``{'found': bool, 'data': dict or None, 'stored_at': float}``
+        """
+        cache_key = self._key(hash_type, hash_value)
+        try:
+            payload = self.backend.read(cache_key)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"Failed to read CivitAI cache entry {cache_key}: {e}")
+            return None
+        if payload is None:
+            self._count("misses")
+            return None
+
+        try:
+            entry = json.loads(payload)
+            found = bool(entry["found"])
+            age = time.time() - float(entry["stored_at"])
+        except (ValueError, KeyError, TypeError):
+            self.backend.delete(cache_key)
+            self._count("misses")
+            return None
+
+        if age > (self.ttl if found else self.negative_ttl):
+            self.backend.delete(cache_key)
+            self._count("expired")
+            return None
+        self._count("hits" if found else "negative_hits")
+        return entry
+
+    def set(self, hash_type: str, hash_value: str, data: Optional[Dict[str, Any]]) -> None:
+        """Store a lookup result; ``data=None`` records that CivitAI has no model for the hash."""
+        entry = {"found": data is not None, "data": data, "stored_at": time.time()}
+        cache_key = self._key(hash_type, hash_value)
+        try:
+            self.backend.write(cache_key, json.dumps(entry, default=str).encode("utf-8"))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"Failed to write CivitAI cache entry {cache_key}: {e}")
+            return
+        self._count("writes")
+
+    def invalidate(self, hash_type: str, hash_value: str) -> bool:
+        return self.backend.delete(self._key(hash_type, hash_value))
+
+    def purge_expired(self) -> int:
+        """Delete entries older than the longest TTL; returns how many were removed."""
+        cutoff = time.time() - max(self.ttl, self.negative_ttl)
+        removed = 0
+        while True:
+            candidates = self.backend.expired_candidates(cutoff, _PURGE_BATCH_SIZE)
+            if not candidates:
+                return removed
+            removed += self.backend.delete_many(cache_key for cache_key, _ in candidates)
+
+    def clear(self) -> None:
+        self.backend.clear()
+        logger.log("CivitAI metadata cache cleared")
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def get_cache_info(self) -> Dict[str, Any]:
+        with self._lock:
+            info: Dict[str, Any] = dict(self._stats)
+        info.update(self.backend.stats())
+        info.update(cache_dir=self.cache_dir, backend=self.backend.name, ttl=self.ttl, negative_ttl=self.negative_ttl)
+        return info
+
+
+# Global cache instance
+_global_cache: Optional[CivitAIMetadataCache] = None
+_global_cache_lock = threading.Lock()
+
+
+def get_civitai_cache() -> CivitAIMetadataCache:
+    """Get the process-wide CivitAI metadata cache, purging expired entries on first use."""
+    global _global_cache
+    if _global_cache is None:
+        with _global_cache_lock:
+            if _global_cache is None:
+                cache = CivitAIMetadataCache.from_env()
+                try:
+                    cache.purge_expired()
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error(f"Failed to purge expired CivitAI cache entries: {e}")
+                _global_cache = cache
+    return _global_cache
@@ -0,0 +1,268 @@
+"""
+Offline CivitAI mirror backed by a local snapshot file.
+
+Render nodes without internet access can resolve ``model-versions/by-hash`` lookups
+from a snapshot made on a connected host. A snapshot is a single SQLite file with
+three tables:
+
+- ``meta``: format version, creation time, source host and version count
+- ``versions``: one row per CivitAI model version, with the raw by-hash API response
+  as zlib-compressed JSON and the time it was fetched
+- ``hashes``: ``<hash_type>-<HASH>`` -> version id, for every hash the version is known
+  by (the hashes of the local file that matched, plus the hashes CivitAI lists for
+  each of the version's files)
+
+The snapshot is exported from the CivitAI metadata cache, i.e. from responses already
+fetched on the connected host. Passing ``--folder`` first looks up every model file
+in those folders online, so the cache covers them.
+
+When ``CIVITAI_OFFLINE_SNAPSHOT`` names a snapshot, every ``CivitAIService`` answers
+from it instead of the network (see ``get_mirror``), producing the same result shape
+as an online lookup.
+
+Usage:
+    python -m nodes.civitai_mirror export snapshot.sqlite3 [--folder DIR ...]
+    python -m nodes.civitai_mirror info snapshot.sqlite3
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .civitai_cache import CivitAIMetadataCache
+from .debug_utils import Logger
+from .lora_indexer import MODEL_EXTENSIONS
+
+if TYPE_CHECKING:
+    from .civitai_service import CivitAIService
+
+logger = Logger("CivitAIMirror")
+
+SNAPSHOT_FORMAT = 1
+
+_BATCH_SIZE = 500
+
+# Keys of the "hashes" map of each file in a CivitAI model-version response
+_CIVITAI_HASH_NAMES = {"SHA256": "sha256", "AutoV1": "autov1", "AutoV2": "autov2", "BLAKE3": "blake3", "CRC32": "crc32"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    version_id INTEGER PRIMARY KEY,
+    fetched_at TEXT NOT NULL,
+    blob BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash_key TEXT PRIMARY KEY,
+    version_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _hash_key(hash_type: str, hash_value: str) -> str:
+    return f"{hash_type.lower()}-{hash_value.upper()}"
+
+
+def _version_hashes(data: Dict[str, Any]) -> Set[str]:
+    """Every ``hash_key`` a cached lookup result can be found by."""
+    keys = {_hash_key(hash_type, hash_value) for hash_type, hash_value in (data.get("all_hashes") or {}).items()
+            if hash_value}
+    for file_info in (data.get("api_response") or {}).get("files") or []:
+        for name, hash_value in (file_info.get("hashes") or {}).items():
+            if name in _CIVITAI_HASH_NAMES and hash_value:
+                keys.add(_hash_key(_CIVITAI_HASH_NAMES[name], hash_value))
+    if data.get("matched_hash_type") and data.get("matched_hash_value"):
+        keys.add(_hash_key(data["matched_hash_type"], data["matched_hash_value"]))
+    return keys
+
+
+def _open_snapshot(path: str) -> sqlite3.Connection:
+    """Open an existing snapshot read-only, checking its format version."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"CivitAI snapshot not found: {path}")
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+    except sqlite3.DatabaseError as e:
+        conn.close()
+        raise ValueError(f"Not a CivitAI snapshot: {path} ({e})") from e
+    if row is None or int(row[0]) > SNAPSHOT_FORMAT:
+        conn.close()
+        raise ValueError(f"Unsupported CivitAI snapshot format in {path}: {row and row[0]}")
+    return conn
+
+
+def read_snapshot_info(path: str) -> Dict[str, str]:
+    """Return the ``meta`` table of a snapshot."""
+    conn = _open_snapshot(path)
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    finally:
+        conn.close()
+
+
+class CivitAIMirror:
+    """Read-only by-hash lookups against a snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = _open_snapshot(path)
+        self._lock = threading.Lock()
+        self.info = read_snapshot_info(path)
+
+    def lookup(self, hash_type: str, hash_value: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Return ``(by-hash API response, fetched_at)`` for a hash, or None if it is not in the snapshot."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT v.blob, v.fetched_at FROM hashes h JOIN versions v ON v.version_id = h.version_id "
+                "WHERE h.hash_key = ?", (_hash_key(hash_type, hash_value),),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(zlib.decompress(row[0]).decode("utf-8")), row[1]
+        except (ValueError, zlib.error) as e:
+            logger.error(f"Unreadable snapshot entry for {hash_type} hash {hash_value[:16]}...: {e}")
+            return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _model_files(folders: Iterable[str]) -> List[str]:
+    paths = []
+    for folder in folders:
+        for root, _dirs, files in os.walk(folder, followlinks=True):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(MODEL_EXTENSIONS))
+    return sorted(paths)
+
+
+def export_snapshot(path: str, metadata_cache: CivitAIMetadataCache,
+                    folders: Optional[Iterable[str]] = None, service: Optional["CivitAIService"] = None) -> int:
+    """
+    Write every model found in *metadata_cache* to a snapshot at *path*.
+
+    With *folders*, every model file under them is first looked up through *service*
+    (which must use *metadata_cache*), so the snapshot covers them. Expired cache
+    entries are exported too: a stale answer beats none on an offline host. The
+    snapshot is built next to *path* and renamed into place.
+
+    Returns:
+        Number of model versions exported
+    """
+    if folders:
+        if service is None:
+            raise ValueError("export_snapshot needs a service to look up folders")
+        paths = _model_files(folders)
+        found = service.get_model_info_many(paths) if paths else []
+        print(f"[CIVITAI] Looked up {len(paths)} model files, {sum(1 for result in found if result)} found")
+
+    tmp_path = f"{path}.partial"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    versions = set()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        cache_keys = list(metadata_cache.backend.keys())
+        for start in range(0, len(cache_keys), _BATCH_SIZE):
+            version_rows, hash_rows = [], []
+            for cache_key, payload in metadata_cache.backend.peek_many(cache_keys[start:start + _BATCH_SIZE]).items():
+                try:
+                    entry = json.loads(payload)
+                except ValueError as e:
+                    print(f"[CIVITAI] Not exporting cache entry {cache_key}: {e}")
+                    continue
+                data = entry.get("data") if entry.get("found") else None
+                version_id = (data or {}).get("api_response", {}).get("id")
+                if not isinstance(version_id, int):
+                    continue
+                if version_id not in versions:
+                    versions.add(version_id)
+                    document = json.dumps(data["api_response"], ensure_ascii=False, separators=(",", ":"))
+                    version_rows.append((version_id, data.get("fetched_at", ""),
+                                         zlib.compress(document.encode("utf-8"), 6)))
+                hash_rows.extend((hash_key, version_id) for hash_key in _version_hashes(data))
+            conn.executemany("INSERT OR REPLACE INTO versions VALUES (?, ?, ?)", version_rows)
+            conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?)", hash_rows)
+
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(SNAPSHOT_FORMAT)),
+            ("created_at", str(time.time())),
+            ("host", socket.gethostname()),
+            ("versions", str(len(versions))),
+            ("hashes", str(conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0])),
+        ])
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, path)
+    print(f"[CIVITAI] Exported {len(versions)} model versions to {path}")
+    return len(versions)
+
+
+_mirror: Optional[CivitAIMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> Optional[CivitAIMirror]:
+    """Return the mirror for ``CIVITAI_OFFLINE_SNAPSHOT``, or None when online.
+
+    A configured snapshot that cannot be opened is logged and leaves the service online.
+    """
+    global _mirror
+    path = os.environ.get("CIVITAI_OFFLINE_SNAPSHOT", "").strip()
+    if not path:
+        return None
+    with _mirror_lock:
+        if _mirror is None or _mirror.path != path:
+            try:
+                _mirror = CivitAIMirror(path)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                logger.error(f"Could not open CivitAI snapshot {path}, staying online: {e}")
+                return None
+            print(f"[CIVITAI] Offline mode: resolving lookups from {path} "
+                  f"({_mirror.info.get('versions', '?')} model versions)")
+        return _mirror
+
+
+def main() -> int:
+    from .civitai_service import CivitAIService, get_civitai_service
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "info"))
+    parser.add_argument("snapshot", help="Snapshot file path")
+    parser.add_argument("--folder", action="append", default=[],
+                        help="Look up every model file under this folder first (repeatable)")
+    parser.add_argument("--api-key", default=None, help="CivitAI API key (default: the node settings)")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for key, value in read_snapshot_info(args.snapshot).items():
+            print(f"{key}: {value}")
+        return 0
+
+    service = CivitAIService(api_key=args.api_key) if args.api_key else get_civitai_service()
+    if service.mirror is not None:
+        parser.error("unset CIVITAI_OFFLINE_SNAPSHOT to export a snapshot")
+    export_snapshot(args.snapshot, service.cache, folders=args.folder, service=service)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,16 +1,37 @@
-"""CivitAI API integration for fetching LoRA metadata."""
+"""CivitAI API integration for fetching LoRA metadata.
+
+Requests go through one pooled ``httpx.AsyncClient`` owned by a background event loop
+thread (``_HTTPClientLoop``), shared by every ``CivitAIService`` instance. Connections
+are kept alive between lookups, so looking up a whole LoRA stack pays for one TCP/TLS
+handshake, and HTTP/2 is used when the optional ``h2`` package is installed.
+
+Every request, including retries, first takes a token from one process-wide
+``TokenBucket`` (``get_rate_limiter()``), so bulk lookups stay under CivitAI's per-key
+limits. A 429 pauses that bucket for the full ``Retry-After``.
+
+With ``CIVITAI_OFFLINE_SNAPSHOT`` set (see civitai_mirror.py), lookups are answered
+from a local snapshot instead and no request is made.
+"""
 
 from __future__ import annotations
 
 import asyncio
+import atexit
+import email.utils
+import functools
 import os
-from datetime import datetime
-from typing import Any, Dict, Optional, List
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import httpx
 
+from .civitai_cache import CivitAIMetadataCache, get_civitai_cache
+from .civitai_mirror import CivitAIMirror, get_mirror
 from .lora_hash_cache import get_cache as get_lora_hash_cache
 from .debug_utils import Logger
+from .rate_limiter import TokenBucket
 
 logger = Logger("CivitAI")
 
@@ -22,29 +43,149 @@ except ImportError:
     folder_paths = None
     COMFYUI_AVAILABLE = False
 
+# httpx negotiates HTTP/2 only when h2 is installed (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+# Default request budget: requests per second on average, and the largest burst
+DEFAULT_RATE_LIMIT = 2.0
+DEFAULT_RATE_BURST = 10
+
+# Pool limits for the shared client; idle connections are closed after KEEPALIVE_EXPIRY seconds
+MAX_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60.0
+
+
+class CivitAILookupError(Exception):
+    """A CivitAI lookup failed for a reason other than the hash being unknown."""
+
+
+class _HTTPClientLoop:
+    """Daemon thread running an event loop that owns the shared ``httpx.AsyncClient``.
+
+    The loop and client are created on first use and live until ``close()`` (registered
+    with atexit). Coroutines are submitted from any thread with ``run()``.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self.client = httpx.AsyncClient(
+                    http2=H2_AVAILABLE,
+                    limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                                        keepalive_expiry=KEEPALIVE_EXPIRY),
+                )
+                self._thread = threading.Thread(target=loop.run_forever, name="civitai-http", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run *coro* on the client loop and block until it finishes."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("_HTTPClientLoop.run() called from the client loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self._start()).result(timeout)
+
+    def close(self) -> None:
+        """Close pooled connections and stop the loop; the next ``run()`` starts a new one."""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self.client
+            self._loop = self._thread = self.client = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(5)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug(f"Error closing CivitAI HTTP client: {exc}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+_http = _HTTPClientLoop()
+atexit.register(_http.close)
+
+# Process-wide request budget (CIVITAI_RATE_LIMIT requests/s, bursts of CIVITAI_RATE_BURST)
+_rate_limiter = TokenBucket.from_env("CIVITAI", rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_RATE_BURST)
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Return the rate limiter shared by every CivitAIService."""
+    return _rate_limiter
+
 
 class CivitAIService:
     """Service for fetching LoRA metadata from CivitAI API"""
 
     BASE_URL = "https://civitai.com/api/v1"
 
-    MAX_RETRIES = 2
-
-    def __init__(self, api_key=None, *, timeout: float = 10.0):
-        self.cache: Dict[str, Optional[Dict[str, Any]]] = {}
+    # Retries after a 429, 5xx or timeout, and the backoff between them in seconds
+    MAX_RETRIES = 4
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 30.0
+
+    # Hash types tried against the by-hash endpoint, one at a time in priority order.
+    # The types of a tier are hashed together; the second tier needs a full pass over
+    # the file, so it is only hashed when the first one finds nothing
+    HASH_TIERS = (('sha256', 'autov1', 'autov2'), ('blake3', 'crc32'))
+    HASH_PRIORITY = tuple(hash_type for tier in HASH_TIERS for hash_type in tier)
+
+    # Requests in flight at once for one get_model_info_many() call
+    MAX_CONCURRENT_REQUESTS = 4
+
+    def __init__(self, api_key=None, *, timeout: float = 10.0,
+                 metadata_cache: Optional[CivitAIMetadataCache] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 mirror: Optional[CivitAIMirror] = None):
+        # Shared by every instance and persisted, keyed by hash
+        self.cache = metadata_cache or get_civitai_cache()
+        # Shared by every instance, since CivitAI limits requests per API key
+        self.rate_limiter = rate_limiter or _rate_limiter
+        # Offline mode: lookups are answered from a local snapshot, never the network
+        self.mirror = mirror if mirror is not None else get_mirror()
         # Use provided API key only (no environment variable fallback)
         self.api_key = api_key or ""
         self.timeout = timeout
         self._hash_cache = get_lora_hash_cache()
         # Only log if there's an issue with API key detection
-        if not self.api_key:
+        if not self.api_key and self.mirror is None:
             logger.log("❌ No CivitAI API key found (this may be normal during startup before settings sync)")
         # Successful API key detection is logged silently
 
     def get_model_info_by_hash(self, file_path: str) -> Optional[Dict[str, Any]]:
         """
         Get model information from CivitAI using file hash
-        Tries multiple hash types in order: SHA256, AutoV1, AutoV2, Blake3, CRC32
+        Tries multiple hash types in order: SHA256, AutoV1, AutoV2, Blake3, CRC32.
+        Answers, including "not on CivitAI", are cached by hash in the shared
+        CivitAIMetadataCache, so repeat lookups survive service refreshes and restarts.
 
         Args:
             file_path: Path to the LoRA file
@@ -52,121 +193,210 @@ class CivitAIService:
         Returns:
             Model information from CivitAI or None if not found
         """
-        try:
-            if not os.path.exists(file_path):
-                logger.log(f"File not found: {file_path}")
-                return None
+        if not os.path.exists(file_path):
+            logger.log(f"File not found: {file_path}")
+            return None
+        return self.get_model_info_many([file_path])[0]
 
-            # Get all hash types
-            file_hashes = self._hash_cache.get_hashes(file_path)
-            if not file_hashes:
-                logger.log(f"Could not compute hashes for {file_path}")
-                return None
+    def get_model_info_many(self, file_paths: Sequence[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up several LoRA files (e.g. a whole stack) concurrently.
+
+        The files are looked up at the same time, bounded by MAX_CONCURRENT_REQUESTS.
+        Within a file, hash types are tried one at a time in HASH_PRIORITY order and
+        the next one is only queried after a miss or an error, so a file SHA256 matches
+        costs one request. Missing files and files without a match give None.
 
-            # Check cache for any previously successful hash
-            cache_key = os.path.abspath(file_path)
-            if cache_key in self.cache:
-                logger.log(f"Using cached CivitAI data for file: {os.path.basename(file_path)}")
-                cached_result = self.cache[cache_key]
-                if cached_result:
-                    cached_result['cache_hit'] = True
-                return cached_result
-
-            # Try hash types in priority order
-            hash_priority = [
-                ('sha256', file_hashes.get('sha256')),
-                ('autov1', file_hashes.get('autov1')),
-                ('autov2', file_hashes.get('autov2')),
-                ('blake3', file_hashes.get('blake3')),
-                ('crc32', file_hashes.get('crc32')),
-            ]
-
-            result = None
-            for hash_type, hash_value in hash_priority:
+        Returns:
+            One result (see get_model_info_by_hash) per path, in the order of *file_paths*
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(file_paths)
+        indexes = [index for index, file_path in enumerate(file_paths) if file_path and os.path.exists(file_path)]
+        if not indexes:
+            return results
+
+        try:
+            # The first tier is cheap to hash (SHA256 plus two samples); cold files hash in parallel
+            first_tier = self._hash_cache.get_hashes_many([file_paths[index] for index in indexes],
+                                                          hash_types=self.HASH_TIERS[0])
+            lookups = [(index, dict(file_hashes)) for index, file_hashes in zip(indexes, first_tier) if file_hashes]
+            for index in set(indexes) - {index for index, _ in lookups}:
+                logger.log(f"Could not compute hashes for {file_paths[index]}")
+            found = self._run_async(self._get_model_info_many_async(
+                [(os.path.abspath(file_paths[index]), file_hashes) for index, file_hashes in lookups]))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"Error fetching CivitAI data for {len(indexes)} files: {e}")
+            return results
+
+        for (index, _), result in zip(lookups, found):
+            if isinstance(result, BaseException):
+                logger.error(f"Error fetching CivitAI data for {file_paths[index]}: {result}")
+            else:
+                results[index] = result
+        return results
+
+    async def _get_model_info_many_async(self, lookups: List[Tuple[str, Dict[str, str]]]) -> List[Any]:
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        return await asyncio.gather(
+            *(self._lookup_file_async(file_path, file_hashes, semaphore) for file_path, file_hashes in lookups),
+            return_exceptions=True,
+        )
+
+    async def _lookup_file_async(self, file_path: str, file_hashes: Dict[str, str],
+                                 semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """Try the hash types of one file in priority order; returns the first match."""
+        lookup_failed = False
+        for tier in self.HASH_TIERS:
+            missing = [hash_type for hash_type in tier if hash_type not in file_hashes]
+            if missing:
+                # Hash on the loop's default executor so other lookups keep running
+                loop = asyncio.get_running_loop()
+                file_hashes.update(await loop.run_in_executor(
+                    None, functools.partial(self._hash_cache.get_hashes, file_path, hash_types=missing)) or {})
+            for hash_type in tier:
+                hash_value = file_hashes.get(hash_type)
                 if not hash_value:
                     continue
+                try:
+                    result = await self._lookup_hash_async(hash_type, hash_value, file_hashes, semaphore)
+                except CivitAILookupError:
+                    # Already logged; a lower-priority hash may still answer
+                    lookup_failed = True
+                    continue
+                if result is None:
+                    continue
+                if hash_type != 'sha256' and not lookup_failed and not result['cache_hit']:
+                    # Later lookups of this file then hit on the first hash tried
+                    self.cache.set('sha256', file_hashes['sha256'], dict(result, cache_hit=False))
+                return result
+        return None
 
-                logger.log(f"Trying CivitAI lookup with {hash_type}: {hash_value[:16]}...")
-                result = self._run_async(self._get_model_info_by_hash_async(hash_value, hash_type))
-                if result:
-                    logger.log(f"✅ Found CivitAI match using {hash_type} hash")
-                    # Add hash information to result
-                    result['matched_hash_type'] = hash_type
-                    result['matched_hash_value'] = hash_value
-                    result['all_hashes'] = file_hashes
-                    result['cache_hit'] = False  # This is a fresh API call
-                    break
-                else:
-                    logger.log(f"❌ No CivitAI match for {hash_type} hash")
-
-            # Cache the result (even if None) to avoid repeated API calls
-            self.cache[cache_key] = result
+    async def _lookup_hash_async(self, hash_type: str, hash_value: str, file_hashes: Dict[str, str],
+                                 semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """Resolve one hash through the metadata cache, then the API, caching the answer.
+
+        In offline mode the snapshot is the only source and nothing is cached.
+        """
+        if self.mirror is not None:
+            mirrored = self.mirror.lookup(hash_type, hash_value)
+            if mirrored is None:
+                logger.log(f"❌ No {hash_type} match in the offline CivitAI snapshot")
+                return None
+            model_data, fetched_at = mirrored
+            logger.log(f"✅ Found {hash_type} match in the offline CivitAI snapshot")
+            result = self._build_result(model_data, hash_value, fetched_at)
+            result.update(matched_hash_type=hash_type, matched_hash_value=hash_value,
+                          all_hashes=dict(file_hashes), cache_hit=True, offline=True)
             return result
 
-        except Exception as e:  # pylint: disable=broad-except
-            logger.error(f"Error fetching CivitAI data for {file_path}: {e}")
+        cached = self.cache.get(hash_type, hash_value)
+        if cached is not None:
+            if not cached['found']:
+                logger.log(f"Cached: no CivitAI match for {hash_type} hash")
+                return None
+            logger.log(f"Using cached CivitAI data for {hash_type} hash: {hash_value[:16]}...")
+            return dict(cached['data'], cache_hit=True)
+
+        logger.log(f"Trying CivitAI lookup with {hash_type}: {hash_value[:16]}...")
+        async with semaphore:
+            try:
+                result = await self._get_model_info_by_hash_async(hash_value, hash_type)
+            except CivitAILookupError as exc:
+                # Transient failures are not cached; the next execution retries
+                logger.error(str(exc))
+                raise
+        if not result:
+            logger.log(f"❌ No CivitAI match for {hash_type} hash")
+            self.cache.set(hash_type, hash_value, None)
             return None
 
+        logger.log(f"✅ Found CivitAI match using {hash_type} hash")
+        # Add hash information to result
+        result['matched_hash_type'] = hash_type
+        result['matched_hash_value'] = hash_value
+        result['all_hashes'] = dict(file_hashes)
+        self.cache.set(hash_type, hash_value, result)
+        result['cache_hit'] = False  # This is a fresh API call
+        return result
+
     def _run_async(self, coro):
-        import concurrent.futures
+        # Works the same whether or not the caller is inside an event loop
+        return _http.run(coro)
 
-        try:
-            # Check if we're in an event loop
-            asyncio.get_running_loop()
-            # If we are, we need to run the coroutine in a separate thread
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(self._run_in_thread, coro)
-                return future.result()
-        except RuntimeError:
-            # No event loop running, we can use asyncio.run directly
-            return asyncio.run(coro)
-
-    def _run_in_thread(self, coro):
-        """Run coroutine in a new event loop in the current thread."""
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(coro)
-        finally:
-            new_loop.close()
-            asyncio.set_event_loop(None)
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+        return random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+
+    async def _get_model_info_by_hash_async(self, file_hash: str, hash_type: str = "unknown") -> Optional[Dict[str, Any]]:
+        """Fetch one by-hash lookup, retrying 429s, 5xx responses and timeouts.
 
-    async def _get_model_info_by_hash_async(self, file_hash: str, hash_type: str = "unknown", attempt: int = 0) -> Optional[Dict[str, Any]]:
+        Every attempt takes a token from the process-wide rate limiter. A 429 pauses
+        the limiter for the whole ``Retry-After``; 5xx responses and timeouts are retried
+        after a jittered exponential backoff.
+
+        Returns:
+            The model info, or None if CivitAI does not know the hash
+
+        Raises:
+            CivitAILookupError: The lookup failed, including after the last retry
+        """
         url = f"{self.BASE_URL}/model-versions/by-hash/{file_hash}"
         headers = {}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
 
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        for attempt in range(self.MAX_RETRIES + 1):
+            retries_left = attempt < self.MAX_RETRIES
+            await self.rate_limiter.acquire()
+            # Runs on the client loop (see _run_async), reusing its pooled connections
             try:
-                response = await client.get(url, headers=headers)
+                response = await _http.client.get(url, headers=headers, timeout=httpx.Timeout(self.timeout))
+            except (httpx.TimeoutException, httpx.NetworkError) as exc:
+                if not retries_left:
+                    raise CivitAILookupError(
+                        f"Network error fetching CivitAI data for {hash_type} hash {file_hash[:16]}...: {exc}") from exc
+                delay = self._backoff(attempt)
+                logger.log(f"CivitAI request failed ({exc!r}), retrying in {delay:.1f} seconds")
+                await asyncio.sleep(delay)
+                continue
             except httpx.RequestError as exc:
-                logger.error(f"Network error fetching CivitAI data for {hash_type} hash {file_hash[:16]}...: {exc}")
-                return None
-
-        # Only log response status for errors or rate limiting
-        if response.status_code == 429 and attempt < self.MAX_RETRIES:
-            retry_after = response.headers.get("Retry-After")
-            delay = min(float(retry_after) if retry_after else 1.0, 5.0)
-            logger.log(f"Rate limited by CivitAI, retrying in {delay} seconds")
-            await asyncio.sleep(delay)
-            return await self._get_model_info_by_hash_async(file_hash, hash_type, attempt=attempt + 1)
+                raise CivitAILookupError(
+                    f"Network error fetching CivitAI data for {hash_type} hash {file_hash[:16]}...: {exc}") from exc
+
+            if response.status_code == 429:
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                # The limit applies to the whole API key, so hold back every request
+                self.rate_limiter.pause(delay)
+                if retries_left:
+                    logger.log(f"Rate limited by CivitAI, retrying in {delay:.1f} seconds")
+                    continue
+            if response.status_code >= 500 and retries_left:
+                delay = self._backoff(attempt)
+                logger.log(f"CivitAI returned {response.status_code}, retrying in {delay:.1f} seconds")
+                await asyncio.sleep(delay)
+                continue
+            break
 
         if response.status_code == 404:
             logger.log(f"Model not found on CivitAI for {hash_type} hash: {file_hash[:16]}...")
             return None
 
         if response.status_code != 200:
-            logger.error(f"CivitAI API error: {response.status_code} - {response.text[:200]}")
-            return None
+            raise CivitAILookupError(f"CivitAI API error: {response.status_code} - {response.text[:200]}")
 
         try:
             model_data = response.json()
         except ValueError as exc:
-            logger.log(f"Failed to decode CivitAI response: {exc}")
-            return None
+            raise CivitAILookupError(f"Failed to decode CivitAI response: {exc}") from exc
 
+        result = self._build_result(model_data, file_hash)
+        logger.log(f"Found CivitAI model: {result['civitai_name']} by {result['creator']}")
+        return result
+
+    @staticmethod
+    def _build_result(model_data: Dict[str, Any], file_hash: str, fetched_at: Optional[str] = None) -> Dict[str, Any]:
+        """Turn a by-hash API response into the result dict consumers read."""
         model = model_data.get("model", {})
         creator = model.get("creator", {})
         tags = [tag.get("name", "") for tag in model.get("tags", []) if tag.get("name")]
@@ -186,24 +416,23 @@ class CivitAIService:
             "type": model.get("type", ""),
             "nsfw": model.get("nsfw", False),
             "stats": metrics,
-            "fetched_at": datetime.utcnow().isoformat() + "Z",
+            "fetched_at": fetched_at or datetime.utcnow().isoformat() + "Z",
 
             # Full API response for comprehensive access
             "api_response": model_data,
         }
-
-        logger.log(f"Found CivitAI model: {result['civitai_name']} by {result['creator']}")
         return result
 
     def clear_cache(self):
-        """Clear the internal cache of CivitAI results"""
+        """Clear the shared, persistent cache of CivitAI results"""
         self.cache.clear()
-        logger.log("CivitAI cache cleared")
 
     def get_cache_info(self) -> Dict[str, Any]:
         """Get information about the current cache state"""
         return {
-            "cached_models": len(self.cache),
+            "cached_models": self.cache.get_cache_info()["entries"],
+            "rate_limiter": self.rate_limiter.get_state(),
+            "offline_snapshot": self.mirror.path if self.mirror is not None else None,
             "has_api_key": bool(self.api_key),
             "api_key_preview": f"{self.api_key[:8]}..." if self.api_key else "Not set"
         }
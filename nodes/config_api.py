@@ -3,6 +3,7 @@ Web API endpoint for exposing configuration to frontend
 """
 
 from aiohttp import web
+import asyncio
 import os
 
 
@@ -116,7 +117,62 @@ async def set_api_keys(request):
         return web.json_response({"error": str(e)}, status=500)
 
 
+async def get_cache_stats(request):
+    """Get Gemini description cache size, hit-rate and latency statistics"""
+    try:
+        from .cache import get_cache
+        # May run the one-time legacy migration or scan a JSON cache directory; keep it off the event loop
+        info = await asyncio.get_running_loop().run_in_executor(None, lambda: get_cache().get_cache_info())
+        return web.json_response(info)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def reset_cache_stats(request):
+    """Reset the Gemini cache hit-rate and latency counters (cached entries are kept)"""
+    try:
+        from .cache import get_cache
+        get_cache().metrics.reset()
+        return web.json_response({"success": True})
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def get_civitai_status(request):
+    """Report the CivitAI rate limiter state and metadata cache statistics"""
+    try:
+        from .civitai_cache import get_civitai_cache
+        from .civitai_service import get_rate_limiter
+        # The first get_civitai_cache() purges expired entries; keep it off the event loop
+        metadata_cache = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: get_civitai_cache().get_cache_info())
+        return web.json_response({
+            "rate_limiter": get_rate_limiter().get_state(),
+            "metadata_cache": metadata_cache,
+        })
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def get_lora_duplicates(request):
+    """Report LoRA files with identical content at different paths, from the LoRA hash cache"""
+    try:
+        from .lora_hash_cache import get_cache
+        # Revalidates every entry (stats, quick-fingerprint reads); keep it off the event loop
+        duplicates = await asyncio.get_running_loop().run_in_executor(None, lambda: get_cache().find_duplicates())
+        return web.json_response({
+            "duplicates": duplicates,
+            "wasted_bytes": sum(group["wasted_bytes"] for group in duplicates),
+        })
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
 def register_config_routes(app):
     """Register configuration API routes"""
     app.router.add_get("/swissarmyknife/config", get_config)
     app.router.add_post("/swissarmyknife/set_api_keys", set_api_keys)
+    app.router.add_get("/swissarmyknife/cache/stats", get_cache_stats)
+    app.router.add_post("/swissarmyknife/cache/stats/reset", reset_cache_stats)
+    app.router.add_get("/swissarmyknife/lora/duplicates", get_lora_duplicates)
+    app.router.add_get("/swissarmyknife/civitai/status", get_civitai_status)
@@ -1,29 +1,50 @@
 """Persistent cache for LoRA SHA256 hashes.
 
 The cache stores mappings of absolute LoRA file paths to their SHA256 digests
-along with file metadata (modification time and size) so hashes are automatically
-invalidated when files change.
+along with file metadata so hashes are automatically invalidated when files change.
+Each entry records the file's device, inode, nanosecond mtime and size, plus a quick
+fingerprint of its first and last 64 KB. A lookup whose stat matches exactly is served
+without reading the file. If only the device or inode changed (a rename, or a copy
+that preserved the mtime), the quick fingerprint decides whether the full hashes still
+hold. Any other change forces a rehash.
+
+Entries are also indexed by ``(size, quick fingerprint)``. A cold path whose file
+matches a current entry at another path (a copy, or a symlink to the same file)
+reuses that entry's hashes instead of reading the whole file. ``find_duplicates``
+reports identical files.
+
+Callers may ask for a subset of the hash types. Only the missing types are computed,
+and entries holding some of the types are valid; the rest are added when first
+requested.
+
+``get_model_info`` parses the safetensors header (rank, base model, trigger words)
+with a bounded read and caches the summary in the same entry. It shares the entry's
+stat validation, so no CivitAI round-trip is needed for this information.
+
+Changes are appended to a JSONL journal next to the snapshot file instead of
+rewriting the whole snapshot on every insert. Appends are debounced
+(``FLUSH_DELAY``), and the journal is folded back into the snapshot once it
+outgrows the table. Startup loads the snapshot and then replays the journal.
+
+Hashing happens outside the cache lock, so lookups of warm entries never wait on a
+file being hashed. Concurrent requests for the same cold file share one computation,
+and ``get_hashes_many`` hashes several cold files in parallel on a small thread pool.
 """
 
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import threading
 import time
-import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
-
-import hashlib
-
-try:
-    import blake3
-    BLAKE3_AVAILABLE = True
-except ImportError:
-    BLAKE3_AVAILABLE = False
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 from .debug_utils import Logger
+from .lora_hashing import BLAKE3_AVAILABLE, HASH_TYPES, hash_file, normalize_hash_types, quick_fingerprint
+from .lora_metadata import is_safetensors, read_safetensors_header, summarize_header
 
 logger = Logger("LoRAHashCache")
 
@@ -33,7 +54,19 @@ class LoRAHashCache:
 
     _CACHE_FILENAME = "lora_hash_cache.json"
 
-    def __init__(self, cache_path: Optional[Path] = None) -> None:
+    _JOURNAL_SUFFIX = ".journal"
+
+    # Files hashed concurrently by get_hashes_many(); hashing is mostly I/O and
+    # GIL-free, so a few workers saturate typical model storage
+    DEFAULT_MAX_WORKERS = 4
+
+    # Seconds to batch journal records before appending them
+    FLUSH_DELAY = 2.0
+    # The journal is compacted into the snapshot once it holds more records than
+    # this and more than there are entries
+    COMPACT_MIN_RECORDS = 1000
+
+    def __init__(self, cache_path: Optional[Path] = None, max_workers: Optional[int] = None) -> None:
         base_dir = Path(__file__).resolve().parent.parent
         cache_dir = base_dir / "cache"
         cache_dir.mkdir(parents=True, exist_ok=True)
@@ -42,29 +75,160 @@ class LoRAHashCache:
             cache_path = cache_dir / self._CACHE_FILENAME
 
         self._cache_path = cache_path
+        self._journal_path = cache_path.with_name(cache_path.name + self._JOURNAL_SUFFIX)
         self._lock = threading.RLock()
         self._data: Dict[str, Dict[str, object]] = {}
+        # (size, quick fingerprint) -> paths, for recognizing copies of hashed files
+        self._by_content: Dict[Tuple[int, str], Set[str]] = {}
+        self._duplicates_reused = 0
+        self._inflight: Dict[str, "Future[Optional[Dict[str, str]]]"] = {}
+        self._max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+        # Serializes journal appends and compaction; never taken while holding _lock
+        self._journal_lock = threading.Lock()
+        self._pending: List[str] = []
+        self._flush_timer: Optional[threading.Timer] = None
+        self._journal_records = 0
+
         self._load()
+        atexit.register(self.flush)
 
     def _load(self) -> None:
-        if not self._cache_path.exists():
-            return
-
+        if self._cache_path.exists():
+            try:
+                with self._cache_path.open("r", encoding="utf-8") as fh:
+                    data = json.load(fh)
+                if isinstance(data, dict):
+                    self._data = data
+            except (json.JSONDecodeError, OSError) as exc:
+                logger.error(f"Failed to load cache: {exc}. Rebuilding cache file.")
+                self._data = {}
+
+        self._journal_records = self._replay_journal()
+        for path, entry in self._data.items():
+            self._index(path, entry)
+
+    def _replay_journal(self) -> int:
+        """Apply the journal on top of the snapshot; returns the number of records."""
+        if not self._journal_path.exists():
+            return 0
+
+        records = 0
         try:
-            with self._cache_path.open("r", encoding="utf-8") as fh:
-                data = json.load(fh)
-            if isinstance(data, dict):
-                self._data = data
-        except (json.JSONDecodeError, OSError) as exc:
-            logger.error(f"Failed to load cache: {exc}. Rebuilding cache file.")
-            self._data = {}
-
-    def _save(self) -> None:
+            with self._journal_path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final line from an interrupted append
+                        logger.warning(f"Skipping unreadable journal record in {self._journal_path}")
+                        continue
+                    self._apply(record)
+                    records += 1
+        except OSError as exc:
+            logger.error(f"Failed to read cache journal: {exc}")
+        return records
+
+    def _apply(self, record: Dict[str, object]) -> None:
+        op = record.get("op")
+        if op == "put" and isinstance(record.get("entry"), dict):
+            self._data[record["path"]] = record["entry"]
+        elif op == "del":
+            self._data.pop(record.get("path"), None)
+        elif op == "clear":
+            self._data.clear()
+
+    @staticmethod
+    def _content_key(entry: Dict[str, object]) -> Optional[Tuple[int, str]]:
+        size, quick = entry.get("size"), entry.get("quick")
+        if isinstance(size, int) and isinstance(quick, str):
+            return size, quick
+        return None
+
+    def _index(self, path: str, entry: Dict[str, object]) -> None:
+        content_key = self._content_key(entry)
+        if content_key is not None:
+            self._by_content.setdefault(content_key, set()).add(path)
+
+    def _unindex(self, path: str, entry: Dict[str, object]) -> None:
+        content_key = self._content_key(entry)
+        paths = self._by_content.get(content_key) if content_key is not None else None
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._by_content[content_key]
+
+    def _store(self, path: str, entry: Dict[str, object]) -> None:
+        """Set the entry for *path*, keeping the content index and journal in step (caller holds ``_lock``)."""
+        previous = self._data.get(path)
+        if previous is not None:
+            self._unindex(path, previous)
+        self._data[path] = entry
+        self._index(path, entry)
+        self._record("put", path, entry)
+
+    def _discard(self, path: str) -> None:
+        """Drop the entry for *path*, if any (caller holds ``_lock``)."""
+        previous = self._data.pop(path, None)
+        if previous is not None:
+            self._unindex(path, previous)
+            self._record("del", path)
+
+    def _record(self, op: str, path: Optional[str] = None, entry: Optional[Dict[str, object]] = None) -> None:
+        """Queue a journal record (caller holds ``_lock``) and schedule a debounced flush."""
+        record: Dict[str, object] = {"op": op}
+        if path is not None:
+            record["path"] = path
+        if entry is not None:
+            record["entry"] = entry
+        self._pending.append(json.dumps(record, separators=(",", ":")))
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Append pending journal records now, compacting the journal if it has grown large."""
+        with self._journal_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                timer, self._flush_timer = self._flush_timer, None
+            if timer is not None:
+                timer.cancel()
+
+            if pending:
+                try:
+                    with self._journal_path.open("a", encoding="utf-8") as fh:
+                        fh.write("\n".join(pending) + "\n")
+                    self._journal_records += len(pending)
+                except OSError as exc:
+                    logger.error(f"Failed to write cache journal: {exc}")
+                    # Keep the records for the next flush
+                    with self._lock:
+                        self._pending[:0] = pending
+                    return
+
+            with self._lock:
+                entries = len(self._data)
+            if self._journal_records > max(self.COMPACT_MIN_RECORDS, entries):
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the snapshot from memory and truncate the journal (caller holds ``_journal_lock``)."""
+        with self._lock:
+            snapshot = dict(self._data)
+
         tmp_path = self._cache_path.with_suffix(".tmp")
         try:
             with tmp_path.open("w", encoding="utf-8") as fh:
-                json.dump(self._data, fh, indent=2, sort_keys=True)
+                json.dump(snapshot, fh, separators=(",", ":"), sort_keys=True)
             tmp_path.replace(self._cache_path)
+            # Replaying the old journal over the new snapshot would be harmless, so a
+            # crash between these two steps loses nothing
+            with self._journal_path.open("w", encoding="utf-8"):
+                pass
+            self._journal_records = 0
         except OSError as exc:
             logger.error(f"Failed to write cache: {exc}")
             if tmp_path.exists():
@@ -73,6 +237,21 @@ class LoRAHashCache:
                 except OSError:
                     pass
 
+    def compact(self) -> None:
+        """Flush pending records and fold the whole journal into the snapshot."""
+        self.flush()
+        with self._journal_lock:
+            self._compact()
+
+    def close(self) -> None:
+        """Flush pending records and stop the hashing pool."""
+        atexit.unregister(self.flush)
+        self.flush()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
     def _stat_file(self, file_path: str) -> Optional[os.stat_result]:
         try:
             return os.stat(file_path)
@@ -82,47 +261,70 @@ class LoRAHashCache:
             logger.error(f"Unable to stat file '{file_path}': {exc}")
             return None
 
-    def _is_entry_valid(self, file_path: str, entry: Dict[str, object]) -> bool:
-        stat_result = self._stat_file(file_path)
-        if stat_result is None:
-            return False
+    @staticmethod
+    def _stat_fields(stat_result: os.stat_result) -> Dict[str, object]:
+        return {
+            "mtime": stat_result.st_mtime,  # Legacy float field, kept for older readers
+            "mtime_ns": stat_result.st_mtime_ns,
+            "size": stat_result.st_size,
+            "ino": stat_result.st_ino,
+            "dev": stat_result.st_dev,
+        }
 
-        cached_mtime = entry.get("mtime")
-        cached_size = entry.get("size")
-        if not isinstance(cached_mtime, (int, float)) or not isinstance(cached_size, int):
-            return False
+    def _quick_fingerprint(self, file_path: str) -> Optional[str]:
+        try:
+            return quick_fingerprint(file_path)
+        except OSError as exc:
+            logger.error(f"Error fingerprinting '{file_path}': {exc}")
+            return None
 
-        return (
-            abs(stat_result.st_mtime - float(cached_mtime)) < 0.001
-            and stat_result.st_size == cached_size
-        )
+    def _validate(self, file_path: str, entry: Dict[str, object]) -> Tuple[str, Optional[Dict[str, object]]]:
+        """Check a cache entry against the file on disk.
 
-    def _calculate_hashes(self, file_path: str) -> Optional[Dict[str, str]]:
-        """Calculate all supported hash types for a file.
+        Returns ``(status, updated_entry)``. *status* is ``"valid"``, ``"revalidated"``
+        (the stat changed but the content did not; *updated_entry* carries the new stat),
+        ``"stale"`` or ``"missing"``.
+        """
+        stat_result = self._stat_file(file_path)
+        if stat_result is None:
+            return "missing", None
 
-        Returns dict with keys: sha256, crc32, blake3, autov1, autov2
+        cached_size = entry.get("size")
+        if not isinstance(cached_size, int) or stat_result.st_size != cached_size:
+            return "stale", None
+
+        cached_mtime_ns = entry.get("mtime_ns")
+        if not isinstance(cached_mtime_ns, int):
+            # Entry written before nanosecond mtimes were recorded
+            cached_mtime = entry.get("mtime")
+            if not isinstance(cached_mtime, (int, float)) or abs(stat_result.st_mtime - float(cached_mtime)) >= 0.001:
+                return "stale", None
+        elif stat_result.st_mtime_ns != cached_mtime_ns:
+            return "stale", None
+        elif (stat_result.st_ino, stat_result.st_dev) == (entry.get("ino"), entry.get("dev")):
+            return "valid", None
+        elif entry.get("quick") is not None:
+            # Same size and mtime on a different inode: renamed, restored or copied with
+            # preserved mtime. Compare the ends of the file before trusting the hashes.
+            if self._quick_fingerprint(file_path) != entry.get("quick"):
+                return "stale", None
+            return "revalidated", {**entry, **self._stat_fields(stat_result)}
+
+        # Upgrade the entry with the identity fields and quick fingerprint
+        quick = self._quick_fingerprint(file_path)
+        if quick is None:
+            return "stale", None
+        return "revalidated", {**entry, **self._stat_fields(stat_result), "quick": quick}
+
+    def _calculate_hashes(self, file_path: str, hash_types: Sequence[str] = HASH_TYPES) -> Optional[Dict[str, str]]:
+        """Calculate the requested hash types for a file.
+
+        Supported keys: sha256, crc32, blake3, autov1, autov2
         AutoV1 and AutoV2 are specialized hash formats used by CivitAI.
+        The file is streamed in fixed-size chunks (see lora_hashing).
         """
         try:
-            with open(file_path, "rb") as fh:
-                # Read file in chunks for memory efficiency
-                sha256_hasher = hashlib.sha256()
-                crc32_value = 0
-                blake3_hasher = blake3.blake3() if BLAKE3_AVAILABLE else None
-
-                # For AutoV1/AutoV2, we need specific byte ranges
-                os.path.getsize(file_path)
-                fh.seek(0)
-
-                # Read full file content for comprehensive hash calculation
-                file_content = fh.read()
-
-                # Calculate standard hashes from full content
-                sha256_hasher.update(file_content)
-                crc32_value = zlib.crc32(file_content)
-                if blake3_hasher:
-                    blake3_hasher.update(file_content)
-
+            return hash_file(file_path, hash_types=hash_types)
         except FileNotFoundError:
             logger.error(f"File missing during hashing: {file_path}")
             return None
@@ -130,123 +332,306 @@ class LoRAHashCache:
             logger.error(f"Error hashing '{file_path}': {exc}")
             return None
 
-        # Calculate standard hashes
-        hashes = {
-            "sha256": sha256_hasher.hexdigest().upper(),
-            "crc32": f"{crc32_value & 0xffffffff:08X}",  # Ensure positive 32-bit value
+    def _valid_entry(self, normalized_path: str) -> Optional[Dict[str, object]]:
+        """Return the entry for *normalized_path* if it still matches the file, else None.
+
+        Only the dict lookup happens under the lock; the validating stat does not.
+        """
+        with self._lock:
+            entry = self._data.get(normalized_path)
+        if not entry:
+            return None
+        status, updated_entry = self._validate(normalized_path, entry)
+        if status == "revalidated":
+            self._replace_entry(normalized_path, entry, updated_entry)
+            return updated_entry
+        return entry if status == "valid" else None
+
+    @staticmethod
+    def _known_hashes(entry: Optional[Dict[str, object]]) -> Dict[str, Optional[str]]:
+        """The hash types stored in *entry*.
+
+        A BLAKE3 of None (hashed while the package was missing) only counts while the
+        package is still unavailable.
+        """
+        cached_hashes = entry.get("hashes") if entry else None
+        if not isinstance(cached_hashes, dict):
+            return {}
+        return {
+            hash_type: cached_hashes[hash_type] for hash_type in HASH_TYPES
+            if cached_hashes.get(hash_type) is not None
+            or (hash_type == "blake3" and hash_type in cached_hashes and not BLAKE3_AVAILABLE)
         }
 
-        if blake3_hasher:
-            hashes["blake3"] = blake3_hasher.hexdigest().upper()
+    def _cached_hashes(self, normalized_path: str, hash_types: Sequence[str]) -> Optional[Dict[str, str]]:
+        """Return the cached *hash_types* for *normalized_path*, or None unless all are cached and valid."""
+        known_hashes = self._known_hashes(self._valid_entry(normalized_path))
+        if all(hash_type in known_hashes for hash_type in hash_types):
+            return {hash_type: known_hashes[hash_type] for hash_type in hash_types}
+        return None
+
+    def _duplicate_hashes(self, normalized_path: str, size: int, quick: str) -> Dict[str, Optional[str]]:
+        """Hashes of a current entry at another path with the same size and quick fingerprint."""
+        with self._lock:
+            candidates = [(path, self._data[path]) for path in self._by_content.get((size, quick), ())
+                          if path != normalized_path]
+        for candidate_path, entry in candidates:
+            known_hashes = self._known_hashes(entry)
+            # Only trust a duplicate whose own entry still matches its file
+            if not known_hashes or self._validate(candidate_path, entry)[0] != "valid":
+                continue
+            logger.log(f"Reusing hashes of identical file {candidate_path} for {os.path.basename(normalized_path)}")
+            with self._lock:
+                self._duplicates_reused += 1
+            return known_hashes
+        return {}
+
+    def _replace_entry(self, normalized_path: str, old_entry: Dict[str, object],
+                       new_entry: Optional[Dict[str, object]]) -> None:
+        """Store (or, if None, drop) *new_entry* unless the entry changed since it was read."""
+        with self._lock:
+            if self._data.get(normalized_path) is not old_entry:
+                return
+            if new_entry is None:
+                self._discard(normalized_path)
+            else:
+                self._store(normalized_path, new_entry)
+
+    def _claim(self, normalized_path: str) -> Tuple["Future[Optional[Dict[str, str]]]", bool]:
+        """Return the in-flight computation for a path and whether the caller owns it."""
+        with self._lock:
+            future = self._inflight.get(normalized_path)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[normalized_path] = future
+            return future, True
+
+    def _compute(self, normalized_path: str, future: "Future[Optional[Dict[str, str]]]",
+                 hash_types: Sequence[str], use_cache: bool = True) -> None:
+        """Hash *normalized_path*, store the entry and resolve *future* (the lock is not held while hashing)."""
+        try:
+            file_hashes, error = self._hash_and_store(normalized_path, hash_types, use_cache), None
+        except BaseException as exc:  # pylint: disable=broad-except
+            file_hashes, error = None, exc
+        # Drop the in-flight record first so waiters never observe it after waking
+        with self._lock:
+            self._inflight.pop(normalized_path, None)
+        if error is not None:
+            future.set_exception(error)
         else:
-            hashes["blake3"] = None
+            future.set_result(file_hashes)
+
+    def _hash_and_store(self, normalized_path: str, hash_types: Sequence[str],
+                        use_cache: bool = True) -> Optional[Dict[str, str]]:
+        """Compute the *hash_types* missing from the entry and store the merged entry.
 
-        # Calculate AutoV1 and AutoV2 (CivitAI specific formats)
-        hashes["autov1"] = self._calculate_autov1(file_content)
-        hashes["autov2"] = self._calculate_autov2(file_content)
+        Returns every hash type now known for the file.
+        """
+        file_stat = self._stat_file(normalized_path)
+        if file_stat is None:
+            # Remove stale entry if necessary
+            with self._lock:
+                self._discard(normalized_path)
+            return None
 
-        return hashes
+        entry = self._valid_entry(normalized_path) if use_cache else None
+        file_hashes = self._known_hashes(entry)
+        quick = entry.get("quick") if entry else None
+        if quick is None:
+            quick = self._quick_fingerprint(normalized_path)
+        if use_cache and quick is not None and any(hash_type not in file_hashes for hash_type in hash_types):
+            file_hashes = {**self._duplicate_hashes(normalized_path, file_stat.st_size, quick), **file_hashes}
+
+        missing = [hash_type for hash_type in hash_types if hash_type not in file_hashes]
+        if missing:
+            logger.log(f"Computing {', '.join(missing)} for {os.path.basename(normalized_path)}...")
+            computed = self._calculate_hashes(normalized_path, missing)
+            if not computed:
+                return None
+            file_hashes.update(computed)
 
-    def _calculate_autov1(self, file_content: bytes) -> str:
-        """Calculate AutoV1 hash (CivitAI format).
+        self._update_entry(normalized_path, file_stat, quick, {
+            "hashes": file_hashes,
+            "hash": file_hashes.get("sha256"),  # Keep legacy field for compatibility
+        })
+        return file_hashes
 
-        AutoV1 uses first 8KB of file with SHA256.
+    def _update_entry(self, normalized_path: str, file_stat: os.stat_result, quick: Optional[str],
+                      fields: Dict[str, object]) -> Dict[str, object]:
+        """Store *fields* for the file as of *file_stat*.
+
+        Other fields of the current entry (hashes, header) are kept when it describes
+        the same stat, and dropped otherwise.
         """
-        # Take first 8KB for AutoV1
-        chunk = file_content[:8192]
-        return hashlib.sha256(chunk).hexdigest().upper()[:10]  # CivitAI uses first 10 chars
+        stat_fields = self._stat_fields(file_stat)
+        with self._lock:
+            previous = self._data.get(normalized_path) or {}
+            if any(previous.get(key) != stat_fields[key] for key in ("mtime_ns", "size", "ino", "dev")):
+                previous = {}
+            entry = {**previous, **stat_fields, "quick": quick, **fields, "updated_at": time.time()}
+            self._store(normalized_path, entry)
+        return entry
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="lora-hash")
+            return self._pool
 
-    def _calculate_autov2(self, file_content: bytes) -> str:
-        """Calculate AutoV2 hash (CivitAI format).
+    def get_hashes(self, file_path: str, *, use_cache: bool = True,
+                   hash_types: Optional[Sequence[str]] = None) -> Optional[Dict[str, str]]:
+        """Return *hash_types* (default: all types) for *file_path* using persistent cache.
 
-        AutoV2 uses a more complex sampling strategy across the file.
+        Only types missing from the cache entry are computed. A cold file is hashed in
+        the calling thread; concurrent callers for the same path wait for that
+        computation instead of hashing the file again.
         """
-        # AutoV2: Sample strategically from different parts of the file
-        file_len = len(file_content)
-        if file_len <= 8192:  # Small files - use full content
-            chunk = file_content
-        else:
-            # CivitAI AutoV2 algorithm: sample from beginning, skip some, sample middle, skip some, sample end
-            samples = []
-            # Take first 2KB
-            samples.append(file_content[:2048])
-            # Take 2KB from 25% position
-            pos_25 = file_len // 4
-            samples.append(file_content[pos_25:pos_25 + 2048])
-            # Take 2KB from 75% position  
-            pos_75 = (file_len * 3) // 4
-            samples.append(file_content[pos_75:pos_75 + 2048])
-            # Take last 2KB
-            samples.append(file_content[-2048:])
-            chunk = b''.join(samples)
-
-        return hashlib.sha256(chunk).hexdigest().upper()[:10]  # CivitAI uses first 10 chars
-
-    def get_hashes(self, file_path: str, *, use_cache: bool = True) -> Optional[Dict[str, str]]:
-        """Return all hash types for *file_path* using persistent cache."""
+        hash_types = normalize_hash_types(hash_types)
         normalized_path = os.path.abspath(file_path)
-
-        with self._lock:
-            entry = self._data.get(normalized_path)
-            if use_cache and entry and self._is_entry_valid(normalized_path, entry):
-                # Return cached hashes if available
-                cached_hashes = entry.get("hashes")
-                if cached_hashes and isinstance(cached_hashes, dict):
-                    # Ensure all hash types are present (for older cache entries)
-                    complete_hashes = {
-                        "sha256": cached_hashes.get("sha256"),
-                        "crc32": cached_hashes.get("crc32"),
-                        "blake3": cached_hashes.get("blake3"),
-                        "autov1": cached_hashes.get("autov1"),
-                        "autov2": cached_hashes.get("autov2"),
-                    }
-                    # If any hash type is missing, recalculate
-                    if any(v is None for v in complete_hashes.values() if v != cached_hashes.get("blake3")):
-                        logger.log(f"Incomplete hash cache for {normalized_path}, recalculating...")
-                    else:
-                        return complete_hashes
-
-                # Fallback to legacy single hash format
-                legacy_hash = entry.get("hash")
-                if legacy_hash:
-                    logger.log(f"Converting legacy hash cache for {normalized_path}")
-                    # Don't return incomplete data, force recalculation
-
-            file_stat = self._stat_file(normalized_path)
-            if file_stat is None:
-                # Remove stale entry if necessary
-                if normalized_path in self._data:
-                    self._data.pop(normalized_path, None)
-                    self._save()
+        while True:
+            if use_cache:
+                cached_hashes = self._cached_hashes(normalized_path, hash_types)
+                if cached_hashes is not None:
+                    return cached_hashes
+
+            future, owner = self._claim(normalized_path)
+            if owner:
+                self._compute(normalized_path, future, hash_types, use_cache)
+            file_hashes = future.result()
+            if file_hashes is None:
                 return None
+            if owner or all(hash_type in file_hashes for hash_type in hash_types):
+                return {hash_type: file_hashes.get(hash_type) for hash_type in hash_types}
+            # The computation we waited for covered other hash types; go again for ours
 
-            logger.log(f"Computing hashes for {os.path.basename(normalized_path)}...")
-            file_hashes = self._calculate_hashes(normalized_path)
-            if not file_hashes:
-                return None
+    def get_hashes_many(self, file_paths: Sequence[str], *, use_cache: bool = True,
+                        hash_types: Optional[Sequence[str]] = None) -> List[Optional[Dict[str, str]]]:
+        """Return hashes for several files, hashing the cold ones concurrently.
 
-            entry = {
-                "hashes": file_hashes,
-                "hash": file_hashes.get("sha256"),  # Keep legacy field for compatibility
-                "mtime": file_stat.st_mtime,
-                "size": file_stat.st_size,
-                "updated_at": time.time(),
-            }
-            self._data[normalized_path] = entry
-            self._save()
-            return file_hashes
+        Cold files are hashed on a bounded thread pool (hashlib, zlib and blake3 release
+        the GIL while hashing). Results are aligned with *file_paths*.
+        """
+        hash_types = normalize_hash_types(hash_types)
+        normalized_paths = [os.path.abspath(file_path) for file_path in file_paths]
+        resolved: Dict[str, Optional[Dict[str, str]]] = {}
+        pending: Dict[str, "Future[Optional[Dict[str, str]]]"] = {}
+
+        for normalized_path in normalized_paths:
+            if normalized_path in resolved or normalized_path in pending:
+                continue
+            if use_cache:
+                cached_hashes = self._cached_hashes(normalized_path, hash_types)
+                if cached_hashes is not None:
+                    resolved[normalized_path] = cached_hashes
+                    continue
+            # Workers run get_hashes(), so a path already being hashed elsewhere is
+            # waited on rather than hashed twice
+            pending[normalized_path] = self._executor().submit(
+                self.get_hashes, normalized_path, use_cache=use_cache, hash_types=hash_types)
+
+        for normalized_path, future in pending.items():
+            resolved[normalized_path] = future.result()
+        return [resolved[normalized_path] for normalized_path in normalized_paths]
+
+    def get_model_info(self, file_path: str, *, use_cache: bool = True) -> Optional[Dict[str, object]]:
+        """Return the safetensors header summary of *file_path* (see lora_metadata.summarize_header).
+
+        The header is read with a bounded read (never the tensor data) and cached with
+        the file's hashes. Returns None for files that are missing, not safetensors, or
+        unparseable; unparseable files are remembered until they change.
+        """
+        normalized_path = os.path.abspath(file_path)
+        if not is_safetensors(normalized_path):
+            return None
+        entry = self._valid_entry(normalized_path) if use_cache else None
+        if entry is not None and isinstance(entry.get("header"), dict):
+            return entry["header"] or None
+
+        file_stat = self._stat_file(normalized_path)
+        if file_stat is None:
+            return None
+        try:
+            summary = summarize_header(read_safetensors_header(normalized_path))
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Could not read safetensors header of '{normalized_path}': {exc}")
+            summary = {}
+        quick = entry.get("quick") if entry else None
+        if quick is None:
+            quick = self._quick_fingerprint(normalized_path)
+        self._update_entry(normalized_path, file_stat, quick, {"header": summary})
+        return summary or None
+
+    def validate_all(self) -> Dict[str, int]:
+        """Check every entry against the disk, stat-ing them in parallel on the hashing pool.
+
+        Entries whose stat changed but whose content did not are refreshed in place;
+        stale and missing entries are dropped, to be rehashed on next use.
+
+        Returns:
+            ``{'valid': int, 'revalidated': int, 'stale': int, 'missing': int}``
+        """
+        with self._lock:
+            items = list(self._data.items())
+        counts = dict.fromkeys(("valid", "revalidated", "stale", "missing"), 0)
+        results = self._executor().map(lambda item: self._validate(*item), items)
+        for (normalized_path, entry), (status, updated_entry) in zip(items, results):
+            counts[status] += 1
+            if status != "valid":
+                self._replace_entry(normalized_path, entry, updated_entry)
+        if counts["revalidated"] or counts["stale"] or counts["missing"]:
+            logger.log(f"Validated {len(items)} hash cache entries: {counts}")
+        return counts
 
     def invalidate(self, file_path: str) -> None:
         normalized_path = os.path.abspath(file_path)
         with self._lock:
-            if normalized_path in self._data:
-                self._data.pop(normalized_path, None)
-                self._save()
+            self._discard(normalized_path)
 
     def clear(self) -> None:
         with self._lock:
             self._data.clear()
-            self._save()
+            self._by_content.clear()
+            self._record("clear")
+
+    def find_duplicates(self) -> List[Dict[str, object]]:
+        """Report groups of cached paths with identical content (same SHA256).
+
+        Only entries that still match their file and have a SHA256 are reported. Paths
+        that resolve to the same file (symlinks, hard links) count once towards
+        ``copies`` and ``wasted_bytes``. Groups are sorted by wasted bytes, largest first.
+        """
+        with self._lock:
+            items = list(self._data.items())
+
+        groups: Dict[str, List[Tuple[str, Dict[str, object]]]] = {}
+        statuses = self._executor().map(lambda item: self._validate(*item)[0], items)
+        for (path, entry), status in zip(items, statuses):
+            sha256 = self._known_hashes(entry).get("sha256")
+            if sha256 and status in ("valid", "revalidated"):
+                groups.setdefault(sha256, []).append((path, entry))
+
+        report = []
+        for sha256, members in groups.items():
+            if len(members) < 2:
+                continue
+            size = members[0][1].get("size") or 0
+            # Legacy entries without identity fields count as distinct files
+            files = {(entry.get("dev"), entry.get("ino")) if entry.get("ino") else path for path, entry in members}
+            report.append({
+                "sha256": sha256,
+                "size": size,
+                "paths": sorted(path for path, _entry in members),
+                "copies": len(files),
+                "wasted_bytes": size * (len(files) - 1),
+            })
+        report.sort(key=lambda group: (-group["wasted_bytes"], group["sha256"]))
+        return report
+
+    def cached_paths(self) -> List[str]:
+        """Return the paths that currently have a cache entry."""
+        with self._lock:
+            return list(self._data)
 
     def get_hash(self, file_path: str, *, use_cache: bool = True) -> Optional[str]:
         """Return SHA256 hash for *file_path* using persistent cache (legacy compatibility)."""
@@ -257,6 +642,11 @@ class LoRAHashCache:
         with self._lock:
             return {
                 "entries": len(self._data),
+                "in_flight": len(self._inflight),
+                "duplicates_reused": self._duplicates_reused,
+                "journal_path": str(self._journal_path),
+                "journal_records": self._journal_records,
+                "pending_records": len(self._pending),
                 "cache_path": str(self._cache_path),
                 "blake3_available": BLAKE3_AVAILABLE,
             }
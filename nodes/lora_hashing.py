@@ -0,0 +1,218 @@
+"""Streaming hash engine for LoRA / checkpoint files.
+
+Computes the hash types CivitAI understands (SHA-256, CRC32, BLAKE3 and the
+AutoV1/AutoV2 short hashes) without ever holding the file in memory: the full-file
+hashers are fed from one reusable ``bytearray`` filled with ``readinto``, and the
+AutoV1/AutoV2 samples are read with ``seek`` so only their byte ranges are touched.
+Peak memory is one chunk regardless of file size.
+
+Multi-gigabyte checkpoints (at least ``MMAP_THRESHOLD`` bytes) are instead mapped
+read-only and ``memoryview`` slices of the mapping are handed to the hashers, which
+skips the copy from the page cache into a user-space buffer.
+
+``hash_file`` can compute any subset of the hash types. The full-file types share a
+single pass, and the file is only streamed at all when one of them is requested.
+
+``quick_fingerprint`` hashes only the size and the first and last 64 KB of a file.
+``LoRAHashCache`` uses it to revalidate entries cheaply without a full rehash.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+
+HASH_TYPES = ("sha256", "crc32", "blake3", "autov1", "autov2")
+# Types that need a pass over the whole file; the AutoV1/AutoV2 short hashes only sample it
+FULL_HASH_TYPES = ("sha256", "crc32", "blake3")
+SHORT_HASH_TYPES = ("autov1", "autov2")
+# Reported by the LoRA nodes and pre-computed by the indexer; the others are computed on demand
+PRIMARY_HASH_TYPES = ("sha256", "autov1", "autov2")
+
+# Large enough to amortize syscalls, small enough to stay in L2/L3 for the hashers
+CHUNK_SIZE = 1024 * 1024
+
+# Files at least this large are hashed through a read-only memory map
+MMAP_THRESHOLD = 256 * 1024 * 1024
+
+# AutoV1 hashes the first 8 KB; AutoV2 samples 2 KB at four positions of larger files
+_AUTOV1_LENGTH = 8192
+_AUTOV2_SAMPLE = 2048
+# CivitAI short hashes are the first 10 hex characters
+_SHORT_HASH_LENGTH = 10
+
+# Bytes read from each end of a file for its quick fingerprint
+QUICK_FINGERPRINT_SPAN = 64 * 1024
+
+
+def _short_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest().upper()[:_SHORT_HASH_LENGTH]
+
+
+def _read_range(fh: BinaryIO, offset: int, length: int) -> bytes:
+    fh.seek(offset)
+    return fh.read(length)
+
+
+def autov2_ranges(file_size: int) -> List[Tuple[int, int]]:
+    """Byte ranges ``(offset, length)`` sampled by AutoV2 for a file of *file_size* bytes."""
+    if file_size <= _AUTOV1_LENGTH:
+        return [(0, file_size)]
+    return [
+        (0, _AUTOV2_SAMPLE),
+        (file_size // 4, _AUTOV2_SAMPLE),
+        ((file_size * 3) // 4, _AUTOV2_SAMPLE),
+        (file_size - _AUTOV2_SAMPLE, _AUTOV2_SAMPLE),
+    ]
+
+
+def _short_hashes(read_range: Callable[[int, int], bytes], file_size: int) -> Tuple[str, str]:
+    """AutoV1 (first 8 KB) and AutoV2 (2 KB samples at the start, 25%, 75% and end,
+    or the whole file if small) from a ``read_range(offset, length)`` callable."""
+    autov1 = _short_sha256(read_range(0, _AUTOV1_LENGTH))
+    autov2 = _short_sha256(b"".join(read_range(offset, length) for offset, length in autov2_ranges(file_size)))
+    return autov1, autov2
+
+
+class _FullHashers:
+    """The requested subset of SHA-256, CRC32 and BLAKE3, fed from the same chunks."""
+
+    def __init__(self, hash_types: Tuple[str, ...]):
+        self.hash_types = hash_types
+        self.sha256 = hashlib.sha256() if "sha256" in hash_types else None
+        self.crc32 = 0 if "crc32" in hash_types else None
+        self.blake3 = blake3.blake3() if "blake3" in hash_types and BLAKE3_AVAILABLE else None
+
+    @property
+    def active(self) -> bool:
+        return self.sha256 is not None or self.crc32 is not None or self.blake3 is not None
+
+    def update(self, chunk) -> None:
+        if self.sha256 is not None:
+            self.sha256.update(chunk)
+        if self.crc32 is not None:
+            self.crc32 = zlib.crc32(chunk, self.crc32)
+        if self.blake3 is not None:
+            self.blake3.update(chunk)
+
+    def digests(self) -> Dict[str, Optional[str]]:
+        digests = {
+            "sha256": self.sha256.hexdigest().upper() if self.sha256 is not None else None,
+            "crc32": f"{self.crc32 & 0xffffffff:08X}" if self.crc32 is not None else None,
+            "blake3": self.blake3.hexdigest().upper() if self.blake3 is not None else None,
+        }
+        return {hash_type: digests[hash_type] for hash_type in self.hash_types}
+
+
+def _add_short_hashes(hashes: Dict[str, Optional[str]], hash_types: Tuple[str, ...],
+                      read_range: Callable[[int, int], bytes], file_size: int) -> None:
+    if any(hash_type in hash_types for hash_type in SHORT_HASH_TYPES):
+        autov1, autov2 = _short_hashes(read_range, file_size)
+        hashes.update((hash_type, value) for hash_type, value in (("autov1", autov1), ("autov2", autov2))
+                      if hash_type in hash_types)
+
+
+def _hash_buffered(fh: BinaryIO, file_size: int, chunk_size: int,
+                   hash_types: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    hashers = _FullHashers(tuple(hash_type for hash_type in hash_types if hash_type in FULL_HASH_TYPES))
+    if hashers.active:
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            read = fh.readinto(buffer)
+            if not read:
+                break
+            hashers.update(view[:read])
+
+    hashes = hashers.digests()
+    _add_short_hashes(hashes, hash_types, lambda offset, length: _read_range(fh, offset, length), file_size)
+    return hashes
+
+
+def _hash_mapped(fh: BinaryIO, file_size: int, chunk_size: int,
+                 hash_types: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    hashers = _FullHashers(tuple(hash_type for hash_type in hash_types if hash_type in FULL_HASH_TYPES))
+    with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            # Slices of the mapping go straight to the hashers: no copy into a user buffer
+            for offset in range(0, file_size, chunk_size):
+                hashers.update(view[offset:offset + chunk_size])
+            hashes = hashers.digests()
+            _add_short_hashes(hashes, hash_types, lambda offset, length: view[offset:offset + length].tobytes(),
+                              file_size)
+        finally:
+            view.release()
+    return hashes
+
+
+def quick_fingerprint(file_path: str) -> str:
+    """SHA-256 of a file's size and its first and last QUICK_FINGERPRINT_SPAN bytes.
+
+    Raises:
+        OSError: The file could not be read
+    """
+    with open(file_path, "rb", buffering=0) as fh:
+        file_size = os.fstat(fh.fileno()).st_size
+        digest = hashlib.sha256(str(file_size).encode("ascii"))
+        digest.update(_read_range(fh, 0, QUICK_FINGERPRINT_SPAN))
+        # The tail span never overlaps the head span
+        tail_start = max(QUICK_FINGERPRINT_SPAN, file_size - QUICK_FINGERPRINT_SPAN)
+        if tail_start < file_size:
+            digest.update(_read_range(fh, tail_start, file_size - tail_start))
+    return digest.hexdigest().upper()
+
+
+def normalize_hash_types(hash_types: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """Return *hash_types* in HASH_TYPES order (all of them for None).
+
+    Raises:
+        ValueError: An unknown hash type was requested
+    """
+    if hash_types is None:
+        return HASH_TYPES
+    requested = set(hash_types)
+    unknown = requested.difference(HASH_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown hash types: {sorted(unknown)}")
+    return tuple(hash_type for hash_type in HASH_TYPES if hash_type in requested)
+
+
+def hash_file(file_path: str, chunk_size: int = CHUNK_SIZE, use_mmap: Optional[bool] = None,
+              hash_types: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+    """Return the requested hash types (default: all of HASH_TYPES) for *file_path*.
+
+    ``blake3`` is None if the package is unavailable. The file is only read in full
+    when a type in FULL_HASH_TYPES is requested. Files of MMAP_THRESHOLD bytes or more
+    are memory-mapped unless *use_mmap* says otherwise; smaller files are streamed
+    through a reused buffer.
+
+    Raises:
+        OSError: The file could not be read
+        ValueError: An unknown hash type was requested
+    """
+    hash_types = normalize_hash_types(hash_types)
+    with open(file_path, "rb", buffering=0) as fh:
+        file_size = os.fstat(fh.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = file_size >= MMAP_THRESHOLD
+        # Empty files cannot be mapped, and a mapping only helps a full pass
+        if use_mmap and file_size > 0 and any(hash_type in FULL_HASH_TYPES for hash_type in hash_types):
+            try:
+                return _hash_mapped(fh, file_size, chunk_size, hash_types)
+            except (OSError, ValueError):
+                # e.g. filesystems without mmap support; fall back to reads
+                fh.seek(0)
+        return _hash_buffered(fh, file_size, chunk_size, hash_types)
@@ -0,0 +1,230 @@
+"""Background indexer that pre-hashes LoRA files before a workflow needs them.
+
+``LoRAIndexer`` walks ComfyUI's ``loras`` folders (from ``folder_paths`` when running
+inside ComfyUI, or an explicit list of folders), keeps a snapshot of every model file's
+``(mtime_ns, size)`` and, on each poll, hashes the new or changed files through the
+shared ``LoRAHashCache`` (by default only the types the LoRA nodes report). Cache
+entries for files that have disappeared are pruned.
+
+Hashing runs one file at a time on a daemon thread with raised niceness (on Linux this
+also lowers its I/O priority), and it waits while ComfyUI has prompts queued or the
+cache is hashing a file for a foreground caller. The first use of a LoRA then finds a
+warm cache entry instead of stalling the workflow.
+
+The indexer is opt-in (``LORA_HASH_INDEXER=true``): its first scan reads every model
+file in full, which on a large library is many gigabytes of disk I/O after startup.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .debug_utils import Logger
+from .lora_hash_cache import LoRAHashCache, get_cache as get_lora_hash_cache
+from .lora_hashing import PRIMARY_HASH_TYPES
+
+logger = Logger("LoRAIndexer")
+
+try:
+    import folder_paths
+    COMFYUI_AVAILABLE = True
+except ImportError:
+    folder_paths = None
+    COMFYUI_AVAILABLE = False
+
+# ComfyUI's folder_paths.supported_pt_extensions, used when it is not importable
+MODEL_EXTENSIONS = (".ckpt", ".pt", ".pt2", ".bin", ".pth", ".safetensors", ".pkl", ".sft")
+
+FileSignature = Tuple[int, int]
+
+
+def _comfyui_busy() -> bool:
+    """True while ComfyUI has prompts running or queued."""
+    try:
+        from server import PromptServer
+        return PromptServer.instance.prompt_queue.get_tasks_remaining() > 0
+    except Exception:
+        return False
+
+
+class LoRAIndexer:
+    """Polls model folders and keeps ``LoRAHashCache`` warm for every file in them."""
+
+    # Seconds between folder scans
+    DEFAULT_POLL_INTERVAL = 60.0
+    # Seconds to wait before re-checking whether the foreground is idle
+    IDLE_BACKOFF = 2.0
+    # Niceness added to the indexer thread
+    NICENESS = 10
+
+    def __init__(
+        self,
+        hash_cache: Optional[LoRAHashCache] = None,
+        folders: Optional[Iterable[str]] = None,
+        poll_interval: Optional[float] = None,
+        is_busy: Optional[Callable[[], bool]] = None,
+        hash_types: Iterable[str] = PRIMARY_HASH_TYPES,
+    ) -> None:
+        self._hash_cache = hash_cache or get_lora_hash_cache()
+        self._folders = [os.path.abspath(folder) for folder in folders] if folders is not None else None
+        self.poll_interval = poll_interval or self.DEFAULT_POLL_INTERVAL
+        self._is_busy = is_busy or _comfyui_busy
+        self.hash_types = tuple(hash_types)
+        self._snapshot: Dict[str, FileSignature] = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, object] = {"scans": 0, "files": 0, "indexed": 0, "pruned": 0, "last_scan": None}
+
+    def folders(self) -> List[str]:
+        """Folders to index: the explicit list, else ComfyUI's ``loras`` paths."""
+        if self._folders is not None:
+            return list(self._folders)
+        if not COMFYUI_AVAILABLE:
+            return []
+        try:
+            return [os.path.abspath(folder) for folder in folder_paths.get_folder_paths("loras")]
+        except Exception as exc:
+            logger.warning(f"Could not resolve ComfyUI loras folders: {exc}")
+            return []
+
+    def scan(self, folders: Optional[List[str]] = None) -> Dict[str, FileSignature]:
+        """Return ``{absolute path: (mtime_ns, size)}`` for every model file under *folders*."""
+        extensions = tuple(getattr(folder_paths, "supported_pt_extensions", MODEL_EXTENSIONS))
+        found: Dict[str, FileSignature] = {}
+        for folder in self.folders() if folders is None else folders:
+            for root, _dirs, files in os.walk(folder, followlinks=True):
+                for name in files:
+                    if not name.lower().endswith(extensions):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat_result = os.stat(path)
+                    except OSError:
+                        continue
+                    found[path] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return found
+
+    def _wait_for_idle(self) -> bool:
+        """Block while foreground work is running; False if the indexer is stopping."""
+        while not self._stop.is_set():
+            if not self._is_busy() and not self._hash_cache.get_cache_info()["in_flight"]:
+                return True
+            self._stop.wait(self.IDLE_BACKOFF)
+        return False
+
+    def _prune(self, folders: List[str], current: Dict[str, FileSignature]) -> int:
+        prefixes = tuple(os.path.join(folder, "") for folder in folders)
+        pruned = 0
+        for path in self._hash_cache.cached_paths():
+            if path.startswith(prefixes) and path not in current and not os.path.exists(path):
+                self._hash_cache.invalidate(path)
+                pruned += 1
+        return pruned
+
+    def run_once(self) -> Dict[str, int]:
+        """Scan once, hash new/changed files and prune deleted ones.
+
+        Returns:
+            ``{'files': int, 'indexed': int, 'pruned': int}``
+        """
+        folders = self.folders()
+        current = self.scan(folders)
+        pruned = self._prune(folders, current)
+
+        indexed = 0
+        snapshot: Dict[str, FileSignature] = {}
+        for path, signature in current.items():
+            if self._snapshot.get(path) != signature:
+                if not self._wait_for_idle():
+                    break
+                # Warm entries return after a stat; stale or missing ones are hashed
+                self._hash_cache.get_hashes(path, hash_types=self.hash_types)
+                indexed += 1
+            # Files skipped by a stop are picked up by the next scan
+            snapshot[path] = signature
+        self._snapshot = snapshot
+
+        self._status.update(
+            scans=self._status["scans"] + 1, files=len(current), last_scan=time.time(),
+            indexed=self._status["indexed"] + indexed, pruned=self._status["pruned"] + pruned,
+        )
+        if indexed or pruned:
+            logger.log(f"Indexed {indexed} and pruned {pruned} of {len(current)} LoRA files")
+        return {"files": len(current), "indexed": indexed, "pruned": pruned}
+
+    def _lower_priority(self) -> None:
+        # On Linux setpriority() on a thread id renices only that thread
+        if sys.platform.startswith("linux") and hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.NICENESS)
+            except OSError as exc:
+                logger.debug(f"Could not lower indexer priority: {exc}")
+
+    def _run(self) -> None:
+        self._lower_priority()
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error(f"LoRA index scan failed: {exc}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lora-indexer", daemon=True)
+        self._thread.start()
+
+    def trigger(self) -> None:
+        """Rescan now instead of waiting for the next poll."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop after the file currently being hashed."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_status(self) -> Dict[str, object]:
+        status = dict(self._status)
+        status["running"] = self._thread is not None and self._thread.is_alive()
+        status["folders"] = self.folders()
+        return status
+
+
+_indexer: Optional[LoRAIndexer] = None
+_indexer_lock = threading.Lock()
+
+
+def start_background_indexer() -> Optional[LoRAIndexer]:
+    """Start the module-level indexer if ``LORA_HASH_INDEXER`` enables it.
+
+    ``LORA_HASH_INDEXER_INTERVAL`` sets the poll interval in seconds. Returns None when
+    not enabled or when there are no ``loras`` folders to watch.
+    """
+    global _indexer
+    if os.environ.get("LORA_HASH_INDEXER", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _indexer_lock:
+        if _indexer is None:
+            interval = float(os.environ.get("LORA_HASH_INDEXER_INTERVAL") or LoRAIndexer.DEFAULT_POLL_INTERVAL)
+            indexer = LoRAIndexer(poll_interval=interval)
+            if not indexer.folders():
+                return None
+            _indexer = indexer
+        _indexer.start()
+        return _indexer
+
+
+def get_indexer() -> Optional[LoRAIndexer]:
+    """Return the running module-level indexer, if any."""
+    return _indexer
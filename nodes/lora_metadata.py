@@ -0,0 +1,158 @@
+"""Safetensors header parsing for LoRA files.
+
+A safetensors file starts with an 8-byte little-endian header length followed by a
+JSON header: one ``{"dtype", "shape", "data_offsets"}`` record per tensor plus an
+optional ``__metadata__`` map of strings. Trainers (kohya-ss, ai-toolkit, ...) write
+the network rank and alpha, base model, dataset tag frequencies and ModelSpec fields
+there. ``read_safetensors_header`` reads only that header, never the tensor data, and
+``summarize_header`` reduces it to the fields the LoRA nodes report.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import struct
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# The safetensors format caps the header at 100 MB
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+
+SAFETENSORS_EXTENSIONS = (".safetensors", ".sft")
+
+# Most frequent dataset tags reported as trigger-word candidates
+TRIGGER_WORD_LIMIT = 50
+
+# __metadata__ keys copied verbatim into the summary's "training" block
+TRAINING_KEYS = (
+    "ss_output_name",
+    "ss_training_started_at",
+    "ss_num_train_images",
+    "ss_num_epochs",
+    "ss_max_train_steps",
+    "ss_learning_rate",
+    "ss_resolution",
+    "ss_optimizer",
+    "ss_mixed_precision",
+    "ss_seed",
+    "ss_training_comment",
+)
+
+# Suffixes of LoRA down-projection weights, whose first dimension is the rank
+_DOWN_WEIGHT_SUFFIXES = (".lora_down.weight", ".lora_A.weight", ".lora.down.weight")
+
+
+def is_safetensors(file_path: str) -> bool:
+    return file_path.lower().endswith(SAFETENSORS_EXTENSIONS)
+
+
+def read_safetensors_header(file_path: str) -> Dict[str, Any]:
+    """Return the parsed JSON header of a safetensors file.
+
+    Only the length prefix and the header itself are read.
+
+    Raises:
+        OSError: The file could not be read
+        ValueError: The file is not a valid safetensors file
+    """
+    with open(file_path, "rb") as fh:
+        file_size = os.fstat(fh.fileno()).st_size
+        prefix = fh.read(8)
+        if len(prefix) != 8:
+            raise ValueError("file too short for a safetensors header")
+        (header_length,) = struct.unpack("<Q", prefix)
+        if header_length > MAX_HEADER_BYTES or header_length > file_size - 8:
+            raise ValueError(f"invalid safetensors header length {header_length}")
+        raw = fh.read(header_length)
+    if len(raw) != header_length:
+        raise ValueError("truncated safetensors header")
+    header = json.loads(raw.decode("utf-8"))
+    if not isinstance(header, dict):
+        raise ValueError("safetensors header is not a JSON object")
+    return header
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if math.isfinite(result) else None
+
+
+def _tag_frequencies(raw: Any) -> Dict[str, int]:
+    """Merge kohya's ``ss_tag_frequency`` (``{dataset: {tag: count}}``, JSON-encoded)."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return {}
+    if not isinstance(raw, dict):
+        return {}
+    totals: Counter = Counter()
+    for tags in raw.values():
+        if isinstance(tags, dict):
+            for tag, count in tags.items():
+                count = _to_int(count)
+                if count and str(tag).strip():
+                    totals[str(tag).strip()] += count
+    return dict(totals.most_common(TRIGGER_WORD_LIMIT))
+
+
+def summarize_header(header: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a safetensors header to rank, base model, trigger words and training info.
+
+    Keys whose value is unknown are omitted.
+    """
+    metadata = header.get("__metadata__")
+    metadata = metadata if isinstance(metadata, dict) else {}
+    tensors = {name: info for name, info in header.items() if name != "__metadata__" and isinstance(info, dict)}
+
+    parameters = 0
+    dtypes = set()
+    ranks: Counter = Counter()
+    for name, info in tensors.items():
+        shape = info.get("shape")
+        if isinstance(shape, list) and all(isinstance(dim, int) for dim in shape):
+            parameters += math.prod(shape)
+            if name.endswith(_DOWN_WEIGHT_SUFFIXES) and shape:
+                ranks[shape[0]] += 1
+        if info.get("dtype"):
+            dtypes.add(info["dtype"])
+
+    summary: Dict[str, Any] = {
+        "tensor_count": len(tensors),
+        "parameters": parameters,
+        "dtypes": sorted(dtypes),
+    }
+
+    # The trainer's declared dim wins; otherwise the most common down-projection rank
+    rank = _to_int(metadata.get("ss_network_dim"))
+    if rank is None and ranks:
+        rank = ranks.most_common(1)[0][0]
+    if rank is not None:
+        summary["rank"] = rank
+    if len(ranks) > 1:
+        summary["ranks"] = sorted(ranks)
+
+    optional_fields = {
+        "network_alpha": _to_float(metadata.get("ss_network_alpha")),
+        "network_module": metadata.get("ss_network_module"),
+        "base_model": metadata.get("ss_base_model_version") or metadata.get("modelspec.architecture"),
+        "base_model_name": metadata.get("ss_sd_model_name"),
+        "title": metadata.get("modelspec.title") or metadata.get("ss_output_name"),
+        "trigger_phrase": metadata.get("modelspec.trigger_phrase"),
+        "trigger_words": _tag_frequencies(metadata.get("ss_tag_frequency")),
+        "training": {key: metadata[key] for key in TRAINING_KEYS if metadata.get(key) not in (None, "", "None")},
+    }
+    summary.update((key, value) for key, value in optional_fields.items() if value not in (None, "", {}))
+    return summary
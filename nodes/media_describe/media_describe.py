@@ -1211,7 +1211,7 @@ Focus on vivid, focused scene details (e.g. bedroom props, lights, furniture or
                 "describe_subject": describe_subject
             }
 
-            cached_result = cache.get(
+            cached_result = cache.get_or_claim(
                 media_identifier=media_identifier,
                 gemini_model=gemini_model,
                 model_type=model_type,
@@ -1353,6 +1353,8 @@ Focus on vivid, focused scene details (e.g. bedroom props, lights, furniture or
             return (all_data, description, positive_prompt_json, positive_prompt, output_height, output_width)
 
         except Exception as e:
+            # Let other workers waiting on this media compute it themselves
+            get_cache().release_claims()
             # Re-raise the exception to stop workflow execution
             raise Exception(f"Image analysis failed: {str(e)}")
 
@@ -1690,7 +1692,7 @@ Example (structure only):
                 "max_duration": max_duration  # Include duration in cache key
             }
 
-            cached_result = cache.get(
+            cached_result = cache.get_or_claim(
                 media_identifier=media_identifier,
                 gemini_model=gemini_model,
                 model_type="",  # Videos don't use model_type
@@ -1830,6 +1832,8 @@ Example (structure only):
             return (all_data, description, positive_prompt_json, positive_prompt, output_height, output_width)
 
         except Exception as e:
+            # Let other workers waiting on this media compute it themselves
+            get_cache().release_claims()
             # Provide more specific error messages for common issues
             error_msg = str(e)
             if "500 INTERNAL" in error_msg:
@@ -1905,7 +1909,7 @@ Example (structure only):
 
         # Check cache before building prompts (early check with basic options)
         cache = get_cache()
-        cached_result = cache.get(
+        cached_result = cache.get_or_claim(
             media_identifier=media_identifier,
             gemini_model=model_name,
             model_type=model_type if media_type == "image" else "",
@@ -2384,5 +2388,7 @@ User Prompt:
             )
 
         except Exception as e:
+            # Let other workers waiting on this media compute it themselves
+            get_cache().release_claims()
             # Re-raise the exception to stop workflow execution
             raise Exception(f"Media analysis failed: {str(e)}")
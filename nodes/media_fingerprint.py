@@ -0,0 +1,168 @@
+"""
+Content fingerprints for in-memory media (torch tensors / numpy arrays).
+
+Used by GeminiCache to build media identifiers for tensor inputs. Two modes:
+
+- "exact": hashes the raw contiguous buffer (plus dtype and shape) without building
+  intermediate strings. The tensor is exposed to the hasher through the buffer
+  protocol via ``numpy()``, so CPU tensors are hashed zero-copy.
+- "perceptual": samples every frame down to a 9x8 grayscale grid and emits a
+  64-bit difference hash per frame, so re-encoded or slightly altered copies of the
+  same image map to the same identifier.
+
+Exact fingerprints use the standard library's SHA-256 (hardware accelerated on
+current CPUs, and measurably faster than hashlib's BLAKE2b there), so the same tensor
+gets the same cache key on every host whatever optional packages are installed.
+``GEMINI_CACHE_TENSOR_HASH=xxh3`` or ``blake3`` opts into a faster hasher. The
+algorithm name is part of the identifier, so fingerprints from different hashers never
+collide, but switching hashers (or uninstalling the package an opted-in hasher needs,
+which falls back to SHA-256) makes every cached tensor entry a miss, and caches or
+bundles shared between hosts only hit where the hasher is the same.
+"""
+
+import hashlib
+import os
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+
+FINGERPRINT_MODES = ("exact", "perceptual")
+
+# dHash grid: 9 columns give 8 horizontal gradients per row
+_DHASH_WIDTH = 9
+_DHASH_HEIGHT = 8
+# Frames are sampled down to about this many pixels per side before averaging
+_SAMPLE_SIZE = 256
+
+
+def _default_hasher() -> Tuple[str, Callable[[], Any]]:
+    name = os.environ.get("GEMINI_CACHE_TENSOR_HASH", "").strip().lower() or "sha256"
+    if name == "xxh3" and XXHASH_AVAILABLE:
+        return "xxh3", xxhash.xxh3_128
+    if name == "blake3" and BLAKE3_AVAILABLE:
+        return "blake3", blake3.blake3
+    if name != "sha256":
+        print(f"[CACHE] GEMINI_CACHE_TENSOR_HASH={name!r} is unavailable or unknown, using sha256 "
+              f"(cached tensor entries made with {name} will miss)")
+    return "sha256", hashlib.sha256
+
+
+HASH_NAME, _new_hasher = _default_hasher()
+
+
+def _hex_digest(hasher: Any) -> str:
+    # 128-bit digests for every algorithm
+    return hasher.hexdigest()[:32]
+
+
+def _to_array(tensor_data: Any) -> Tuple[Optional["np.ndarray"], str]:
+    """
+    Return a C-contiguous numpy view of *tensor_data* plus a dtype/shape descriptor.
+
+    The array is None when the data exposes no numeric buffer.
+    """
+    if not NUMPY_AVAILABLE:
+        return None, ""
+
+    if hasattr(tensor_data, "detach") and hasattr(tensor_data, "numpy"):
+        tensor = tensor_data.detach()
+        if getattr(tensor, "device", None) is not None and tensor.device.type != "cpu":
+            tensor = tensor.cpu()
+        tensor = tensor.contiguous()
+        descriptor = f"{tensor.dtype}{tuple(tensor.shape)}"
+        try:
+            return tensor.numpy(), descriptor
+        except TypeError:
+            # dtypes numpy does not know (bfloat16, float8): expose the raw bytes instead
+            import torch
+            return tensor.reshape(-1).view(torch.uint8).numpy(), descriptor
+
+    if isinstance(tensor_data, np.ndarray) and tensor_data.dtype != object:
+        array = np.ascontiguousarray(tensor_data)
+        return array, f"{array.dtype.str}{array.shape}"
+
+    return None, ""
+
+
+def exact_fingerprint(tensor_data: Any) -> str:
+    """Hash the raw tensor buffer together with its dtype and shape."""
+    array, descriptor = _to_array(tensor_data)
+    hasher = _new_hasher()
+
+    if array is None:
+        # Plain Python data (lists, scalars): fall back to its repr
+        hasher.update(repr(tensor_data).encode("utf-8"))
+        return f"{HASH_NAME}:{_hex_digest(hasher)}"
+
+    hasher.update(descriptor.encode("ascii"))
+    if array.size:
+        # Byte view of the same memory; 0-d and empty arrays have nothing to add
+        hasher.update(array.reshape(-1).view(np.uint8))
+    return f"{HASH_NAME}:{_hex_digest(hasher)}"
+
+
+def perceptual_fingerprint(tensor_data: Any) -> str:
+    """
+    Difference hash of each frame on a 9x8 grayscale grid.
+
+    Expects ComfyUI image layout ``[B, H, W, C]`` (``[H, W, C]`` and ``[H, W]`` are also
+    accepted). Falls back to the exact fingerprint for anything else.
+    """
+    array, _ = _to_array(tensor_data)
+    if array is None or array.ndim not in (2, 3, 4) or array.dtype.kind not in "biuf":
+        return exact_fingerprint(tensor_data)
+
+    frames = array
+    if frames.ndim == 2:
+        frames = frames[None, :, :, None]
+    elif frames.ndim == 3:
+        frames = frames[None]
+
+    if frames.shape[1] < _DHASH_HEIGHT or frames.shape[2] < _DHASH_WIDTH:
+        return exact_fingerprint(tensor_data)
+
+    # Strided view (no copy) down to roughly _SAMPLE_SIZE pixels per side, then
+    # area-average that into the grid
+    row_step = max(1, frames.shape[1] // _SAMPLE_SIZE)
+    col_step = max(1, frames.shape[2] // _SAMPLE_SIZE)
+    frames = frames[:, ::row_step, ::col_step]
+    height, width = frames.shape[1], frames.shape[2]
+
+    row_edges = np.linspace(0, height, _DHASH_HEIGHT + 1).astype(np.intp)[:-1]
+    col_edges = np.linspace(0, width, _DHASH_WIDTH + 1).astype(np.intp)[:-1]
+    grid = np.add.reduceat(frames, row_edges, axis=1, dtype=np.float64)
+    grid = np.add.reduceat(grid, col_edges, axis=2)
+    # Columns may differ in width by one pixel, so normalize before comparing neighbours
+    col_widths = np.diff(np.append(col_edges, width))
+    gray = grid.mean(axis=3) / col_widths
+
+    bits = gray[:, :, 1:] > gray[:, :, :-1]
+    frame_hashes = np.packbits(bits.reshape(bits.shape[0], -1), axis=1)
+    return f"dhash:{frame_hashes.tobytes().hex()}"
+
+
+def fingerprint_tensor(tensor_data: Any, mode: str = "exact") -> str:
+    """Return a content fingerprint for *tensor_data* using *mode* ("exact" or "perceptual")."""
+    if mode == "perceptual":
+        return perceptual_fingerprint(tensor_data)
+    if mode != "exact":
+        raise ValueError(f"Unknown fingerprint mode: {mode}")
+    return exact_fingerprint(tensor_data)
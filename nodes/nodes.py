@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from .civitai_service import CivitAIService
 from .lora_hash_cache import get_cache as get_lora_hash_cache
+from .lora_hashing import PRIMARY_HASH_TYPES
 from .media_describe import (GeminiUtilOptions, LLMStudioOptions, MediaDescribe, MediaDescribeOverrides, 
                               LLMStudioVideoDescribe, LLMStudioPictureDescribe,
                               LLMStudioStructuredDescribe, LLMStudioStructuredVideoDescribe)
@@ -233,6 +234,12 @@ class LoRAInfoExtractor:
                     entries = [synthetic]
             logger.log(f"Discovered {len(entries)} LoRA entries in stack")
 
+            # Hash every cold file of the stack in parallel before the per-entry pass
+            entry_paths = self._entry_paths(entries)
+            self._prefetch_hashes(entry_paths)
+            # Look the whole stack up on CivitAI concurrently; results are in stack order
+            civitai_results = civitai_service.get_model_info_many(entry_paths) if civitai_service else [None] * len(entries)
+
             processed_entries = []
             info_lines: List[str] = []
             missing_files = 0
@@ -244,8 +251,7 @@ class LoRAInfoExtractor:
                 metadata = self._process_entry(
                     entry,
                     index,
-                    civitai_service,
-                    use_civitai_api,
+                    civitai_results[index],
                 )
 
                 processed_entries.append(metadata)
@@ -378,7 +384,23 @@ class LoRAInfoExtractor:
             return True
         return False
 
-    def _process_entry(self, entry: Dict[str, Any], index: int, civitai_service: Optional[CivitAIService], use_civitai_api: bool) -> Dict[str, Any]:
+    def _entry_paths(self, entries: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Absolute path of each entry's file, or None when it has none or it does not exist."""
+        paths: List[Optional[str]] = []
+        for entry in entries:
+            file_path = self._extract_first(entry, self.PATH_ATTRIBUTES)
+            normalized_path = None
+            if isinstance(file_path, str) and file_path.strip():
+                normalized_path = os.path.abspath(file_path.strip())
+            paths.append(normalized_path if normalized_path and os.path.exists(normalized_path) else None)
+        return paths
+
+    def _prefetch_hashes(self, entry_paths: List[Optional[str]]) -> None:
+        paths = [path for path in entry_paths if path]
+        if len(paths) > 1:
+            self.hash_cache.get_hashes_many(paths, hash_types=PRIMARY_HASH_TYPES)
+
+    def _process_entry(self, entry: Dict[str, Any], index: int, civitai_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         file_path = self._extract_first(entry, self.PATH_ATTRIBUTES)
         if isinstance(file_path, str):
             file_path = file_path.strip()
@@ -397,15 +419,15 @@ class LoRAInfoExtractor:
         name_from_filename = self._clean_name(os.path.basename(file_path)) if file_path else None
         display_name = self._select_display_name(raw_name, name_from_filename)
 
-        # Get all hash types
-        file_hashes = self.hash_cache.get_hashes(normalized_path) if file_exists else None
+        # SHA256 plus the CivitAI short hashes; CRC32/BLAKE3 are only computed if CivitAI needs them
+        file_hashes = self.hash_cache.get_hashes(normalized_path, hash_types=PRIMARY_HASH_TYPES) if file_exists else None
         legacy_hash = file_hashes.get('sha256') if file_hashes else None  # For backward compatibility
+        # Rank, base model and trigger words from the safetensors header, no API call needed
+        model_info = self.hash_cache.get_model_info(normalized_path) if file_exists else None
 
-        civitai_data = None
-        if file_exists and use_civitai_api and civitai_service:
-            civitai_data = civitai_service.get_model_info_by_hash(normalized_path)
-            if civitai_data and civitai_data.get("civitai_name"):
-                display_name = self._select_display_name(civitai_data.get("civitai_name"), display_name)
+        # Looked up for the whole stack by extract_lora_info
+        if civitai_data and civitai_data.get("civitai_name"):
+            display_name = self._select_display_name(civitai_data.get("civitai_name"), display_name)
 
         file_info = {
             "exists": file_exists,
@@ -419,7 +441,8 @@ class LoRAInfoExtractor:
             "index": index,
             "display_name": display_name,
             "hash": legacy_hash,  # Keep for backward compatibility
-            "hashes": file_hashes,  # All computed hash types
+            "hashes": file_hashes,  # PRIMARY_HASH_TYPES
+            "model_info": model_info,
             "file": file_info,
             "strength": strength,
             "original": {
@@ -474,6 +497,12 @@ class LoRAInfoExtractor:
             hash_count = sum(1 for v in hashes.values() if v is not None)
             segments.append(f"{hash_count} hash types")
 
+        model_info = metadata.get("model_info") or {}
+        if model_info.get("rank"):
+            segments.append(f"rank {model_info['rank']}")
+        if model_info.get("base_model"):
+            segments.append(str(model_info["base_model"]))
+
         file_info = metadata["file"]
         if not file_info["exists"]:
             segments.append("missing file")
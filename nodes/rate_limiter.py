@@ -0,0 +1,117 @@
+"""Token-bucket rate limiter for outbound API requests.
+
+``TokenBucket`` admits ``rate`` requests per second on average with bursts of up to
+``burst``. Callers reserve a token and sleep until it is theirs, so waiters are served
+in arrival order without polling. ``pause()`` stops all requests for a while, e.g. for
+the ``Retry-After`` of an HTTP 429, because one throttled request means every request
+made with the same API key is throttled.
+
+State is guarded by a ``threading.Lock`` and waiting uses ``asyncio.sleep``, so one
+bucket can be shared process-wide by coroutines on any event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from .debug_utils import Logger
+
+logger = Logger("RateLimiter")
+
+class TokenBucket:
+    """Process-wide request budget: ``rate`` tokens per second, at most ``burst`` saved up."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self._lock = threading.Lock()
+        # May go negative: each waiter has reserved a future token
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._stats = {"acquired": 0, "delayed": 0, "wait_seconds": 0.0, "pauses": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str, rate: float, burst: int) -> "TokenBucket":
+        """Build a bucket from ``<prefix>_RATE_LIMIT`` (requests/s) and ``<prefix>_RATE_BURST``."""
+        rate_value = os.environ.get(f"{prefix}_RATE_LIMIT", "").strip()
+        burst_value = os.environ.get(f"{prefix}_RATE_BURST", "").strip()
+        try:
+            return cls(float(rate_value) if rate_value else rate, int(burst_value) if burst_value else burst)
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid {prefix}_RATE_LIMIT/{prefix}_RATE_BURST: {e}")
+            return cls(rate, burst)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            delay = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._paused_until - now)
+            self._stats["acquired"] += 1
+            if delay > 0:
+                self._stats["delayed"] += 1
+                self._stats["wait_seconds"] += delay
+            return delay
+
+    def refund(self) -> None:
+        """Return a reserved token that was not used (e.g. the waiter was cancelled)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.burst, self._tokens + 1)
+            self._stats["acquired"] -= 1
+
+    async def acquire(self) -> None:
+        """Wait for a token; cancelling the wait gives the token back."""
+        delay = self.reserve()
+        if delay <= 0:
+            return
+        with self._lock:
+            self._waiting += 1
+        try:
+            while delay > 0:
+                await asyncio.sleep(delay)
+                # A pause() may have started while this waiter slept
+                with self._lock:
+                    delay = self._paused_until - time.monotonic()
+        except asyncio.CancelledError:
+            self.refund()
+            raise
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request, including already reserved ones, for *seconds*."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._stats["pauses"] += 1
+
+    def get_state(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            state: Dict[str, Any] = dict(self._stats)
+            state.update(
+                rate=self.rate,
+                burst=self.burst,
+                tokens=round(max(self._tokens, 0.0), 2),
+                waiting=self._waiting,
+                paused_for=round(max(self._paused_until - now, 0.0), 2),
+            )
+            state["wait_seconds"] = round(state["wait_seconds"], 2)
+            return state
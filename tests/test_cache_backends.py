@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Storage backend tests for GeminiCache
+
+Tests:
+1. SQLite backend round-trips entries and keeps O(1) stats in sync
+2. JSON backend keeps the legacy one-file-per-entry layout and tracks stats without rescans
+3. Legacy JSON entries are migrated into SQLite on first access
+4. Size/entry limits evict least-recently-hit entries
+5. Entries older than max_age are expired
+6. The in-memory hot tier serves repeat lookups and respects its budgets
+7. Compact encoding round-trips LLM Studio entries and reads legacy JSON
+8. Batch get_many/set_many agree with get/set on both backends
+9. Concurrent misses for one key are computed once (threads and separate cache instances)
+10. File identifiers come from one stat, are memoized and track file changes
+11. Bundles export, import and warm up caches across backends and encodings
+12. Metrics count hits, misses, bytes and latency per model and media type
+13. Migrated and imported entries keep their age, so max-age sweeps remove them
+"""
+
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from nodes import cache as gemini_cache
+from nodes import media_fingerprint
+from nodes.cache import EvictionPolicy, GeminiCache, get_file_media_identifier
+from nodes.cache_backends import JsonFileBackend, SQLiteBackend
+from nodes.cache_bundle import read_bundle_info
+
+
+def test_sqlite_backend_round_trip():
+    """SQLite backend stores, overwrites and deletes entries"""
+    print("\n=== Test 1: SQLite Backend Round Trip ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir)
+        assert isinstance(cache.backend, SQLiteBackend)
+
+        cache.set('test:media:a', 'models/gemini-2.5-flash', 'first', options={'describe_clothing': True})
+        cache.set('test:media:b', 'models/gemini-2.5-flash', 'second')
+        cache.set('test:media:b', 'models/gemini-2.5-flash', 'second, rewritten')
+
+        result = cache.get('test:media:a', 'models/gemini-2.5-flash', options={'describe_clothing': True})
+        assert result and result['description'] == 'first'
+        result = cache.get('test:media:b', 'models/gemini-2.5-flash')
+        assert result and result['description'] == 'second, rewritten'
+        assert cache.get('test:media:c', 'models/gemini-2.5-flash') is None
+
+        info = cache.get_cache_info()
+        assert info['backend'] == 'sqlite'
+        assert info['entries'] == 2
+        stored = sum(len(cache.backend.read(key)) for key in cache.backend.keys())
+        assert info['total_size'] == stored
+
+        cache_key = cache._get_cache_key('test:media:a', 'models/gemini-2.5-flash', '', {'describe_clothing': True})
+        assert cache.backend.delete(cache_key)
+        assert cache.get_cache_info()['entries'] == 1
+        cache.backend.close()
+        print("✅ SQLite backend round trip and stats verified")
+
+
+def test_json_backend_layout():
+    """JSON backend writes one <cache_key>.json file per entry"""
+    print("\n=== Test 2: JSON Backend Layout ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir, backend="json")
+        cache.set('test:media:json', 'models/gemini-2.5-flash', 'json entry')
+
+        cache_key = cache._get_cache_key('test:media:json', 'models/gemini-2.5-flash')
+        with open(os.path.join(tmp_dir, f"{cache_key}.json"), 'r', encoding='utf-8') as f:
+            assert json.load(f)['description'] == 'json entry'
+        assert cache.get_cache_info()['entries'] == 1
+
+        # Stats follow this process's writes and deletes without rescanning the directory
+        scanned_at = cache.backend._stats_scanned_at
+        cache.set('test:media:json2', 'models/gemini-2.5-flash', 'second json entry')
+        cache.set('test:media:json', 'models/gemini-2.5-flash', 'json entry, rewritten')
+        assert cache.backend.delete(cache._get_cache_key('test:media:json2', 'models/gemini-2.5-flash'))
+        assert cache.backend.stats() == JsonFileBackend(tmp_dir).stats()
+        assert cache.backend._stats_scanned_at == scanned_at
+        print("✅ JSON backend layout verified")
+
+
+def test_legacy_json_migration():
+    """Existing JSON cache directories are imported into SQLite once"""
+    print("\n=== Test 3: Legacy JSON Migration ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy = GeminiCache(cache_dir=tmp_dir, backend="json")
+        for i in range(3):
+            legacy.set(f'test:media:legacy{i}', 'models/gemini-2.5-flash', f'legacy {i}')
+
+        cache = GeminiCache(cache_dir=tmp_dir)
+        result = cache.get('test:media:legacy1', 'models/gemini-2.5-flash')
+        assert result and result['description'] == 'legacy 1'
+        assert cache.get_cache_info()['entries'] == 3
+        assert not [name for name in os.listdir(tmp_dir) if name.endswith('.json')]
+        cache.backend.close()
+        print("✅ Legacy JSON entries migrated and removed")
+
+
+def test_lru_eviction():
+    """Entry and byte limits evict the least recently hit entries first"""
+    print("\n=== Test 4: LRU Eviction ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir, eviction_policy=EvictionPolicy(max_entries=3))
+        for i in range(3):
+            cache.set(f'test:media:lru{i}', 'models/gemini-2.5-flash', f'entry {i}')
+
+        # Make entry 0 the most recently hit so entry 1 becomes the LRU victim
+        cache.backend._connection().execute("UPDATE entries SET last_hit = last_hit - 1000")
+        cache.memory.clear()
+        assert cache.get('test:media:lru0', 'models/gemini-2.5-flash')
+        cache.set('test:media:lru3', 'models/gemini-2.5-flash', 'entry 3')
+
+        assert cache.get('test:media:lru1', 'models/gemini-2.5-flash') is None
+        assert cache.get('test:media:lru0', 'models/gemini-2.5-flash')
+        info = cache.get_cache_info()
+        assert info['entries'] == 3
+        assert info['evictions']['evicted_entries'] == 1
+
+        cache.eviction_policy = EvictionPolicy(max_bytes=info['total_size'] // 2)
+        cache.sweep()
+        after = cache.get_cache_info()
+        assert after['total_size'] <= info['total_size'] // 2
+        assert after['evictions']['evicted_bytes'] == info['total_size'] - after['total_size'] \
+            + info['evictions']['evicted_bytes']
+
+        # A failed delete evicts nothing and is not counted
+        def failing_delete_many(cache_keys):
+            raise sqlite3.OperationalError("database is locked")
+        cache.backend.delete_many = failing_delete_many
+        cache.eviction_policy = EvictionPolicy(max_entries=0)
+        try:
+            cache.sweep()
+        except sqlite3.OperationalError:
+            pass
+        assert cache.get_cache_info()['evictions'] == after['evictions']
+        cache.backend.close()
+        print("✅ LRU eviction honours entry and byte limits")
+
+
+def test_max_age_expiry():
+    """Entries older than max_age are misses and are removed by sweeps"""
+    print("\n=== Test 5: Max Age Expiry ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir, eviction_policy=EvictionPolicy(max_age=3600))
+        cache.set('test:media:old', 'models/gemini-2.5-flash', 'old', extra_data={'timestamp': time.time() - 7200})
+        cache.set('test:media:older', 'models/gemini-2.5-flash', 'older')
+        cache.set('test:media:new', 'models/gemini-2.5-flash', 'new')
+        cache.backend._connection().execute(
+            "UPDATE entries SET created_at = created_at - 7200 WHERE cache_key = ?",
+            (cache._get_cache_key('test:media:older', 'models/gemini-2.5-flash'),))
+
+        assert cache.get('test:media:old', 'models/gemini-2.5-flash') is None
+        assert cache.sweep()['expired'] == 1
+        assert cache.get('test:media:new', 'models/gemini-2.5-flash')
+        info = cache.get_cache_info()
+        assert info['entries'] == 1
+        assert info['evictions']['expired_entries'] == 2
+        cache.backend.close()
+        print("✅ Expired entries are misses and are swept")
+
+
+def test_memory_hot_tier():
+    """Repeat lookups are served from memory; the tier stays within its budget"""
+    print("\n=== Test 6: Memory Hot Tier ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir, memory_max_entries=2)
+        for i in range(3):
+            cache.set(f'test:media:hot{i}', 'models/gemini-2.5-flash', f'hot {i}')
+        assert len(cache.memory) == 2
+
+        # Entry 0 was pushed out of memory, so it comes from disk and is promoted
+        assert cache.get('test:media:hot0', 'models/gemini-2.5-flash')['description'] == 'hot 0'
+        assert cache.get('test:media:hot0', 'models/gemini-2.5-flash')['description'] == 'hot 0'
+        tiers = cache.get_cache_info()['tiers']
+        assert tiers['memory'] == {'hits': 1, 'misses': 1}
+        assert tiers['disk'] == {'hits': 1, 'misses': 0}
+
+        # Memory hits still refresh the backend's last-hit timestamp (throttled)
+        cache_key = cache._get_cache_key('test:media:hot0', 'models/gemini-2.5-flash')
+        conn = cache.backend._connection()
+        conn.execute("UPDATE entries SET last_hit = 0 WHERE cache_key = ?", (cache_key,))
+        cache.memory._entries[cache_key][2] = 0
+        cache.get('test:media:hot0', 'models/gemini-2.5-flash')
+        assert conn.execute("SELECT last_hit FROM entries WHERE cache_key = ?", (cache_key,)).fetchone()[0] > 0
+
+        # Returned entries are copies; mutating them does not corrupt the hot tier
+        cache.get('test:media:hot0', 'models/gemini-2.5-flash')['description'] = 'mutated'
+        assert cache.get('test:media:hot0', 'models/gemini-2.5-flash')['description'] == 'hot 0'
+
+        small = GeminiCache(cache_dir=tmp_dir, memory_max_bytes=1)
+        assert small.get('test:media:hot1', 'models/gemini-2.5-flash')
+        assert len(small.memory) == 0
+        cache.backend.close()
+        small.backend.close()
+        print("✅ Hot tier serves repeats and honours its budgets")
+
+
+def _llm_studio_extra_data():
+    """Extra data shaped like the LLM Studio path in MediaDescribe"""
+    llm_json = {"subject": "A woman with long dark hair stands on a rooftop at dusk",
+                "clothing": "She wears a red silk dress with thin straps",
+                "movement": "", "scene": "City lights glitter below a violet sky", "visual_style": ""}
+    positive_prompt = "\n\n".join(value for value in llm_json.values() if value)
+    all_data = json.dumps({
+        "description": positive_prompt, "media_info": "📷 Image", "gemini_status": "✅ Complete",
+        "positive_prompt": positive_prompt, "final_string": positive_prompt, "height": 832, "width": 480,
+        **llm_json,
+    })
+    return positive_prompt, {
+        "height": 832, "width": 480, "all_data": all_data,
+        "raw_llm_json": json.dumps(llm_json, indent=2), "positive_prompt": positive_prompt,
+        "prompt_request": "Describe the image",
+    }
+
+
+def test_compact_encoding():
+    """Compact entries are smaller, read back identically and legacy JSON stays readable"""
+    print("\n=== Test 7: Compact Encoding ===")
+    positive_prompt, extra_data = _llm_studio_extra_data()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy = GeminiCache(cache_dir=tmp_dir, encoding="json")
+        legacy.set('test:media:legacy', 'local-model', positive_prompt, extra_data=extra_data)
+
+        cache = GeminiCache(cache_dir=tmp_dir, memory_max_entries=0)
+        assert cache.encoding == 'compact'
+        cache.set('test:media:compact', 'local-model', positive_prompt, extra_data=extra_data)
+
+        for media_id in ('test:media:legacy', 'test:media:compact'):
+            result = cache.get(media_id, 'local-model')
+            for field, value in extra_data.items():
+                assert result[field] == value, field
+            assert result['description'] == positive_prompt
+
+        legacy_size = len(cache.backend.read(cache._get_cache_key('test:media:legacy', 'local-model')))
+        compact_size = len(cache.backend.read(cache._get_cache_key('test:media:compact', 'local-model')))
+        print(f"   Legacy JSON: {legacy_size} bytes, compact: {compact_size} bytes")
+        assert compact_size < legacy_size / 2
+        cache.backend.close()
+        legacy.backend.close()
+        print("✅ Compact encoding verified")
+
+
+def test_batch_api():
+    """set_many/get_many store and resolve several items in one call"""
+    print("\n=== Test 8: Batch API ===")
+    for backend in ("sqlite", "json"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = GeminiCache(cache_dir=tmp_dir, backend=backend, memory_max_entries=2)
+            cache.set_many([
+                ('test:media:batch0', 'models/gemini-2.5-flash', 'batch 0'),
+                ('test:media:batch1', 'models/gemini-2.5-flash', 'batch 1', 'Text2Image'),
+                ('test:media:batch2', 'models/gemini-2.5-flash', 'batch 2', 'Text2Image', {'describe_bokeh': True},
+                 {'height': 832}),
+            ])
+            cache.set('test:media:batch3', 'models/gemini-2.5-flash', 'batch 3')
+
+            results = cache.get_many([
+                ('test:media:batch0', 'models/gemini-2.5-flash'),
+                ('test:media:batch1', 'models/gemini-2.5-flash', 'Text2Image'),
+                ('test:media:batch2', 'models/gemini-2.5-flash', 'Text2Image', {'describe_bokeh': True}),
+                ('test:media:batch3', 'models/gemini-2.5-flash'),
+                ('test:media:missing', 'models/gemini-2.5-flash'),
+                ('test:media:batch0', 'models/gemini-2.5-flash'),
+            ])
+            assert [r and r['description'] for r in results] == ['batch 0', 'batch 1', 'batch 2', 'batch 3', None, 'batch 0']
+            assert results[2]['height'] == 832
+            assert results[0] is not results[5]
+            assert results[1] == cache.get('test:media:batch1', 'models/gemini-2.5-flash', 'Text2Image')
+            cache.backend.close()
+    print("✅ Batch API verified on sqlite and json backends")
+
+
+def test_single_flight():
+    """Concurrent get_or_claim misses for one key compute it once; failed claims are handed over"""
+    print("\n=== Test 9: Single-Flight Misses ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Two instances on one directory only share the lock files, like two processes
+        caches = [GeminiCache(cache_dir=tmp_dir), GeminiCache(cache_dir=tmp_dir)]
+        computed = []
+        results = []
+
+        def worker(cache):
+            result = cache.get_or_claim('test:media:flight', 'models/gemini-2.5-flash', timeout=10)
+            if result is None:
+                computed.append(threading.get_ident())
+                time.sleep(0.2)
+                cache.set('test:media:flight', 'models/gemini-2.5-flash', 'computed once')
+                result = cache.get('test:media:flight', 'models/gemini-2.5-flash')
+            results.append(result['description'])
+
+        threads = [threading.Thread(target=worker, args=(caches[i % 2],)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(computed) == 1, computed
+        assert results == ['computed once'] * 6
+        assert not os.listdir(os.path.join(tmp_dir, GeminiCache.LOCK_DIRNAME))
+
+        # An owner that fails releases its claim and a waiter takes over
+        cache = caches[0]
+        assert cache.get_or_claim('test:media:failed', 'models/gemini-2.5-flash') is None
+        claimed = []
+
+        def waiter_worker():
+            claimed.append(cache.get_or_claim('test:media:failed', 'models/gemini-2.5-flash', timeout=10))
+            claimed.append(len(cache._flights))
+            cache.release_claims()
+
+        waiter = threading.Thread(target=waiter_worker)
+        waiter.start()
+        time.sleep(0.1)
+        assert waiter.is_alive()
+        cache.release_claims()
+        waiter.join(5)
+        assert claimed == [None, 1]
+        assert not cache._flights
+
+        # set_many releases the claim of an entry it cannot encode, so waiters do not block
+        assert cache.get_or_claim('test:media:unencodable', 'models/gemini-2.5-flash') is None
+        cache.set_many([('test:media:unencodable', 'models/gemini-2.5-flash', 'bad', '', None, {'frame': object()}),
+                        ('test:media:encodable', 'models/gemini-2.5-flash', 'good')])
+        assert not cache._flights
+        assert cache.get('test:media:encodable', 'models/gemini-2.5-flash')['description'] == 'good'
+        for cache in caches:
+            cache.backend.close()
+
+        # JSON writes go through a temp file, so no partial files are left behind
+        json_cache = GeminiCache(cache_dir=tmp_dir, backend="json")
+        json_cache.set('test:media:atomic', 'models/gemini-2.5-flash', 'atomic')
+        assert not [name for name in os.listdir(tmp_dir) if name.endswith('.partial')]
+    print("✅ Single-flight misses verified")
+
+
+def test_file_identifier_memo():
+    """File identifiers keep the legacy format and change when the file does"""
+    print("\n=== Test 10: File Identifier Memo ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'frame.png')
+        assert get_file_media_identifier(path) == f"missing:{path}"
+
+        with open(path, 'wb') as f:
+            f.write(b'first')
+        first = get_file_media_identifier(path)
+        assert first == f"file:{path}:mtime:{os.path.getmtime(path)}:size:5"
+        assert gemini_cache._identity_memo[path][1] == first
+        assert get_file_media_identifier(path) is first
+
+        with open(path, 'wb') as f:
+            f.write(b'second version')
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        second = get_file_media_identifier(path)
+        assert second != first and second.endswith(':size:14')
+        assert GeminiCache(cache_dir=tmp_dir)._get_file_identifier(path) == second
+    print("✅ File identifier memo verified")
+
+
+def test_bundle_round_trip():
+    """A bundle moves entries between caches and warm-up fills the memory tier"""
+    print("\n=== Test 11: Export/Import Bundles ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = GeminiCache(cache_dir=os.path.join(tmp_dir, 'source'))
+        source.set_many([(f'tensor:xxh3:{i:032x}', 'models/gemini-2.5-flash', f'description {i}', 'Text2Image',
+                          {'describe_bokeh': True}, {'height': 832}) for i in range(20)])
+        bundle = os.path.join(tmp_dir, 'bundle.sqlite3')
+        assert source.export_bundle(bundle) == 20
+        source.backend.close()
+
+        # Import into a JSON cache that already has a diverging copy of one entry
+        target = GeminiCache(cache_dir=os.path.join(tmp_dir, 'target'), backend='json')
+        target.set(f'tensor:xxh3:{0:032x}', 'models/gemini-2.5-flash', 'local copy', 'Text2Image',
+                   {'describe_bokeh': True})
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            stats = target.import_bundle(bundle)
+        assert stats == {'imported': 19, 'skipped': 1, 'invalid': 0}, stats
+        # The entries were fingerprinted with xxh3, which only hits where that hasher is used
+        assert read_bundle_info(bundle)['tensor_hash'] == media_fingerprint.HASH_NAME
+        assert ('fingerprinted with xxh3' in output.getvalue()) == (media_fingerprint.HASH_NAME != 'xxh3')
+        result = target.get(f'tensor:xxh3:{5:032x}', 'models/gemini-2.5-flash', 'Text2Image', {'describe_bokeh': True})
+        assert result['description'] == 'description 5' and result['height'] == 832
+        assert target.get(f'tensor:xxh3:{0:032x}', 'models/gemini-2.5-flash', 'Text2Image',
+                          {'describe_bokeh': True})['description'] == 'local copy'
+
+        # Warm-up preloads the most recent entries into memory
+        warm = GeminiCache(cache_dir=os.path.join(tmp_dir, 'warm'), memory_max_entries=5)
+        stats = warm.warm_up(bundle)
+        assert stats['imported'] == 20 and stats['preloaded'] == 5
+        assert len(warm.memory) == 5
+        assert warm.tier_stats['disk'] == {'hits': 0, 'misses': 0}
+
+        # Tampered rows are rejected
+        conn = sqlite3.connect(bundle)
+        conn.execute("UPDATE entries SET digest = 'bad' WHERE cache_key = (SELECT cache_key FROM entries LIMIT 1)")
+        conn.commit()
+        conn.close()
+        assert warm.import_bundle(bundle, overwrite=True)['invalid'] == 1
+        warm.backend.close()
+    print("✅ Bundle export/import and warm-up verified")
+
+
+def test_cache_metrics():
+    """Lookups and writes are broken down by model and media type"""
+    print("\n=== Test 12: Cache Metrics ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = GeminiCache(cache_dir=tmp_dir)
+        video_id = 'file:/media/clip.mp4:mtime:1.0:size:10'
+        image_id = 'tensor:xxh3:' + '0' * 32
+
+        assert cache.get_or_claim(video_id, 'models/gemini-2.5-pro') is None
+        time.sleep(0.02)
+        cache.set(video_id, 'models/gemini-2.5-pro', 'a video')
+        assert cache.get(video_id, 'models/gemini-2.5-pro')['description'] == 'a video'
+        cache.memory.clear()
+        assert cache.get(video_id, 'models/gemini-2.5-pro') is not None
+        assert cache.get_many([(image_id, 'models/gemini-2.5-flash')]) == [None]
+
+        snapshot = cache.get_cache_info()['metrics']
+        rows = {(row['gemini_model'], row['media_type']): row for row in snapshot['by_model']}
+        video = rows[('models/gemini-2.5-pro', 'video')]
+        assert (video['lookups'], video['hits'], video['misses']) == (3, 2, 1)
+        assert (video['memory_hits'], video['disk_hits']) == (1, 1)
+        assert video['writes'] == 1 and video['bytes_read'] == 2 * video['bytes_written']
+        assert video['compute_latency']['count'] == 1
+        assert video['compute_latency']['mean_ms'] >= 20
+        assert video['time_saved_seconds'] >= 0.04
+        assert video['lookup_latency']['count'] == 3
+        assert rows[('models/gemini-2.5-flash', 'image')]['misses'] == 1
+        assert snapshot['totals']['lookups'] == 4 and snapshot['totals']['hit_rate'] == 0.5
+        json.dumps(snapshot, allow_nan=False)
+
+        cache.metrics.reset()
+        assert cache.metrics.snapshot()['by_model'] == []
+        cache.backend.close()
+    print("✅ Cache metrics verified")
+
+
+def test_sweep_keeps_entry_age():
+    """Entries migrated from JSON or imported from a bundle are swept by their own age"""
+    print("\n=== Test 13: Sweep Keeps Entry Age ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old = time.time() - 7200
+        legacy_dir = os.path.join(tmp_dir, 'legacy')
+        legacy = GeminiCache(cache_dir=legacy_dir, backend='json')
+        legacy.set('test:media:stale', 'models/gemini-2.5-flash', 'stale', extra_data={'timestamp': old})
+        legacy.set('test:media:fresh', 'models/gemini-2.5-flash', 'fresh')
+        # Files written by earlier releases have their write time as mtime
+        stale_key = legacy._get_cache_key('test:media:stale', 'models/gemini-2.5-flash')
+        os.utime(os.path.join(legacy_dir, f'{stale_key}.json'), (old, old))
+
+        cache = GeminiCache(cache_dir=legacy_dir, eviction_policy=EvictionPolicy(max_age=3600))
+        assert cache.sweep()['expired'] == 1
+        assert cache.get_cache_info()['entries'] == 1
+        assert cache.backend.peek_many([stale_key]) == {}
+
+        # Bundle imports keep the exported entries' timestamps
+        source = GeminiCache(cache_dir=os.path.join(tmp_dir, 'source'))
+        source.set('test:media:stale', 'models/gemini-2.5-flash', 'stale', extra_data={'timestamp': old})
+        bundle = os.path.join(tmp_dir, 'bundle.sqlite3')
+        assert source.export_bundle(bundle) == 1
+        source.backend.close()
+        target = GeminiCache(cache_dir=os.path.join(tmp_dir, 'target'))
+        assert target.import_bundle(bundle)['imported'] == 1
+        target.eviction_policy = EvictionPolicy(max_age=3600)
+        assert target.sweep()['expired'] == 1
+        cache.backend.close()
+        target.backend.close()
+    print("✅ Migrated and imported entries expire by their own age")
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_sqlite_backend_round_trip,
+        test_json_backend_layout,
+        test_legacy_json_migration,
+        test_lru_eviction,
+        test_max_age_expiry,
+        test_memory_hot_tier,
+        test_compact_encoding,
+        test_batch_api,
+        test_single_flight,
+        test_file_identifier_memo,
+        test_bundle_round_trip,
+        test_cache_metrics,
+        test_sweep_keeps_entry_age,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__} failed: {e!r}")
+
+    print(f"\nTests passed: {len(tests) - failures}/{len(tests)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent CivitAI metadata cache
+
+Tests:
+1. Lookups round-trip by hash, positive and negative entries expire on their own TTLs
+2. Entries are shared by cache instances on one directory (restarts, other workers)
+3. CivitAIService serves repeat lookups from the cache, caches 404s but not errors
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from nodes import lora_hashing
+from nodes.civitai_cache import CivitAIMetadataCache
+from nodes.civitai_service import CivitAILookupError, CivitAIService
+from nodes.lora_hash_cache import LoRAHashCache
+
+
+class _FakeAPIService(CivitAIService):
+    """CivitAIService whose by-hash endpoint is a dict: hash -> model, 'error' or absent (404)."""
+
+    def __init__(self, responses, **kwargs):
+        super().__init__(api_key="test", **kwargs)
+        self.responses = responses
+        self.calls = []
+
+    async def _get_model_info_by_hash_async(self, file_hash, hash_type="unknown", attempt=0):
+        self.calls.append(hash_type)
+        response = self.responses.get(file_hash)
+        if response == "error":
+            raise CivitAILookupError("simulated network error")
+        return dict(response) if response else None
+
+
+def test_ttl_round_trip():
+    """Found and not-found lookups are cached with separate TTLs"""
+    print("\n=== Test 1: TTL Round Trip ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = CivitAIMetadataCache(cache_dir=tmp_dir, ttl=60, negative_ttl=60)
+        assert cache.get("sha256", "abc") is None
+
+        cache.set("sha256", "abc", {"civitai_name": "Test LoRA"})
+        cache.set("autov2", "DEF", None)
+        # Keys are case-insensitive in the hash value
+        assert cache.get("sha256", "ABC")["data"] == {"civitai_name": "Test LoRA"}
+        negative = cache.get("autov2", "def")
+        assert negative["found"] is False and negative["data"] is None
+
+        cache.negative_ttl = 0.05
+        time.sleep(0.1)
+        assert cache.get("autov2", "DEF") is None, "negative entry outlived its TTL"
+        assert cache.get("sha256", "ABC") is not None, "positive entry expired with the negative TTL"
+
+        cache.ttl = 0.05
+        assert cache.get("sha256", "ABC") is None
+        info = cache.get_cache_info()
+        assert info["entries"] == 0, info
+        assert info["hits"] == 2 and info["negative_hits"] == 1 and info["expired"] == 2, info
+
+        cache.set("sha256", "OLD", None)
+        time.sleep(0.1)
+        assert cache.purge_expired() == 1
+        cache.close()
+    print("✅ Positive and negative entries expire independently")
+
+
+def test_shared_across_instances():
+    """A second cache on the same directory sees the first one's entries"""
+    print("\n=== Test 2: Shared Across Instances ===")
+    for backend in ("sqlite", "json"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first = CivitAIMetadataCache(cache_dir=tmp_dir, backend=backend)
+            first.set("sha256", "ABC", {"civitai_name": "Shared"})
+            first.close()
+
+            second = CivitAIMetadataCache(cache_dir=tmp_dir, backend=backend)
+            assert second.get("sha256", "ABC")["data"]["civitai_name"] == "Shared", backend
+            second.clear()
+            assert second.get("sha256", "ABC") is None
+            second.close()
+    print("✅ Entries persist across instances for both backends")
+
+
+def test_service_uses_cache():
+    """Repeat lookups across service instances do not call the API again"""
+    print("\n=== Test 3: Service Uses Cache ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hash_cache = LoRAHashCache(cache_path=Path(tmp_dir) / "hashes.json")
+        metadata_cache = CivitAIMetadataCache(cache_dir=os.path.join(tmp_dir, "civitai"))
+        found_path, unknown_path = os.path.join(tmp_dir, "found.safetensors"), os.path.join(tmp_dir, "unknown.bin")
+        for path in (found_path, unknown_path):
+            with open(path, "wb") as f:
+                f.write(os.urandom(16384))
+        found_hashes = hash_cache.get_hashes(found_path)
+        unknown_sha256 = hash_cache.get_hashes(unknown_path, hash_types=("sha256",))["sha256"]
+
+        def service(responses):
+            instance = _FakeAPIService(responses, metadata_cache=metadata_cache)
+            instance._hash_cache = hash_cache
+            return instance
+
+        # Found by AutoV2 after SHA256 and AutoV1 miss
+        first = service({found_hashes["autov2"]: {"civitai_name": "Found"}})
+        result = first.get_model_info_by_hash(found_path)
+        assert result["civitai_name"] == "Found" and result["matched_hash_type"] == "autov2"
+        assert result["cache_hit"] is False and first.calls == ["sha256", "autov1", "autov2"], first.calls
+
+        # A fresh instance (as after refresh_civitai_service) answers from the cache via SHA256
+        second = service({})
+        result = second.get_model_info_by_hash(found_path)
+        assert result["civitai_name"] == "Found" and result["cache_hit"] is True
+        assert second.calls == [], second.calls
+
+        # Errors are retried on the next call; 404s are not
+        third = service({unknown_sha256: "error"})
+        assert third.get_model_info_by_hash(unknown_path) is None
+        expected = [hash_type for hash_type in CivitAIService.HASH_PRIORITY
+                    if hash_type != "blake3" or lora_hashing.BLAKE3_AVAILABLE]
+        assert third.calls == expected, third.calls
+        third.calls.clear()
+        assert third.get_model_info_by_hash(unknown_path) is None
+        assert third.calls == ["sha256"], third.calls
+
+        hash_cache.close()
+        metadata_cache.close()
+    print("✅ Service lookups are served from the shared cache")
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_ttl_round_trip,
+        test_shared_across_instances,
+        test_service_uses_cache,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__} failed: {e!r}")
+
+    print(f"\nTests passed: {len(tests) - failures}/{len(tests)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Tests for CivitAIService against a local HTTP server standing in for the CivitAI API
+
+Tests:
+1. Lookups from several service instances, with and without a running event loop, reuse pooled connections
+2. get_model_info_many fans out over files with bounded concurrency, keeps stack order and queries one hash per file at a time
+3. The token bucket spaces requests, pauses for Retry-After and refunds cancelled waits
+4. 429s honour Retry-After, 5xx responses are retried with backoff, and exhausted retries are not cached
+5. A snapshot exported on a connected host answers lookups offline with the same result shape
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from nodes import civitai_mirror, lora_hashing
+from nodes.civitai_cache import CivitAIMetadataCache
+from nodes.civitai_mirror import CivitAIMirror, export_snapshot, read_snapshot_info
+from nodes.civitai_service import CivitAIService, _retry_after_seconds
+from nodes.lora_hash_cache import LoRAHashCache
+from nodes.rate_limiter import TokenBucket
+
+
+class _FakeCivitAI:
+    """HTTP/1.1 keep-alive server answering ``/api/v1/model-versions/by-hash/<hash>``.
+
+    ``models`` maps upper-case hashes to version payloads; other hashes get a 404.
+    ``delays`` maps hashes to seconds to wait before answering (``default_delay`` otherwise).
+    ``scripts`` maps hashes to a list of ``(status, headers)`` responses served first, in order.
+    ``files`` maps hashes to the file they belong to; ``peak_files`` is the most files with
+    a request in flight at once and ``peak_per_file`` the most requests in flight for one file.
+    The first ``hold`` requests are held until all of them have arrived (or 5 seconds pass),
+    so concurrent clients reach that many requests in flight deterministically.
+    """
+
+    def __init__(self, models=None):
+        self.models = models or {}
+        self.delays = {}
+        self.scripts = {}
+        self.files = {}
+        self.default_delay = 0.0
+        self.hold = 0
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.peak_active = 0
+        self.peak_files = 0
+        self.peak_per_file = 0
+        self._active_files = {}
+        self._lock = threading.Lock()
+        self._held = threading.Event()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                fake.connections += 1
+
+            def do_GET(self):
+                file_hash = self.path.rsplit("/", 1)[-1].upper()
+                file_key = fake.files.get(file_hash, file_hash)
+                with fake._lock:
+                    fake.requests.append(file_hash)
+                    fake.active += 1
+                    fake.peak_active = max(fake.peak_active, fake.active)
+                    fake._active_files[file_key] = fake._active_files.get(file_key, 0) + 1
+                    fake.peak_files = max(fake.peak_files, len(fake._active_files))
+                    fake.peak_per_file = max(fake.peak_per_file, fake._active_files[file_key])
+                    held = len(fake.requests) <= fake.hold
+                    if len(fake.requests) == fake.hold:
+                        fake._held.set()
+                if held:
+                    fake._held.wait(5)
+                time.sleep(fake.delays.get(file_hash, fake.default_delay))
+                with fake._lock:
+                    fake.active -= 1
+                    fake._active_files[file_key] -= 1
+                    if not fake._active_files[file_key]:
+                        del fake._active_files[file_key]
+                    script = fake.scripts.get(file_hash)
+                    scripted = script.pop(0) if script else None
+                if scripted:
+                    status, headers = scripted
+                    self.send_response(status)
+                    for name, value in {**headers, "Content-Length": "0"}.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    return
+                model = fake.models.get(file_hash)
+                body = json.dumps(model or {"error": "Model not found"}).encode()
+                try:
+                    self.send_response(200 if model else 404)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled this lookup
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/api/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Environment:
+    """Temp LoRA files plus isolated hash/metadata caches for services pointed at a fake API."""
+
+    def __init__(self, tmp_dir, api):
+        self.tmp_dir = tmp_dir
+        self.api = api
+        self.hash_cache = LoRAHashCache(cache_path=Path(tmp_dir) / "hashes.json")
+        self.metadata_cache = CivitAIMetadataCache(cache_dir=os.path.join(tmp_dir, "civitai"))
+
+    def lora(self, name, size=16384):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        return path
+
+    def service(self, rate_limiter=None, **attributes):
+        # Unthrottled unless a test is about the limiter
+        service = CivitAIService(api_key="test", metadata_cache=self.metadata_cache,
+                                 rate_limiter=rate_limiter or TokenBucket(rate=1000, burst=1000))
+        for name, value in attributes.items():
+            setattr(service, name, value)
+        service.BASE_URL = self.api.base_url
+        service._hash_cache = self.hash_cache
+        return service
+
+    def close(self):
+        self.hash_cache.close()
+        self.metadata_cache.close()
+
+
+def test_pooled_connection():
+    """Sequential lookups reuse keep-alive connections across instances and callers"""
+    print("\n=== Test 1: Pooled Connection ===")
+    api = _FakeCivitAI()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _Environment(tmp_dir, api)
+        paths = [env.lora(f"lora_{index}.safetensors") for index in range(3)]
+        sha256 = env.hash_cache.get_hashes(paths[0], hash_types=("sha256",))["sha256"]
+        api.models[sha256] = {"id": 1, "modelId": 2, "name": "v1", "model": {"name": "Pooled"}}
+
+        assert env.service().get_model_info_by_hash(paths[0])["civitai_name"] == "Pooled"
+        for path in paths[1:]:
+            assert env.service().get_model_info_by_hash(path) is None
+
+        async def inside_event_loop():
+            # ComfyUI calls nodes from threads, but async callers must not deadlock either
+            env.metadata_cache.clear()
+            return env.service().get_model_info_by_hash(paths[0])
+
+        assert asyncio.run(inside_event_loop())["civitai_name"] == "Pooled"
+        assert len(api.requests) > len(paths), api.requests
+        # Every request above waited for the previous one, so the pool never needs a second connection
+        assert api.connections == 1, f"{api.connections} connections for {len(api.requests)} requests"
+        env.close()
+    api.close()
+    print(f"✅ {len(api.requests)} lookups over {api.connections} connections")
+
+
+def test_model_info_many():
+    """A stack is looked up concurrently, in order, trying one hash per file at a time"""
+    print("\n=== Test 2: Concurrent Stack Lookup ===")
+    api = _FakeCivitAI()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _Environment(tmp_dir, api)
+        paths = [env.lora(f"stack_{index}.safetensors") for index in range(5)]
+        hashes = env.hash_cache.get_hashes_many(paths, hash_types=CivitAIService.HASH_TIERS[0])
+        for path in paths:
+            for hash_value in env.hash_cache.get_hashes(path).values():
+                api.files[hash_value.upper()] = path
+        # 0: SHA256 match; 1: missing file; 2: AutoV2 match; 3, 4: not on CivitAI
+        api.models[hashes[0]["sha256"]] = {"id": 10, "modelId": 1, "model": {"name": "First"}}
+        api.models[hashes[2]["autov2"]] = {"id": 30, "modelId": 3, "model": {"name": "Third"}}
+        stack = [paths[0], os.path.join(tmp_dir, "missing.safetensors"), paths[2], paths[3], paths[4]]
+        expected = ["First", None, "Third", None, None]
+
+        # Two files are in flight at once, never more, each with one request at a time
+        api.hold = 2
+        start = time.perf_counter()
+        results = env.service(MAX_CONCURRENT_REQUESTS=2).get_model_info_many(stack)
+        elapsed = time.perf_counter() - start
+        assert elapsed < 5, "the held requests never overlapped"
+        assert api.peak_files == 2 and api.peak_active == 2, (api.peak_files, api.peak_active)
+        assert api.peak_per_file == 1, api.peak_per_file
+
+        assert [result and result["civitai_name"] for result in results] == expected, results
+        assert results[2]["matched_hash_type"] == "autov2"
+        # A SHA256 match costs one request; lower-priority hashes are only tried after a miss
+        requested = {path: [api.files[file_hash] for file_hash in api.requests].count(path) for path in paths}
+        all_types = [hash_type for hash_type in CivitAIService.HASH_PRIORITY
+                     if hash_type != "blake3" or lora_hashing.BLAKE3_AVAILABLE]
+        assert requested == {paths[0]: 1, paths[1]: 0, paths[2]: 3, paths[3]: len(all_types),
+                              paths[4]: len(all_types)}, requested
+        assert env.metadata_cache.get("sha256", hashes[3]["sha256"])["found"] is False
+
+        # Everything is now cached, and the AutoV2 match is aliased under SHA256
+        requests = len(api.requests)
+        service = env.service()
+        assert [result and result["cache_hit"] for result in service.get_model_info_many(stack)] == \
+            [True, None, True, None, None]
+        assert len(api.requests) == requests, api.requests[requests:]
+        assert env.metadata_cache.get("sha256", hashes[2]["sha256"])["found"] is True
+        env.close()
+    api.close()
+    print(f"✅ 5-entry stack looked up in {elapsed:.2f}s with {requests} requests")
+
+
+def test_token_bucket():
+    """Requests beyond the burst are spaced at the rate, and pauses hold everyone back"""
+    print("\n=== Test 3: Token Bucket ===")
+    bucket = TokenBucket(rate=20, burst=2)
+
+    async def acquire_many(count):
+        start = time.perf_counter()
+        await asyncio.gather(*(bucket.acquire() for _ in range(count)))
+        return time.perf_counter() - start
+
+    # 2 from the burst, then 4 more at 20/s
+    elapsed = asyncio.run(acquire_many(6))
+    assert 0.15 <= elapsed < 0.5, elapsed
+    state = bucket.get_state()
+    assert state["acquired"] == 6 and state["delayed"] == 4 and state["waiting"] == 0, state
+
+    async def paused_acquire():
+        waiter = asyncio.ensure_future(acquire_many(1))
+        await asyncio.sleep(0.01)
+        # A pause that starts after the waiter reserved its token still holds it back
+        bucket.pause(0.4)
+        return await waiter
+
+    assert asyncio.run(paused_acquire()) >= 0.4
+    assert bucket.get_state()["pauses"] == 1
+
+    async def cancelled_acquire():
+        bucket.pause(1.0)
+        waiter = asyncio.ensure_future(bucket.acquire())
+        await asyncio.sleep(0.01)
+        assert bucket.get_state()["waiting"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    acquired = bucket.get_state()["acquired"]
+    asyncio.run(cancelled_acquire())
+    assert bucket.get_state()["acquired"] == acquired and bucket.get_state()["waiting"] == 0
+
+    assert _retry_after_seconds("2.5") == 2.5
+    assert _retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert _retry_after_seconds("soon") is None
+    print("✅ Bucket spaces, pauses and refunds tokens")
+
+
+def test_retries():
+    """429 waits the full Retry-After, 5xx retries with backoff, exhausted retries raise"""
+    print("\n=== Test 4: Retries and Backoff ===")
+    api = _FakeCivitAI()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _Environment(tmp_dir, api)
+        throttled, flaky, broken = (env.lora(f"{name}.safetensors") for name in ("throttled", "flaky", "broken"))
+        hashes = {path: env.hash_cache.get_hashes(path, hash_types=("sha256",))["sha256"]
+                  for path in (throttled, flaky, broken)}
+        for path in (throttled, flaky):
+            api.models[hashes[path]] = {"id": 1, "modelId": 1, "model": {"name": os.path.basename(path)}}
+        api.scripts[hashes[throttled]] = [(429, {"Retry-After": "1"})]
+        api.scripts[hashes[flaky]] = [(503, {}), (502, {})]
+        api.scripts[hashes[broken]] = [(500, {})] * 10
+
+        limiter = TokenBucket(rate=1000, burst=1000)
+        service = env.service(rate_limiter=limiter, BACKOFF_BASE=0.01, MAX_RETRIES=3)
+
+        start = time.perf_counter()
+        assert service.get_model_info_by_hash(throttled)["civitai_name"] == "throttled.safetensors"
+        assert time.perf_counter() - start >= 1.0, "Retry-After was not honoured"
+        assert limiter.get_state()["pauses"] == 1
+
+        assert service.get_model_info_by_hash(flaky)["civitai_name"] == "flaky.safetensors"
+        assert api.requests.count(hashes[flaky]) == 3, api.requests
+
+        assert service.get_model_info_by_hash(broken) is None
+        assert api.requests.count(hashes[broken]) == 4, api.requests
+        assert env.metadata_cache.get("sha256", hashes[broken]) is None, "server error was cached as a miss"
+        assert service.get_cache_info()["rate_limiter"]["acquired"] == len(api.requests)
+        env.close()
+    api.close()
+    print("✅ Rate limits and server errors are retried")
+
+
+def test_offline_mirror():
+    """Lookups resolved from a snapshot match the online results without any request"""
+    print("\n=== Test 5: Offline Mirror ===")
+    api = _FakeCivitAI()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _Environment(tmp_dir, api)
+        lora_dir = os.path.join(tmp_dir, "loras")
+        os.makedirs(lora_dir)
+        paths = [env.lora(os.path.join("loras", f"{name}.safetensors")) for name in ("by_sha256", "by_autov2", "unknown")]
+        hashes = env.hash_cache.get_hashes_many(paths, hash_types=CivitAIService.HASH_TIERS[0])
+        # CivitAI lists the hashes of every file of a version; the BLAKE3 one is only known from there
+        api.models[hashes[0]["sha256"]] = {
+            "id": 101, "modelId": 1, "name": "v1", "model": {"name": "Sha Model", "creator": {"username": "a"}},
+            "files": [{"hashes": {"SHA256": hashes[0]["sha256"], "BLAKE3": "B3" * 32}}],
+        }
+        api.models[hashes[1]["autov2"]] = {"id": 202, "modelId": 2, "name": "v2", "model": {"name": "AutoV2 Model"}}
+
+        snapshot_path = os.path.join(tmp_dir, "snapshot.sqlite3")
+        assert export_snapshot(snapshot_path, env.metadata_cache, folders=[lora_dir], service=env.service()) == 2
+        assert read_snapshot_info(snapshot_path)["versions"] == "2"
+        online = env.service().get_model_info_many(paths)
+        requests = len(api.requests)
+        api.close()
+
+        # No server any more: every answer must come from the snapshot
+        mirror = CivitAIMirror(snapshot_path)
+        offline = env.service(mirror=mirror).get_model_info_many(paths)
+        assert offline[2] is None and online[2] is None
+        for online_result, offline_result in zip(online[:2], offline[:2]):
+            assert set(online_result) <= set(offline_result), set(online_result) ^ set(offline_result)
+            for key in ("civitai_name", "version_name", "civitai_url", "model_id", "version_id", "fetched_at",
+                        "all_hashes", "api_response"):
+                assert online_result[key] == offline_result[key], key
+            # The snapshot indexes every hash of the file, so SHA256 matches even where AutoV2 did online
+            assert offline_result["matched_hash_type"] == "sha256"
+            assert offline_result["offline"] is True
+        assert mirror.lookup("blake3", "b3" * 32)[0]["id"] == 101
+        assert len(api.requests) == requests
+
+        # CIVITAI_OFFLINE_SNAPSHOT switches every new service to the mirror
+        os.environ["CIVITAI_OFFLINE_SNAPSHOT"] = snapshot_path
+        try:
+            assert CivitAIService(metadata_cache=env.metadata_cache).mirror.path == snapshot_path
+            os.environ["CIVITAI_OFFLINE_SNAPSHOT"] = os.path.join(tmp_dir, "missing.sqlite3")
+            assert CivitAIService(metadata_cache=env.metadata_cache).mirror is None
+        finally:
+            del os.environ["CIVITAI_OFFLINE_SNAPSHOT"]
+            civitai_mirror._mirror.close()
+            civitai_mirror._mirror = None
+        mirror.close()
+        env.close()
+    print("✅ Snapshot lookups match online results")
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_pooled_connection,
+        test_model_info_many,
+        test_token_bucket,
+        test_retries,
+        test_offline_mirror,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__} failed: {e!r}")
+
+    print(f"\nTests passed: {len(tests) - failures}/{len(tests)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming LoRA hash engine and LoRAHashCache
+
+Tests:
+1. Buffered and mmap hashes match whole-file reference hashes for small, boundary and multi-chunk files
+2. LoRAHashCache returns cached hashes and recomputes them when the file changes
+3. Cold files hash in parallel, once per path, without blocking warm lookups
+4. The journal replays puts/deletes/clears, tolerates a torn last line and compacts into the snapshot
+5. The background indexer hashes new/changed files, prunes deleted ones and waits while busy
+6. Entries are validated by inode/mtime_ns/size, with a quick-fingerprint tier and bulk validate_all()
+7. Copies and symlinks of hashed files reuse their hashes and show up in the duplicate report
+8. Subsets of hash types are computed on demand and partial entries are served from cache
+9. Safetensors headers are summarized (rank, base model, trigger words) and cached with the hashes
+"""
+
+import json
+
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from nodes import lora_hash_cache, lora_hashing
+from nodes.lora_hash_cache import LoRAHashCache
+from nodes.lora_indexer import LoRAIndexer, start_background_indexer
+
+
+def _reference_hashes(data):
+    """The original whole-file implementation the streaming engine must reproduce."""
+    if len(data) <= 8192:
+        autov2_input = data
+    else:
+        quarter, three_quarters = len(data) // 4, (len(data) * 3) // 4
+        autov2_input = b''.join([data[:2048], data[quarter:quarter + 2048],
+                                 data[three_quarters:three_quarters + 2048], data[-2048:]])
+    hashes = {
+        'sha256': hashlib.sha256(data).hexdigest().upper(),
+        'crc32': f"{zlib.crc32(data) & 0xffffffff:08X}",
+        'blake3': None,
+        'autov1': hashlib.sha256(data[:8192]).hexdigest().upper()[:10],
+        'autov2': hashlib.sha256(autov2_input).hexdigest().upper()[:10],
+    }
+    if lora_hashing.BLAKE3_AVAILABLE:
+        hashes['blake3'] = lora_hashing.blake3.blake3(data).hexdigest().upper()
+    return hashes
+
+
+def _subset(hashes, hash_types):
+    return {hash_type: hashes[hash_type] for hash_type in hash_types}
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_streaming_matches_reference():
+    """Chunked hashing gives the same digests as hashing the whole file at once"""
+    print("\n=== Test 1: Streaming Hashes Match Reference ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'model.safetensors')
+        for size in (0, 100, 8192, 8193, 65536 + 17, 3 * 1024 * 1024 + 5):
+            data = os.urandom(size)
+            _write(path, data)
+            for chunk_size in (4096, lora_hashing.CHUNK_SIZE):
+                for use_mmap in (False, True):
+                    assert lora_hashing.hash_file(path, chunk_size, use_mmap) == _reference_hashes(data), \
+                        (size, chunk_size, use_mmap)
+    print("✅ Buffered and mmap hashes match the whole-file reference")
+
+
+def test_cache_round_trip():
+    """LoRAHashCache serves cached hashes and notices modified files"""
+    print("\n=== Test 2: LoRAHashCache Round Trip ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'lora.safetensors')
+        data = os.urandom(20000)
+        _write(path, data)
+
+        cache = LoRAHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        assert cache.get_hashes(path) == _reference_hashes(data)
+        assert cache.get_hash(path) == _reference_hashes(data)['sha256']
+
+        # A fresh instance loads the persisted entry
+        cache.close()
+        reloaded = LoRAHashCache(cache_path=cache._cache_path)
+        assert reloaded.get_hashes(path) == _reference_hashes(data)
+
+        data = os.urandom(30000)
+        _write(path, data)
+        assert reloaded.get_hashes(path) == _reference_hashes(data)
+
+        os.remove(path)
+        assert reloaded.get_hashes(path) is None
+        assert reloaded.get_cache_info()['entries'] == 0
+        reloaded.close()
+    print("✅ Cache round trip verified")
+
+
+def test_journal_persistence():
+    """Writes go to the journal, are replayed on load and folded into the snapshot on compaction"""
+    print("\n=== Test 4: Journal Persistence ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, f'lora_{i}.safetensors') for i in range(3)]
+        contents = [os.urandom(9000 + i) for i in range(3)]
+        for path, data in zip(paths, contents):
+            _write(path, data)
+        cache_path = Path(tmp_dir) / 'hashes.json'
+
+        cache = LoRAHashCache(cache_path=cache_path)
+        for path in paths:
+            cache.get_hashes(path)
+        cache.invalidate(paths[2])
+        # Nothing is written until the debounced flush
+        assert not cache_path.exists() and cache.get_cache_info()['pending_records'] == 4
+        cache.flush()
+        journal = Path(cache.get_cache_info()['journal_path'])
+        assert len(journal.read_text().splitlines()) == 4 and not cache_path.exists()
+        cache.close()
+
+        # An append interrupted mid-line is skipped on replay
+        with journal.open('a') as f:
+            f.write('{"op":"put","path":')
+        reloaded = LoRAHashCache(cache_path=cache_path)
+        info = reloaded.get_cache_info()
+        assert (info['entries'], info['journal_records']) == (2, 4), info
+        assert reloaded.get_hashes(paths[0]) == _reference_hashes(contents[0])
+        assert reloaded.get_cache_info()['pending_records'] == 0
+
+        # Compaction rewrites the snapshot and empties the journal
+        reloaded.compact()
+        assert journal.read_text() == ''
+        assert sorted(json.loads(cache_path.read_text())) == sorted(os.path.abspath(p) for p in paths[:2])
+        reloaded.clear()
+        reloaded.close()
+
+        assert LoRAHashCache(cache_path=cache_path).get_cache_info()['entries'] == 0
+    print("✅ Journal persistence verified")
+
+
+class _SlowHashCache(LoRAHashCache):
+    """Counts hash computations and holds each one until released."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.computed = []
+        self.computed_types = []
+        self.release = threading.Event()
+
+    def _calculate_hashes(self, file_path, hash_types=lora_hashing.HASH_TYPES):
+        self.computed.append(file_path)
+        self.computed_types.append(tuple(hash_types))
+        self.release.wait(10)
+        return super()._calculate_hashes(file_path, hash_types)
+
+
+def test_parallel_hashing():
+    """get_hashes_many hashes cold files concurrently and dedups in-flight paths"""
+    print("\n=== Test 3: Parallel Hashing ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, f'lora_{i}.safetensors') for i in range(4)]
+        contents = [os.urandom(10000 + i) for i in range(4)]
+        for path, data in zip(paths, contents):
+            _write(path, data)
+
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json', max_workers=4)
+        cache.release.set()
+        assert cache.get_hashes(paths[0]) == _reference_hashes(contents[0])
+        cache.release.clear()
+
+        batch_results, single_results = [], []
+        batch = threading.Thread(target=lambda: batch_results.extend(cache.get_hashes_many(paths[1:] + [paths[1]])))
+        single = threading.Thread(target=lambda: single_results.append(cache.get_hashes(paths[1])))
+        batch.start()
+        single.start()
+
+        # The three cold files are all being hashed at once
+        deadline = time.time() + 5
+        while len(cache.computed) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        assert sorted(cache.computed[1:]) == sorted(paths[1:])
+        assert cache.get_cache_info()['in_flight'] == 3
+
+        # Warm entries are served while the cold ones are still hashing
+        started = time.time()
+        assert cache.get_hashes(paths[0]) == _reference_hashes(contents[0])
+        assert time.time() - started < 1
+
+        cache.release.set()
+        batch.join(10)
+        single.join(10)
+        assert len(cache.computed) == 4, cache.computed
+        assert batch_results == [_reference_hashes(data) for data in contents[1:]] + [_reference_hashes(contents[1])]
+        assert single_results == [_reference_hashes(contents[1])]
+        info = cache.get_cache_info()
+        assert (info['entries'], info['in_flight']) == (4, 0)
+        cache.close()
+    print("✅ Parallel hashing verified")
+
+
+def test_background_indexer():
+    """The indexer keeps the cache in sync with the watched folders"""
+    print("\n=== Test 5: Background Indexer ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        loras = os.path.join(tmp_dir, 'loras')
+        os.makedirs(os.path.join(loras, 'style'))
+        paths = [os.path.join(loras, 'a.safetensors'), os.path.join(loras, 'style', 'b.safetensors')]
+        contents = [os.urandom(12000), os.urandom(13000)]
+        for path, data in zip(paths, contents):
+            _write(path, data)
+        _write(os.path.join(loras, 'notes.txt'), b'not a model')
+
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        cache.release.set()
+        busy = threading.Event()
+        indexer = LoRAIndexer(cache, folders=[loras], is_busy=busy.is_set)
+        indexer.IDLE_BACKOFF = 0.01
+
+        assert indexer.run_once() == {'files': 2, 'indexed': 2, 'pruned': 0}
+        assert sorted(cache.computed) == sorted(paths)
+        # Unchanged files are not looked at again
+        assert indexer.run_once()['indexed'] == 0 and len(cache.computed) == 2
+
+        # A changed file is rehashed, a deleted one pruned
+        contents[0] = os.urandom(15000)
+        _write(paths[0], contents[0])
+        os.remove(paths[1])
+        assert indexer.run_once() == {'files': 1, 'indexed': 1, 'pruned': 1}
+        assert cache.cached_paths() == [paths[0]]
+        primary = lora_hashing.PRIMARY_HASH_TYPES
+        assert cache.get_hashes(paths[0], hash_types=primary) == _subset(_reference_hashes(contents[0]), primary)
+        assert len(cache.computed) == 3
+
+        # Nothing is hashed while the foreground is busy
+        busy.set()
+        _write(paths[1], contents[1])
+        indexer.start()
+        time.sleep(0.2)
+        assert len(cache.computed) == 3
+        busy.clear()
+        deadline = time.time() + 5
+        while len(cache.computed) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        indexer.stop(5)
+        assert cache.get_hashes(paths[1], hash_types=primary) == _subset(_reference_hashes(contents[1]), primary)
+        assert len(cache.computed) == 4
+        assert indexer.get_status()['running'] is False
+        cache.close()
+
+    # The startup indexer is opt-in
+    if 'LORA_HASH_INDEXER' not in os.environ:
+        assert start_background_indexer() is None
+    print("✅ Background indexer verified")
+
+
+def test_entry_validation():
+    """Stat identity fast path, quick-fingerprint revalidation and validate_all()"""
+    print("\n=== Test 6: Entry Validation ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'lora.safetensors')
+        data = os.urandom(300000)
+        _write(path, data)
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        cache.release.set()
+
+        cache.get_hashes(path)
+        entry = cache._data[path]
+        stat_result = os.stat(path)
+        assert (entry['mtime_ns'], entry['ino'], entry['size']) == \
+            (stat_result.st_mtime_ns, stat_result.st_ino, stat_result.st_size)
+        assert entry['quick'] == lora_hashing.quick_fingerprint(path)
+        assert cache._validate(path, entry) == ('valid', None)
+
+        def replace_preserving_mtime(new_data):
+            staged = os.path.join(tmp_dir, 'staged')
+            _write(staged, new_data)
+            os.utime(staged, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+            os.replace(staged, path)
+
+        # Same content on a new inode with the old mtime: revalidated without rehashing
+        replace_preserving_mtime(data)
+        assert os.stat(path).st_ino != entry['ino']
+        assert cache.get_hashes(path) == _reference_hashes(data) and len(cache.computed) == 1
+        assert cache._data[path]['ino'] == os.stat(path).st_ino
+
+        # Different content, same size and mtime: the quick fingerprint catches it
+        changed = data[:1000] + os.urandom(1000) + data[2000:]
+        replace_preserving_mtime(changed)
+        assert cache.get_hashes(path) == _reference_hashes(data[:1000] + changed[1000:2000] + data[2000:])
+        assert len(cache.computed) == 2
+
+        # Legacy entries (float mtime only) are upgraded without rehashing
+        legacy = {key: value for key, value in cache._data[path].items() if key not in ('mtime_ns', 'ino', 'dev', 'quick')}
+        cache._data[path] = legacy
+        assert cache.get_hashes(path) == _reference_hashes(changed)
+        assert 'mtime_ns' in cache._data[path] and len(cache.computed) == 2
+
+        # validate_all drops missing and stale entries and refreshes moved ones
+        others = [os.path.join(tmp_dir, f'other_{i}.safetensors') for i in range(3)]
+        for other in others:
+            _write(other, os.urandom(5000))
+        cache.get_hashes_many(others)
+        os.remove(others[0])
+        _write(others[1], os.urandom(6000))
+        moved = others[2] + '.moved'
+        shutil.copy2(others[2], moved)
+        os.replace(moved, others[2])
+        assert cache.validate_all() == {'valid': 1, 'revalidated': 1, 'stale': 1, 'missing': 1}
+        assert sorted(cache.cached_paths()) == sorted([path, others[2]])
+        assert cache.validate_all() == {'valid': 2, 'revalidated': 0, 'stale': 0, 'missing': 0}
+        cache.close()
+    print("✅ Entry validation verified")
+
+
+def test_duplicate_files():
+    """Identical files at other paths reuse the hashes of an existing entry"""
+    print("\n=== Test 7: Duplicate Files ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        original = os.path.join(tmp_dir, 'lora.safetensors')
+        data = os.urandom(200000)
+        _write(original, data)
+        copy = os.path.join(tmp_dir, 'copy.safetensors')
+        shutil.copyfile(original, copy)
+        link = os.path.join(tmp_dir, 'link.safetensors')
+        os.symlink(copy, link)
+
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        cache.release.set()
+        assert cache.get_hashes(original) == _reference_hashes(data)
+        assert cache.get_hashes_many([copy, link]) == [_reference_hashes(data)] * 2
+        assert cache.computed == [original]
+        assert cache.get_cache_info()['duplicates_reused'] == 2
+
+        # The symlink and its target are one file, the copy another
+        report = cache.find_duplicates()
+        assert len(report) == 1 and report[0]['sha256'] == _reference_hashes(data)['sha256'], report
+        assert report[0]['paths'] == sorted([original, copy, link])
+        assert (report[0]['copies'], report[0]['wasted_bytes']) == (2, 200000)
+
+        # use_cache=False always rereads the file
+        assert cache.get_hashes(copy, use_cache=False) == _reference_hashes(data)
+        assert cache.computed == [original, copy]
+
+        # Stale entries are neither reused nor reported
+        _write(original, os.urandom(len(data)))
+        _write(copy, os.urandom(len(data)))
+        other = os.path.join(tmp_dir, 'other.safetensors')
+        _write(other, data)
+        assert cache.get_hashes(other) == _reference_hashes(data)
+        assert cache.computed[-1] == other
+        assert cache.find_duplicates() == []
+
+        # Reloading rebuilds the content index
+        cache.close()
+        reloaded = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        reloaded.release.set()
+        shutil.copyfile(other, original)
+        assert reloaded.get_hashes(original) == _reference_hashes(data) and reloaded.computed == []
+        assert [group['paths'] for group in reloaded.find_duplicates()] == [sorted([original, other])]
+        reloaded.close()
+    print("✅ Duplicate files verified")
+
+
+def test_hash_type_subsets():
+    """Only requested hash types are computed; missing ones are added lazily"""
+    print("\n=== Test 8: Hash Type Subsets ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'lora.safetensors')
+        data = os.urandom(50000)
+        _write(path, data)
+        reference = _reference_hashes(data)
+        for hash_types in (('sha256',), ('autov2', 'autov1'), ('crc32', 'blake3'), ()):
+            expected = _subset(reference, sorted(hash_types, key=lora_hashing.HASH_TYPES.index))
+            assert lora_hashing.hash_file(path, hash_types=hash_types) == expected
+            assert lora_hashing.hash_file(path, hash_types=hash_types, use_mmap=True) == expected
+        try:
+            lora_hashing.hash_file(path, hash_types=('md5',))
+            raise AssertionError("unknown hash type accepted")
+        except ValueError:
+            pass
+
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        cache.release.set()
+        assert cache.get_hashes(path, hash_types=['sha256']) == _subset(reference, ['sha256'])
+        assert cache.get_hashes(path, hash_types=lora_hashing.PRIMARY_HASH_TYPES) == \
+            _subset(reference, lora_hashing.PRIMARY_HASH_TYPES)
+        assert cache.get_hashes(path) == reference
+        assert cache.computed_types == [('sha256',), ('autov1', 'autov2'), ('crc32', 'blake3')]
+        assert cache.get_hashes(path, hash_types=['crc32']) == _subset(reference, ['crc32'])
+        assert len(cache.computed_types) == 3
+
+        # A caller waiting on someone else's computation computes its own missing types afterwards
+        _write(path, data[::-1])
+        reference = _reference_hashes(data[::-1])
+        cache.release.clear()
+        results = {}
+        first = threading.Thread(target=lambda: results.update(sha=cache.get_hashes(path, hash_types=['sha256'])))
+        first.start()
+        while len(cache.computed_types) < 4:
+            time.sleep(0.01)
+        second = threading.Thread(target=lambda: results.update(crc=cache.get_hashes(path, hash_types=['crc32'])))
+        second.start()
+        time.sleep(0.1)
+        cache.release.set()
+        first.join(5)
+        second.join(5)
+        assert results == {'sha': _subset(reference, ['sha256']), 'crc': _subset(reference, ['crc32'])}
+        assert cache.computed_types[3:] == [('sha256',), ('crc32',)]
+        cache.close()
+
+        # Partial entries survive a reload
+        reloaded = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        reloaded.release.set()
+        assert reloaded.get_hashes(path, hash_types=['sha256', 'crc32']) == _subset(reference, ['sha256', 'crc32'])
+        assert reloaded.computed_types == []
+        reloaded.close()
+    print("✅ Hash type subsets verified")
+
+
+def _write_safetensors(path, metadata, rank=16, blocks=3):
+    header = {"__metadata__": metadata}
+    offset = 0
+    for block in range(blocks):
+        for name, shape in ((f"lora_unet_block_{block}.lora_down.weight", [rank, 64]),
+                            (f"lora_unet_block_{block}.lora_up.weight", [64, rank])):
+            size = 2 * shape[0] * shape[1]
+            header[name] = {"dtype": "F16", "shape": shape, "data_offsets": [offset, offset + size]}
+            offset += size
+    raw = json.dumps(header).encode('utf-8')
+    _write(path, struct.pack('<Q', len(raw)) + raw + os.urandom(offset))
+
+
+def test_safetensors_header():
+    """Header summaries come from a bounded read and are cached alongside the hashes"""
+    print("\n=== Test 9: Safetensors Header ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'style.safetensors')
+        tag_frequency = {"10_style": {"pixel art": 40, "1girl": 12}, "5_extra": {"pixel art": 5, " ": 3}}
+        _write_safetensors(path, {
+            "ss_base_model_version": "sdxl_base_v1-0",
+            "ss_network_alpha": "8.0",
+            "ss_network_module": "networks.lora",
+            "ss_output_name": "pixel_style",
+            "ss_num_epochs": "10",
+            "ss_tag_frequency": json.dumps(tag_frequency),
+        })
+
+        cache = _SlowHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        cache.release.set()
+        cache.get_hashes(path, hash_types=['sha256'])
+        info = cache.get_model_info(path)
+        assert info == {
+            "tensor_count": 6, "parameters": 6 * 16 * 64, "dtypes": ["F16"], "rank": 16,
+            "network_alpha": 8.0, "network_module": "networks.lora", "base_model": "sdxl_base_v1-0",
+            "title": "pixel_style", "trigger_words": {"pixel art": 45, "1girl": 12},
+            "training": {"ss_output_name": "pixel_style", "ss_num_epochs": "10"},
+        }, info
+        assert list(info["trigger_words"]) == ["pixel art", "1girl"]
+
+        # Served from the entry without reading the file again; the hashes are kept
+        original_reader = lora_hash_cache.read_safetensors_header
+        lora_hash_cache.read_safetensors_header = None
+        try:
+            assert cache.get_model_info(path) == info
+        finally:
+            lora_hash_cache.read_safetensors_header = original_reader
+        assert cache.get_hashes(path, hash_types=['sha256']) and cache.computed_types == [('sha256',)]
+
+        # Without ss_network_dim the rank comes from the down-projection shapes
+        plain = os.path.join(tmp_dir, 'plain.safetensors')
+        _write_safetensors(plain, {}, rank=4)
+        assert cache.get_model_info(plain) == {"tensor_count": 6, "parameters": 6 * 4 * 64, "dtypes": ["F16"],
+                                               "rank": 4}
+
+        # Changed files are re-read; unparseable and non-safetensors files yield None
+        _write_safetensors(path, {"ss_network_dim": "32"}, rank=32)
+        assert cache.get_model_info(path)["rank"] == 32
+        broken = os.path.join(tmp_dir, 'broken.safetensors')
+        _write(broken, struct.pack('<Q', 1 << 40) + b'{}')
+        assert cache.get_model_info(broken) is None and cache._data[broken]["header"] == {}
+        assert cache.get_model_info(os.path.join(tmp_dir, 'model.ckpt')) is None
+        cache.close()
+
+        reloaded = LoRAHashCache(cache_path=Path(tmp_dir) / 'hashes.json')
+        assert reloaded.get_model_info(plain)["rank"] == 4
+        reloaded.close()
+    print("✅ Safetensors header verified")
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_streaming_matches_reference,
+        test_cache_round_trip,
+        test_parallel_hashing,
+        test_journal_persistence,
+        test_background_indexer,
+        test_entry_validation,
+        test_duplicate_files,
+        test_hash_type_subsets,
+        test_safetensors_header,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__} failed: {e!r}")
+
+    print(f"\nTests passed: {len(tests) - failures}/{len(tests)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tensor fingerprint tests for GeminiCache media identifiers
+
+Tests:
+1. Exact fingerprints hash the full buffer (no repr truncation collisions)
+2. Exact fingerprints depend on dtype and shape, not just bytes
+3. Perceptual fingerprints ignore small pixel changes and dtype scaling
+4. The exact hasher is SHA-256 unless another one is opted into
+"""
+
+import os
+
+import numpy as np
+
+from nodes import media_fingerprint
+from nodes.cache import get_tensor_media_identifier
+
+
+def test_exact_fingerprint_sees_whole_buffer():
+    """Frames differing only in the middle of the buffer get different identifiers"""
+    print("\n=== Test 1: Exact Fingerprint Covers Whole Buffer ===")
+    frame = np.zeros((1, 512, 512, 3), dtype=np.float32)
+    changed = frame.copy()
+    changed[0, 256, 256, 1] = 1.0
+
+    # The old str()-based identifier collided here because the repr elides the middle
+    assert str(frame) == str(changed)
+    assert get_tensor_media_identifier(frame) != get_tensor_media_identifier(changed)
+    assert get_tensor_media_identifier(frame) == get_tensor_media_identifier(frame.copy())
+    print("✅ Exact fingerprint distinguishes frames with identical reprs")
+
+
+def test_exact_fingerprint_includes_layout():
+    """Same bytes with a different shape or dtype produce different identifiers"""
+    print("\n=== Test 2: Exact Fingerprint Includes Layout ===")
+    data = np.arange(24, dtype=np.float32)
+    assert get_tensor_media_identifier(data.reshape(2, 12)) != get_tensor_media_identifier(data.reshape(3, 8))
+    assert get_tensor_media_identifier(data) != get_tensor_media_identifier(data.view(np.int32))
+    # Non-contiguous views hash their logical content
+    grid = np.arange(64, dtype=np.float32).reshape(8, 8)
+    assert get_tensor_media_identifier(grid[:, ::2]) == get_tensor_media_identifier(grid[:, ::2].copy())
+    print("✅ Shape and dtype are part of the fingerprint")
+
+
+def test_perceptual_fingerprint():
+    """Perceptual mode is stable under tiny edits and uint8 re-encoding"""
+    print("\n=== Test 3: Perceptual Fingerprint ===")
+    rng = np.random.default_rng(0)
+    frame = rng.random((1, 270, 480, 3), dtype=np.float32)
+    nudged = frame.copy()
+    nudged[0, 10, 10] += 0.01
+
+    perceptual = get_tensor_media_identifier(frame, mode="perceptual")
+    assert perceptual.startswith("tensor:dhash:")
+    assert perceptual == get_tensor_media_identifier(nudged, mode="perceptual")
+    assert perceptual == get_tensor_media_identifier((frame * 255).astype(np.uint8), mode="perceptual")
+    assert perceptual != get_tensor_media_identifier(frame[:, :, ::-1], mode="perceptual")
+    print("✅ Perceptual fingerprint tolerates small changes")
+
+
+def test_hasher_is_pinned():
+    """Installed optional hash packages do not change the cache key"""
+    print("\n=== Test 4: Pinned Exact Hasher ===")
+    original = os.environ.pop("GEMINI_CACHE_TENSOR_HASH", None)
+    try:
+        assert media_fingerprint._default_hasher()[0] == "sha256"
+        os.environ["GEMINI_CACHE_TENSOR_HASH"] = "xxh3"
+        expected = "xxh3" if media_fingerprint.XXHASH_AVAILABLE else "sha256"
+        assert media_fingerprint._default_hasher()[0] == expected
+    finally:
+        os.environ.pop("GEMINI_CACHE_TENSOR_HASH", None)
+        if original is not None:
+            os.environ["GEMINI_CACHE_TENSOR_HASH"] = original
+    if original is None:
+        identifier = get_tensor_media_identifier(np.zeros(4, dtype=np.float32))
+        assert identifier.startswith("tensor:sha256:"), identifier
+    print("✅ SHA-256 is the default whatever packages are installed")
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_exact_fingerprint_sees_whole_buffer,
+        test_exact_fingerprint_includes_layout,
+        test_perceptual_fingerprint,
+        test_hasher_is_pinned,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__} failed: {e!r}")
+
+    print(f"\nTests passed: {len(tests) - failures}/{len(tests)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())